@@ -37,7 +37,7 @@
 
 import asyncio
 import brickpi3 #import BrickPi3.py file to use BrickPi3 operations
-BP = brickpi3.BrickPi3()
+BP = brickpi3.AsyncBrickPi3() # SPI calls run on a hardware thread, so they don't block the camera stream
 import threading
 import tornado.ioloop
 import tornado.web
@@ -91,7 +91,7 @@ class WSHandler(tornado.websocket.WebSocketHandler):
 
     def check_origin(self,origin):
         return True
-    def on_message(self, message):      # receives the data from the webpage and is stored in the variable message
+    async def on_message(self, message):      # receives the data from the webpage and is stored in the variable message
         global c
         global left_power
         global right_power
@@ -127,8 +127,8 @@ class WSHandler(tornado.websocket.WebSocketHandler):
             if right_power > 255:
                 right_power = 255
             left_power = right_power
-            BP.set_motor_power(BP.PORT_B, left_power)  #Set the speed of MotorB (-255 to 255)
-            BP.set_motor_power(BP.PORT_D, right_power)  #Set the speed of MotorD (-255 to 255)
+            await BP.set_motor_power(BP.PORT_B, left_power)  #Set the speed of MotorB (-255 to 255)
+            await BP.set_motor_power(BP.PORT_D, right_power)  #Set the speed of MotorD (-255 to 255)
         elif c == '2' :
             print('Running Reverse')
             # first check which side has lower power and set it to the lowest setting before increasing it
@@ -140,16 +140,16 @@ class WSHandler(tornado.websocket.WebSocketHandler):
             if right_power < -255:
                 right_power = -255
             left_power = right_power
-            BP.set_motor_power(BP.PORT_B, left_power)
-            BP.set_motor_power(BP.PORT_D, right_power)
+            await BP.set_motor_power(BP.PORT_B, left_power)
+            await BP.set_motor_power(BP.PORT_D, right_power)
         elif c == '4' :
             print('Turning Left')
             left_power = left_power + 100
             right_power = 0
             if left_power > 255:
                 left_power = 255
-            BP.set_motor_power(BP.PORT_B, left_power)
-            BP.set_motor_power(BP.PORT_D, right_power)
+            await BP.set_motor_power(BP.PORT_B, left_power)
+            await BP.set_motor_power(BP.PORT_D, right_power)
         elif c == '7' :
             print('Turning diagonal Left')
             if right_power > 200:
@@ -158,16 +158,16 @@ class WSHandler(tornado.websocket.WebSocketHandler):
             left_power = right_power // 2
             if right_power > 255:
                 right_power = 255
-            BP.set_motor_power(BP.PORT_B, left_power)
-            BP.set_motor_power(BP.PORT_D, right_power)
+            await BP.set_motor_power(BP.PORT_B, left_power)
+            await BP.set_motor_power(BP.PORT_D, right_power)
         elif c == '6' :
             print('Turning Right')
             right_power = right_power + 100
             left_power = 0
             if right_power > 255:
                 right_power = 255
-            BP.set_motor_power(BP.PORT_B, left_power)
-            BP.set_motor_power(BP.PORT_D, right_power)
+            await BP.set_motor_power(BP.PORT_B, left_power)
+            await BP.set_motor_power(BP.PORT_D, right_power)
         elif c == '9' :
             print('Turning diagonal Right')
             if left_power > 200:
@@ -176,14 +176,14 @@ class WSHandler(tornado.websocket.WebSocketHandler):
             right_power = left_power // 2
             if left_power > 255:
                 left_power = 255
-            BP.set_motor_power(BP.PORT_B, left_power)
-            BP.set_motor_power(BP.PORT_D, right_power)
+            await BP.set_motor_power(BP.PORT_B, left_power)
+            await BP.set_motor_power(BP.PORT_D, right_power)
         elif c == '5' :
             print('Stopped')
             right_power = 0
             left_power = 0
-            BP.set_motor_power(BP.PORT_B, left_power)
-            BP.set_motor_power(BP.PORT_D, right_power)
+            await BP.set_motor_power(BP.PORT_B, left_power)
+            await BP.set_motor_power(BP.PORT_D, right_power)
         print('Values Updated')
     def on_close(self):
         cameraStreamer.stopStreaming()
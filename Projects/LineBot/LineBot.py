@@ -66,14 +66,14 @@ try:
 
         LineFollowerState = lf.read("weighted-avg")
         if LineFollowerState[1] != 0:
-            bp.set_motor_dps(PORT_MOTOR_LEFT, 0)
-            bp.set_motor_dps(PORT_MOTOR_RIGHT, 0)
+            bp.set_motors_dps({PORT_MOTOR_LEFT: 0, PORT_MOTOR_RIGHT: 0})
         else:
             Error = -(LineFollowerState[0] - 0.5) * 2
             Error = max(min(Error, 1), -1)
             Correction = Error * 3
-            bp.set_motor_dps(PORT_MOTOR_LEFT, (DRIVE_BASE_SPEED - (DRIVE_BASE_SPEED * Correction)))
-            bp.set_motor_dps(PORT_MOTOR_RIGHT, (DRIVE_BASE_SPEED + (DRIVE_BASE_SPEED * Correction)))
+            # both wheels change speed in the same bus transfer
+            bp.set_motors_dps({PORT_MOTOR_LEFT: (DRIVE_BASE_SPEED - (DRIVE_BASE_SPEED * Correction)),
+                               PORT_MOTOR_RIGHT: (DRIVE_BASE_SPEED + (DRIVE_BASE_SPEED * Correction))})
 
 except KeyboardInterrupt:
     SafeExit()
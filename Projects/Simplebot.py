@@ -48,34 +48,29 @@ for idx, line in enumerate(instructions):
 stdscr.refresh()
 
 BP = brickpi3.BrickPi3()  # Create an instance of the BrickPi3 class. BP will be the BrickPi3 object.
-motorR = BP.PORT_B  # right motor
-motorL = BP.PORT_C  # left motor
+# The two wheels as one group, so that both change in the same message
+wheels = brickpi3.MotorGroup(BP, {"right": BP.PORT_B, "left": BP.PORT_C})
 speed = 200  # range is -255 to 255, make lower if bot is too fast
 
 # Move Forward
 def fwd():
-    BP.set_motor_power(motorR, speed)
-    BP.set_motor_power(motorL, speed)
+    wheels.set_power(speed)
 
 # Move Left
 def left():
-    BP.set_motor_power(motorR, speed)
-    BP.set_motor_power(motorL, -speed)
+    wheels.set_power({"right": speed, "left": -speed})
 
 # Move Right
 def right():
-    BP.set_motor_power(motorR, -speed)
-    BP.set_motor_power(motorL, speed)
+    wheels.set_power({"right": -speed, "left": speed})
 
 # Move backward
 def back():
-    BP.set_motor_power(motorR, -speed)
-    BP.set_motor_power(motorL, -speed)
+    wheels.set_power(-speed)
 
 # Stop
 def stop():
-    BP.set_motor_power(motorR, 0)
-    BP.set_motor_power(motorL, 0)
+    wheels.set_power(0)
 
 try:
     while True:
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Benchmark of reading the full state of a BrickPi3: four sensors and four motor statuses.
+#
+#   one call per port -- get_sensor and get_motor_status for each port, 8 bus transfers
+#   bulk -- get_sensors and get_motor_statuses, 2 bus transfers
+#
+# Run with: python3 benchmarks/bulk_reads.py [--latency SECONDS] [--count N]
+
+from __future__ import print_function
+
+import argparse
+import time
+
+import brickpi3
+from brickpi3.emulator import EmulatorTransport
+
+
+def per_port(BP):
+    for p in range(4):
+        BP.get_sensor(1 << p)
+        BP.get_motor_status(1 << p)
+
+
+def bulk(BP):
+    BP.get_sensors()
+    BP.get_motor_statuses()
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "BrickPi3 full state read benchmark")
+    parser.add_argument("--latency", type = float, default = 0.0001, help = "simulated time per bus transfer in seconds")
+    parser.add_argument("--count", type = int, default = 2000, help = "the number of full state reads to time")
+    args = parser.parse_args()
+
+    transport = EmulatorTransport(latency = args.latency)
+    transport.emulator.ev3_connect_time = 0.0
+    BP = brickpi3.BrickPi3(transport = transport)
+    for p, type in enumerate((BP.SENSOR_TYPE.TOUCH, BP.SENSOR_TYPE.NXT_LIGHT_ON, BP.SENSOR_TYPE.CUSTOM, BP.SENSOR_TYPE.EV3_GYRO_ABS_DPS)):
+        BP.set_sensor_type(1 << p, type, [0])
+    time.sleep(0.1) # I2C and NXT ultrasonic style configuration delays
+
+    print("bus latency %.0f us" % (args.latency * 1000000))
+    print("%20s  %14s" % ("method", "us per read"))
+    for name, read in (("one call per port", per_port), ("bulk", bulk)):
+        start = time.monotonic()
+        for i in range(args.count):
+            read(BP)
+        print("%20s  %14.1f" % (name, (time.monotonic() - start) / args.count * 1000000))
+
+
+if __name__ == "__main__":
+    main()
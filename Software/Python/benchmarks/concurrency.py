@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Concurrency stress benchmark for the BrickPi3 drivers.
+#
+# Several threads read sensors and encoders and set motors at once, against the firmware
+# emulator with a simulated bus latency, and the combined call rate is reported for each
+# thread count. Every reply is checked, so a thread decoding another thread's reply is
+# counted as an error.
+#
+#   shared bus -- all threads use one BrickPi3 on one bus. Transfers are serialized by the
+#                 bus lock, but one thread's Python work overlaps another's transfer.
+#   one bus each -- each thread has its own bus, so the transfers themselves run in parallel.
+#
+# Run with: python3 benchmarks/concurrency.py [--latency SECONDS] [--duration SECONDS]
+
+from __future__ import print_function
+
+import argparse
+import threading
+import time
+
+import brickpi3
+from brickpi3.emulator import EmulatorTransport
+
+
+def worker(BP, emulator, index, deadline, counts, errors):
+    """Exercise one sensor port and one motor port until the deadline"""
+    port = 1 << index
+    calls = 0
+    bad = 0
+    while time.monotonic() < deadline:
+        BP.set_motor_dps(port, 10 * (index + 1))
+        if BP.get_sensor(port) != index + 1:
+            bad += 1
+        if BP.get_motor_status(port)[3] != 10 * (index + 1): # dps
+            bad += 1
+        BP.get_motor_encoder(port)
+        calls += 4
+    counts[index] = calls
+    errors[index] = bad
+
+
+def run(threads, latency, duration, shared):
+    """Run the stress test, and return the call rate and the number of bad replies"""
+    boards = []
+    for index in range(threads):
+        if shared and index > 0:
+            boards.append(boards[0])
+            continue
+        transport = EmulatorTransport(latency = latency)
+        BP = brickpi3.BrickPi3(transport = transport)
+        boards.append((BP, transport.emulator))
+    for index in range(threads):
+        BP, emulator = boards[index]
+        BP.set_sensor_type(1 << index, BP.SENSOR_TYPE.TOUCH)
+        emulator.set_sensor_value(1 << index, index + 1) # each thread expects its own port's value
+
+    counts = [0] * threads
+    errors = [0] * threads
+    deadline = time.monotonic() + duration
+    workers = [threading.Thread(target = worker, args = (boards[i][0], boards[i][1], i, deadline, counts, errors)) for i in range(threads)]
+    start = time.monotonic()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(counts) / (time.monotonic() - start), sum(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "BrickPi3 driver concurrency benchmark")
+    parser.add_argument("--latency", type = float, default = 0.0002, help = "simulated time per bus transfer in seconds")
+    parser.add_argument("--duration", type = float, default = 1.0, help = "time to run each test in seconds")
+    args = parser.parse_args()
+
+    print("bus latency %.0f us, the bus limit is %.0f calls/s per bus" % (args.latency * 1000000, 1 / args.latency))
+    print("%8s  %22s  %22s" % ("threads", "shared bus (calls/s)", "one bus each (calls/s)"))
+    for threads in (1, 2, 3, 4): # one sensor port per thread
+        shared, shared_errors = run(threads, args.latency, args.duration, True)
+        separate, separate_errors = run(threads, args.latency, args.duration, False)
+        print("%8d  %22.0f  %22.0f" % (threads, shared, separate))
+        if shared_errors or separate_errors:
+            print("ERROR: %d bad replies" % (shared_errors + separate_errors))
+
+
+if __name__ == "__main__":
+    main()
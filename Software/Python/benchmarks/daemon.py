@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Benchmark of the brickpi3d daemon.
+#
+# A daemon serving the firmware emulator (with a simulated bus latency) is started, and N
+# client processes each read a motor encoder as fast as they can. The request latency seen
+# by the clients and the aggregate request rate are reported for each N, along with the
+# average number of requests the daemon sent per bus transfer.
+#
+# Run with: python3 benchmarks/daemon.py [--latency SECONDS] [--duration SECONDS]
+
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+import brickpi3
+from brickpi3.daemon import BrickPi3Daemon
+from brickpi3.emulator import EmulatorTransport
+
+
+def client(path, start, duration, results):
+    """Read an encoder until the duration has passed, and report the latency of each read"""
+    BP = brickpi3.BrickPi3Client(path = path)
+    latencies = []
+    while time.time() < start: # start all of the clients together
+        time.sleep(0.001)
+    deadline = time.monotonic() + duration
+    while True:
+        before = time.monotonic()
+        if before >= deadline:
+            break
+        BP.get_motor_encoder(BP.PORT_A)
+        latencies.append(time.monotonic() - before)
+    results.put(latencies)
+
+
+def run(clients, latency, duration, path):
+    """Serve clients from a new daemon, and return (requests per second, mean latency, p99 latency, requests per transfer)"""
+    daemon = BrickPi3Daemon(EmulatorTransport(latency = latency), path)
+    server = threading.Thread(target = daemon.serve_forever)
+    server.start()
+    try:
+        results = multiprocessing.Queue()
+        start = time.time() + 0.5
+        processes = [multiprocessing.Process(target = client, args = (path, start, duration, results)) for i in range(clients)]
+        for process in processes:
+            process.start()
+        latencies = []
+        for process in processes:
+            latencies.extend(results.get())
+        for process in processes:
+            process.join()
+        requests = daemon.requests
+        transfers = daemon.transfers
+    finally:
+        daemon.shutdown()
+        server.join()
+    latencies.sort()
+    return (len(latencies) / duration, sum(latencies) / len(latencies),
+            latencies[int(len(latencies) * 0.99)], float(requests) / transfers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "brickpi3d latency and throughput benchmark")
+    parser.add_argument("--latency", type = float, default = 0.0002, help = "simulated time per bus transfer in seconds")
+    parser.add_argument("--duration", type = float, default = 2.0, help = "time to run each test in seconds")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "brickpi3d.sock")
+    print("bus latency %.0f us" % (args.latency * 1000000))
+    print("%8s  %12s  %12s  %12s  %18s" % ("clients", "requests/s", "mean (us)", "p99 (us)", "requests/transfer"))
+    for clients in (1, 2, 4, 8):
+        rate, mean, p99, batching = run(clients, args.latency, args.duration, path)
+        print("%8d  %12.0f  %12.0f  %12.0f  %18.2f" % (clients, rate, mean * 1000000, p99 * 1000000, batching))
+
+
+if __name__ == "__main__":
+    main()
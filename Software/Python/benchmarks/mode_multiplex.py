@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Benchmark of reading three modes of EV3 color sensors, in simulated time.
+#
+#   fixed sleep -- set_sensor_type, sleep 20 ms and get_sensor for each mode of each port in turn
+#   ModeScheduler -- switch the ports together, and poll them until each mode is valid
+#
+# Run with: python3 benchmarks/mode_multiplex.py [--ports N] [--switch-time SECONDS] [--count N]
+
+from __future__ import print_function
+
+import argparse
+
+import brickpi3
+from brickpi3.emulator import EmulatorTransport
+
+MODES = [brickpi3.BrickPi3.SENSOR_TYPE.EV3_COLOR_REFLECTED, brickpi3.BrickPi3.SENSOR_TYPE.EV3_COLOR_AMBIENT,
+         brickpi3.BrickPi3.SENSOR_TYPE.EV3_COLOR_COLOR]
+
+
+def fixed_sleep(BP, ports):
+    for port in ports:
+        for mode in MODES:
+            BP.set_sensor_type(port, mode)
+            BP.transport.clock.sleep(0.02)
+            BP.get_sensor(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "BrickPi3 sensor mode multiplexing benchmark")
+    parser.add_argument("--ports", type = int, default = 4, help = "the number of color sensor ports (1 to 4)")
+    parser.add_argument("--switch-time", type = float, default = 0.01, help = "simulated time for a sensor to change mode in seconds")
+    parser.add_argument("--latency", type = float, default = 0.0001, help = "simulated time per bus transfer in seconds")
+    parser.add_argument("--count", type = int, default = 50, help = "the number of cycles through every mode to time")
+    args = parser.parse_args()
+
+    clock = brickpi3.VirtualClock()
+    transport = EmulatorTransport(latency = args.latency, clock = clock)
+    transport.emulator.ev3_connect_time = 0.0
+    transport.emulator.ev3_mode_switch_time = args.switch_time
+    transport.emulator.set_sensor_value(0x0F, 50)
+    BP = brickpi3.BrickPi3(transport = transport)
+    ports = [1 << p for p in range(args.ports)]
+    scheduler = brickpi3.ModeScheduler(BP, dict((port, MODES) for port in ports))
+    scheduler.read()
+
+    print("%d ports, %d modes, mode switch %.0f ms" % (args.ports, len(MODES), args.switch_time * 1000))
+    print("%16s  %14s" % ("method", "ms per cycle"))
+    for name, read in (("fixed sleep", lambda: fixed_sleep(BP, ports)), ("ModeScheduler", scheduler.read)):
+        start = clock.monotonic()
+        for i in range(args.count):
+            read()
+        print("%16s  %14.1f" % (name, (clock.monotonic() - start) / args.count * 1000))
+
+
+if __name__ == "__main__":
+    main()
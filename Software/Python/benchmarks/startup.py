@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+#
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information, see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Benchmark of the start up time of a short lived process that uses a BrickPi3.
+#
+#   import -- the time to import brickpi3
+#   first read -- the time to then create a BrickPi3 (with detection) and read the battery voltage
+#
+# Each run is a new Python process. The emulator is used unless --hardware is given.
+#
+# Run with: python3 benchmarks/startup.py [--runs N] [--hardware]
+
+from __future__ import print_function
+
+import argparse
+import os
+import subprocess
+import sys
+
+CHILD = """
+import time
+start = time.perf_counter()
+import brickpi3
+imported = time.perf_counter()
+if %(hardware)r:
+    BP = brickpi3.BrickPi3()
+else:
+    from brickpi3.emulator import EmulatorTransport
+    BP = brickpi3.BrickPi3(transport = EmulatorTransport())
+BP.get_voltage_battery()
+read = time.perf_counter()
+print(imported - start, read - imported)
+"""
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description = "BrickPi3 start up benchmark")
+    parser.add_argument("--runs", type = int, default = 20, help = "the number of processes to start")
+    parser.add_argument("--hardware", action = "store_true", help = "use the SPI bus instead of the emulator")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None) # time the imports from cached bytecode, as an installed package would
+    code = CHILD % {"hardware": args.hardware}
+    imports = []
+    reads = []
+    for i in range(args.runs):
+        output = subprocess.check_output([sys.executable, "-c", code], env = env)
+        imported, read = output.split()
+        imports.append(float(imported))
+        reads.append(float(read))
+
+    print("%12s  %10s" % ("", "median ms"))
+    print("%12s  %10.2f" % ("import", median(imports) * 1000))
+    print("%12s  %10.2f" % ("first read", median(reads) * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,31 @@
 # Python drivers for the BrickPi3
 __version__ = "4.0.9"
 
-from .core import *
\ No newline at end of file
+from .core import *
+
+# The other parts of the package are imported on first use, to keep "import brickpi3" fast.
+# (AsyncBrickPi3 alone imports asyncio, which takes longer than the drivers.)
+_LAZY = {
+    "AsyncBrickPi3": "aio",
+    "BrickPi3Stack": "stack",
+    "BrickPi3Client": "daemon",
+    "SnapshotReader": "shm",
+    "TracingTransport": "trace",
+    "History": "history",
+    "ModeScheduler": "multiplex",
+    "MotorGroup": "motors",
+    "MotionEngine": "motion",
+}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+        value = getattr(importlib.import_module("." + _LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
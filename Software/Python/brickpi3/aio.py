@@ -0,0 +1,220 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# asyncio interface for the BrickPi3.
+#
+# Every BrickPi3 method has an awaitable equivalent on AsyncBrickPi3. The SPI
+# transfers run on one dedicated hardware thread, so an event loop (for example
+# a Tornado or aiohttp server) is never blocked by the bus:
+#
+#     BP = brickpi3.AsyncBrickPi3()
+#     await BP.set_motor_power(BP.PORT_A, 50)
+#     encoder = await BP.get_motor_encoder(BP.PORT_A)
+
+import asyncio            # for the event loop
+import concurrent.futures # for the hardware thread
+import functools          # for partial
+import inspect            # for finding the BrickPi3 methods
+
+from .core import BrickPi3
+
+
+class AsyncBrickPi3(object):
+    """
+    Awaitable interface to a BrickPi3
+
+    Calls are run in the order they were made, one at a time, on a single hardware thread.
+    Reads (the get_ and spi_read_ methods) that are awaited concurrently with the same
+    arguments are coalesced into one SPI transfer, and all of the callers receive the
+    same result. A read is never coalesced across a write made after it was started, so
+    a read always reflects the writes that were awaited before it.
+
+    Methods that wait (wait_for_position, wait_until_encoder and configure_sensors) don't hold the
+    hardware thread while waiting, so other calls are run in the meantime.
+
+    Constants such as PORT_A and SENSOR_TYPE are available as attributes, as on BrickPi3.
+    """
+
+    def __init__(self, addr = 1, detect = True, transport = None, bp = None):
+        """
+        Start the hardware thread, and optionally detect the BrickPi3
+
+        Keyword arguments:
+        addr = 1 -- the SPI address, as for BrickPi3
+        detect = True -- detect the BrickPi3, as for BrickPi3
+        transport = None -- the SPI transport, as for BrickPi3
+        bp = None -- an existing BrickPi3 to use, instead of creating one. It should not be used directly from other threads while the AsyncBrickPi3 is in use.
+        """
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "BrickPi3 hardware")
+        self._pending = {} # the reads in progress, by (loop, method name, arguments)
+        if bp is None:
+            try:
+                bp = self._executor.submit(BrickPi3, addr, detect, transport).result()
+            except BaseException:
+                self._executor.shutdown(wait = False)
+                raise
+        self.bp = bp
+
+    def __getattr__(self, name):
+        if name == "bp": # not yet set in __init__
+            raise AttributeError(name)
+        value = getattr(self.bp, name)
+        if callable(value):
+            raise AttributeError("AsyncBrickPi3 has no method %s. Use call() to run it on the hardware thread." % name)
+        return value
+
+    def _submit(self, function, args, kwargs):
+        """Run a function on the hardware thread, and return an asyncio future for the result"""
+        return asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    async def call(self, function, *args, **kwargs):
+        """
+        Run a function on the hardware thread
+
+        Use this to run code that needs several BrickPi3 calls together, such as a batch.
+
+        Keyword arguments:
+        function -- the function to call. It is passed args and kwargs.
+
+        Returns the value returned by function.
+        """
+        self._pending.clear() # later reads must not be coalesced with reads made before this call
+        return await self._submit(function, args, kwargs)
+
+    async def _read(self, name, args, kwargs):
+        """Run a BrickPi3 read method, sharing the result with identical reads that are in progress"""
+        try:
+            key = (asyncio.get_running_loop(), name, args, tuple(sorted(kwargs.items())))
+            future = self._pending.get(key)
+        except TypeError: # unhashable arguments can't be coalesced
+            return await self._submit(getattr(self.bp, name), args, kwargs)
+        if future is None:
+            future = self._submit(getattr(self.bp, name), args, kwargs)
+            self._pending[key] = future
+            future.add_done_callback(functools.partial(self._read_done, key))
+        # shield, so that one caller being cancelled doesn't cancel the read for the others
+        return await asyncio.shield(future)
+
+    def _read_done(self, key, future):
+        if self._pending.get(key) is future:
+            del self._pending[key]
+
+    async def _write(self, name, args, kwargs):
+        """Run a BrickPi3 method that isn't a read"""
+        self._pending.clear() # later reads must not be coalesced with reads made before this write
+        return await self._submit(getattr(self.bp, name), args, kwargs)
+
+    def stream(self, sensors = 0, encoders = 0, hz = 100, count = None):
+        """
+        Read sensors and motor encoders at a fixed rate. See BrickPi3.stream.
+
+        Returns an asynchronous iterator of Samples:
+
+            async for timestamp_ns, values in BP.stream(sensors = BP.PORT_1, hz = 50):
+                ...
+        """
+        return AsyncStream(self, self.bp.stream(sensors, encoders, hz, count))
+
+    async def wait_for_position(self, port, tolerance = 2, timeout = None, position = None):
+        """
+        Wait for motors to reach their target positions. See BrickPi3.wait_for_position.
+
+        Each read runs on the hardware thread, and the waits between them on the event loop.
+        """
+        return await self._wait_for_motors(self.bp._position_wait(port, tolerance, timeout, position))
+
+    async def wait_until_encoder(self, port, threshold, timeout = None):
+        """
+        Wait for motor encoders to reach a value. See BrickPi3.wait_until_encoder.
+
+        Each read runs on the hardware thread, and the waits between them on the event loop.
+        """
+        return await self._wait_for_motors(self.bp._encoder_wait(port, threshold, timeout))
+
+    async def _wait_for_motors(self, wait):
+        """Read the motor statuses of a _MotorWait until every motor has reached its target"""
+        while True:
+            read = await self._submit(self.bp.get_motor_statuses, (wait.mask(),), {})
+            delay = wait.update(read)
+            if delay is None:
+                return tuple(wait.statuses)
+            await asyncio.sleep(delay)
+
+    async def configure_sensors(self, types, timeout = 60.0):
+        """
+        Set the sensor types of several ports, and wait for the sensors in the background. See BrickPi3.configure_sensors.
+
+        Returns a dict with an asyncio future for each port, rather than a concurrent.futures.Future.
+        """
+        futures = await self._write("configure_sensors", (types, timeout), {})
+        return dict((port, asyncio.wrap_future(future)) for port, future in futures.items())
+
+    def close(self):
+        """Wait for the calls in progress to finish, and stop the hardware thread"""
+        self._executor.shutdown(wait = True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        # close waits for the calls in progress, so it waits on another thread while the event loop runs
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+class AsyncStream(object):
+    """
+    An asynchronous iterator of Samples taken at a fixed rate. Use AsyncBrickPi3.stream() to create one.
+
+    The event loop waits for each deadline, and the reads run on the hardware thread.
+    """
+
+    def __init__(self, abp, stream):
+        self._abp = abp
+        self.stream = stream # the Stream that schedules and reads the samples
+
+    @property
+    def samples(self):
+        return self.stream.samples
+
+    @property
+    def missed(self):
+        return self.stream.missed
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.stream._finished():
+            raise StopAsyncIteration
+        await asyncio.sleep(self.stream._delay() / 1000000000.0)
+        return await self._abp._submit(self.stream._read, (), {})
+
+    def close(self):
+        """Stop the stream"""
+        self.stream.close()
+
+
+def _async_method(name, function):
+    """Return an awaitable AsyncBrickPi3 method that runs the BrickPi3 method name"""
+    if name.startswith("get_") or name.startswith("spi_read_"):
+        async def method(self, *args, **kwargs):
+            return await self._read(name, args, kwargs)
+    else:
+        async def method(self, *args, **kwargs):
+            return await self._write(name, args, kwargs)
+    method.__name__ = name
+    method.__qualname__ = "AsyncBrickPi3." + name
+    method.__doc__ = function.__doc__
+    return method
+
+
+# batch() is not wrapped, because a batch belongs to the thread that started it. Use call() to run a batch.
+# The methods defined above (stream, and the methods that wait) are not wrapped either.
+for _name, _function in vars(BrickPi3).items():
+    if inspect.isfunction(_function) and not _name.startswith("_") and _name != "batch" and _name not in vars(AsyncBrickPi3):
+        setattr(AsyncBrickPi3, _name, _async_method(_name, _function))
+del _name, _function
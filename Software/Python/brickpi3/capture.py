@@ -0,0 +1,189 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# High rate capture of motor statuses and sensor values into NumPy arrays.
+#
+# Each sample reads the selected motor statuses and sensors in one bus transfer, and only
+# copies the raw replies into a preallocated buffer. decode() then converts the whole
+# buffer at once into a structured array, using the reply layouts of the protocol table:
+#
+#     from brickpi3.capture import Capture
+#     capture = Capture(BP, motors = BP.PORT_A, sensors = BP.PORT_1, length = 5000)
+#     capture.run(hz = 1000)
+#     data = capture.decode()
+#     data["motor_a"]["encoder"], data["sensor_1"]["value"], data["timestamp"]
+#
+# Requires NumPy (pip install brickpi3[capture]).
+
+try:
+    import numpy
+except ImportError:
+    raise ImportError("brickpi3.capture requires NumPy. Install it with: pip install numpy")
+
+from .core import BrickPi3, PROTOCOL, SpiMessage, _SENSOR_FORMATS, _read_plan
+from .core import _sensor_8, _sensor_u16, _sensor_s16, _sensor_u16_tenths, _sensor_u16_2, _sensor_s16_2, _sensor_u16_4, _sensor_infrared_seek
+from .protocol import REPLY_OFFSET, REPLY_MARKER
+
+# The NumPy type of each struct format character, as sent on the bus (big endian)
+_WIRE_TYPES = {"B": "u1", "b": "i1", "H": ">u2", "h": ">i2", "I": ">u4", "i": ">i4"}
+
+_SENSOR_PAYLOAD = 6 # the sensor value(s) follow the marker, the sensor type and the sensor state
+
+# The sensor value layouts, by the converter get_sensor uses: NumPy type, shape, and divisor.
+# Other sensor types are captured as their raw value bytes.
+_SENSOR_VALUES = {
+    _sensor_8: ("u1", (), None),
+    _sensor_u16: (">u2", (), None),
+    _sensor_s16: (">i2", (), None),
+    _sensor_u16_tenths: (">u2", (), 10.0),
+    _sensor_u16_2: (">u2", (2,), None),
+    _sensor_s16_2: (">i2", (2,), None),
+    _sensor_u16_4: (">u2", (4,), None),
+    _sensor_infrared_seek: ("i1", (4, 2), None),
+}
+
+
+def _columns(columns):
+    """Return a structured array with a field for each (name, array) in columns"""
+    result = numpy.zeros(len(columns[0][1]), [((name, column.dtype, column.shape[1:]) if column.ndim > 1 else (name, column.dtype)) for name, column in columns])
+    for name, column in columns:
+        result[name] = column
+    return result
+
+
+class Capture(object):
+    """
+    Captures raw motor status and sensor replies, and decodes them in bulk
+
+    The sensor ports must be configured before the Capture is created. Samples read after a
+    port is reconfigured are marked as not valid.
+    """
+
+    def __init__(self, bp, motors = 0x0F, sensors = 0, length = 10000):
+        """
+        Keyword arguments:
+        bp -- the BrickPi3 to read
+        motors = 0x0F -- The motor ports to read the status of. PORT_A, PORT_B, PORT_C, and/or PORT_D.
+        sensors = 0 -- The sensor ports to read. PORT_1, PORT_2, PORT_3, and/or PORT_4.
+        length = 10000 -- the number of samples the buffer holds
+        """
+        self.bp = bp
+        self.length = length
+        self.count = 0 # the number of samples captured
+        self._messages = []
+        self._fields = [] # (name, offset, decode) for each message
+        offset = 0
+        for p in range(4):
+            if motors & (1 << p):
+                spec = PROTOCOL.spec(BrickPi3.BPSPI_MESSAGE_TYPE.GET_MOTOR_A_STATUS + p)
+                self._messages.append(SpiMessage(spec.encode(bp.SPI_Address)))
+                self._fields.append(("motor_" + "abcd"[p], offset, self._motor_decoder(spec, offset)))
+                offset += spec.length
+        for p in range(4):
+            if sensors & (1 << p):
+                sensor_type = bp.SensorType[p]
+                plan = _read_plan(sensor_type, bp.I2CInBytes[p])
+                if plan is None:
+                    raise IOError("Capture error: sensor port %d is not configured for a supported sensor type." % (p + 1))
+                message_type = BrickPi3.BPSPI_MESSAGE_TYPE.GET_SENSOR_1 + p
+                self._messages.append(SpiMessage([bp.SPI_Address, message_type] + [0] * (plan.reply_length - 2)))
+                self._fields.append(("sensor_%d" % (p + 1), offset, self._sensor_decoder(sensor_type, plan.reply_length, offset)))
+                offset += plan.reply_length
+        if len(self._messages) == 0:
+            raise IOError("Capture error: no motor or sensor ports selected.")
+        self.row_size = offset
+        self.raw = numpy.zeros((length, offset), numpy.uint8)
+        self.timestamps = numpy.zeros(length, numpy.float64)
+        self._raw = memoryview(self.raw.reshape(-1))
+        self._copies = [(offset, offset + len(message.rx), message) for (name, offset, decode), message in zip(self._fields, self._messages)]
+
+    def sample(self):
+        """Read the ports once, in one bus transfer, and store the raw replies"""
+        if self.count >= self.length:
+            raise IOError("Capture error: the buffer is full.")
+        self.bp._transact_messages(self._messages)
+        self.timestamps[self.count] = self.bp.transport.clock.monotonic()
+        row = self.count * self.row_size
+        raw = self._raw
+        for start, end, message in self._copies:
+            raw[(row + start):(row + end)] = message.rx
+        self.count += 1
+
+    def run(self, samples = None, hz = None):
+        """
+        Capture several samples
+
+        Keyword arguments:
+        samples = None -- the number of samples to capture. Defaults to filling the buffer.
+        hz = None -- the number of samples per second. Defaults to as fast as possible.
+        """
+        end = self.length if samples is None else min(self.length, self.count + samples)
+        clock = self.bp.transport.clock
+        next_sample = clock.monotonic()
+        while self.count < end:
+            if hz is not None:
+                delay = next_sample - clock.monotonic()
+                if delay > 0:
+                    clock.sleep(delay)
+                next_sample += 1.0 / hz
+            self.sample()
+
+    def reset(self):
+        """Discard the captured samples"""
+        self.count = 0
+
+    def decode(self):
+        """
+        Decode the captured samples
+
+        Returns a NumPy structured array with one row per sample. The "timestamp" field is the
+        transport clock time of the sample. "motor_a" to "motor_d" have the fields flags, power,
+        encoder, dps and valid. "sensor_1" to "sensor_4" have the fields value and valid. Sensor
+        types whose values aren't numbers (such as CUSTOM, I2C and EV3_INFRARED_REMOTE) have the raw
+        value bytes as their value.
+        """
+        columns = [("timestamp", self.timestamps[:self.count])]
+        for name, offset, decode in self._fields:
+            columns.append((name, decode(self.count)))
+        return _columns(columns)
+
+    def _view(self, count, offset, wire_type, shape = ()):
+        """Return the field at offset of the first count rows, converted from the bus byte order"""
+        dtype = numpy.dtype((wire_type, shape))
+        view = numpy.ndarray((count,), dtype, self.raw, offset, (self.row_size,))
+        return view.astype(dtype.base.newbyteorder("=")) # the signed conversion and byte swap of every sample at once
+
+    def _motor_decoder(self, spec, offset):
+        fields = []
+        field_offset = offset + REPLY_OFFSET
+        for field in spec.reply.fields:
+            fields.append((field.name, field_offset, _WIRE_TYPES[field.format]))
+            field_offset += field.size
+
+        def decode(count):
+            valid = self._view(count, offset + 3, "u1") == REPLY_MARKER
+            return _columns([(name, self._view(count, field_offset, wire_type)) for name, field_offset, wire_type in fields] + [("valid", valid)])
+        return decode
+
+    def _sensor_decoder(self, sensor_type, reply_length, offset):
+        ST = BrickPi3.SENSOR_TYPE
+        convert = _SENSOR_FORMATS.get(sensor_type, (None, None))[1]
+        if convert in _SENSOR_VALUES:
+            wire_type, shape, divisor = _SENSOR_VALUES[convert]
+        else:
+            wire_type, shape, divisor = "u1", (reply_length - _SENSOR_PAYLOAD,), None
+        accepted = (ST.TOUCH, ST.NXT_TOUCH, ST.EV3_TOUCH) if sensor_type == ST.TOUCH else (sensor_type,)
+
+        def decode(count):
+            valid = ((self._view(count, offset + 3, "u1") == REPLY_MARKER) &
+                     numpy.isin(self._view(count, offset + 4, "u1"), accepted) &
+                     (self._view(count, offset + 5, "u1") == BrickPi3.SENSOR_STATE.VALID_DATA))
+            value = self._view(count, offset + _SENSOR_PAYLOAD, wire_type, shape)
+            if divisor is not None:
+                value = value / divisor
+            return _columns([("value", value), ("valid", valid)])
+        return decode
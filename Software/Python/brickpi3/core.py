@@ -8,80 +8,202 @@
 
 
 
-import sys        # for sys.exit
-# import subprocess # for executing system calls
-try:
-    import spidev
-except ImportError as e:
-    print("\033[91mERROR: spidev module not found. This is required for SPI communication with BrickPi3.")
-    print("Install it with: pip install spidev")
-    print("Or if on Raspberry Pi OS: sudo apt-get install python3-spidev\033[0m")
-    sys.exit(-1)
 import array      # for converting hex string to byte array
+import collections # for the recent SPI errors
+import struct     # for packing and unpacking message fields in place
+import threading  # for the per-thread state and the bus locks
+import warnings   # for reporting a reduced SPI speed
+import weakref    # for the per-bus state
+
+from .transport import Clock, VirtualClock, Transport, SpidevTransport, SpiDeviceError, SpiMessage
+from .poller import Poller, Snapshot, _read_snapshots
+from .protocol import Protocol, Layout, Field, MessageSpec, CUSTOM_PARAMETERS, I2C_PARAMETERS, I2C_SAME_PARAMETERS
 
 FIRMWARE_VERSION_REQUIRED = "1.4.x"
 
 
+SPI_SPEED_SAFE = 500000  # reliable on every Raspberry Pi
+SPI_SPEED_FAST = 1000000 # the default where the SPI clock doesn't depend on the core clock
+
+# The SPI speeds (in Hz) that calibrate_spi_speed tries, and that the runtime fallback steps down through
+SPI_SPEEDS = (250000, 500000, 1000000, 1500000, 2000000, 3000000, 4000000)
+
+SPI_ERROR_BURST = 5     # this many "No SPI response" errors...
+SPI_ERROR_WINDOW = 1.0  # ...within this many seconds reduce the SPI speed
+
+SENSOR_POLL_MIN = 0.005 # configure_sensors first checks the sensors after this many seconds...
+SENSOR_POLL_MAX = 0.1   # ...and then backs off, doubling the time between checks up to this
+
+MOTOR_WAIT_FRACTION = 0.8 # wait_for_position sleeps for this fraction of the predicted time until the motors arrive...
+MOTOR_POLL_MIN = 0.002    # ...but at least this many seconds between reads...
+MOTOR_POLL_MAX = 0.05     # ...and at most this many while a motor isn't moving towards its target
+
+# The kinds of setting each board remembers the last written value of, for each port. See BrickPi3._unchanged.
+_WRITE_MOTOR_CONTROL = 0 # power, dps or position, which replace each other
+_WRITE_MOTOR_LIMITS = 1
+_WRITE_MOTOR_KP = 2
+_WRITE_MOTOR_KD = 3
+_WRITE_SENSOR_TYPE = 4
+_WRITE_LED = 5           # stored as port 0
+_WRITE_KINDS = 6
+
+
 def _is_pi3_or_pi4():
-    """Return True if running on a Raspberry Pi 3 or Pi 4."""
+    """Return True if running on a Raspberry Pi 3 or Pi 4, or if the model can't be read."""
     try:
         with open('/proc/device-tree/model', 'r') as _f:
             _model = _f.read()
-            return True
         return 'Raspberry Pi 3' in _model or 'Raspberry Pi 4' in _model
     except Exception:
         return True
 
 
-# Global SPI object (initialized on first use)
+def _default_spi_speed():
+    """
+    Return the default SPI speed for this Raspberry Pi
+
+    On the Pi 3 and Pi 4 the SPI clock is divided down from the core clock, which changes with
+    CPU frequency scaling, so the conservative SPI_SPEED_SAFE is used. Other models use SPI_SPEED_FAST.
+    """
+    if _is_pi3_or_pi4():
+        return SPI_SPEED_SAFE
+    return SPI_SPEED_FAST
+
+
+# Global SPI transport (initialized on first use)
 BP_SPI = None
+_BP_SPI_LOCK = threading.Lock()
 
 
 def _init_spi():
-    """Initialize the global SPI object if not already done."""
+    """Initialize the global SPI transport if not already done, and return it."""
     global BP_SPI
-    if BP_SPI is None:
-        try:
-            BP_SPI = spidev.SpiDev()
-        except Exception as e:
-            print(f"\033[91mERROR: Failed to create SPI device: {e}")
-            print("Make sure spidev is properly installed and SPI hardware is available.\033[0m")
-            sys.exit(-1)
-        try:
-            BP_SPI.open(0, 1)
-        except FileNotFoundError:
-            print("\033[91mERROR: SPI device not found. Make sure SPI is enabled on your Raspberry Pi.")
-            print("Run 'sudo raspi-config', go to 'Interface Options' -> 'SPI' -> 'Enable', then try again.\033[0m")
-            sys.exit(-1)
-        except PermissionError:
-            print("\033[91mERROR: SPI device permission denied. Add your user to the 'spi' group:")
-            print("Run 'sudo usermod -a -G spi $USER' then log out and back in.\033[0m")
-            sys.exit(-1)
-        BP_SPI.max_speed_hz = 500000
-        BP_SPI.mode = 0b00
-        BP_SPI.bits_per_word = 8
+    with _BP_SPI_LOCK:
+        if BP_SPI is None:
+            BP_SPI = SpidevTransport(0, 1, _default_spi_speed())
+    return BP_SPI
+
+
+class _BoardState(object):
+    """
+    The configuration of the BrickPi3 at one address on a bus
+
+    Shared by every BrickPi3 object for the same board, so that they agree on how to decode
+    the sensors. The lock is held while the sensor configuration is changed or used.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sensor_type = [0, 0, 0, 0]
+        self.i2c_in_bytes = [0, 0, 0, 0]
+        self.read_plans = [None, None, None, None] # the _ReadPlan of each sensor port, see _read_plan
+        self.sensor_filters = [None, None, None, None] # the filter of each sensor port, see set_sensor_filter
+        self.written = [[None, None, None, None] for kind in range(_WRITE_KINDS)] # the last value written to each port, by _WRITE_ kind
+        self.motor_control = [None, None, None, None] # the last _WRITE_MOTOR_CONTROL value sent to each port, kept by forget_writes, see wait_for_position
+
+    def forget_writes(self, kind = None):
+        """
+        Forget the values written to the board, so that the next writes are sent even if unchanged
+
+        Keyword arguments:
+        kind = None -- the _WRITE_ kind of setting to forget. Defaults to every kind.
+        """
+        for written in (self.written if kind is None else [self.written[kind]]):
+            written[:] = [None, None, None, None]
+
+    def record_write(self, kind, port, value):
+        """Record a value that was sent to the board. See BrickPi3._unchanged."""
+        written = self.written[kind]
+        for p in range(4):
+            if port & (1 << p):
+                written[p] = value
+                if kind == _WRITE_MOTOR_CONTROL:
+                    self.motor_control[p] = value
+
+
+class _BusState(object):
+    """The state shared by every BrickPi3 on a transport: the bus lock, the recent SPI errors, and the state of each board"""
+
+    def __init__(self):
+        self.lock = threading.Lock() # held for each bus transfer
+        self._boards = {}
+        self._errors = collections.deque(maxlen = SPI_ERROR_BURST) # the times of the recent SPI errors
+        self._errors_lock = threading.Lock() # held while recording an error, so that a burst reduces the speed once
+
+    def spi_error(self, transport):
+        """
+        Record a "No SPI response" error, and reduce the SPI speed if the errors come in a burst
+
+        Keyword arguments:
+        transport -- the transport of this bus
+        """
+        # The board may have been reset, so the values it was sent can't be relied on
+        with self.lock:
+            boards = list(self._boards.values())
+        for board in boards:
+            board.forget_writes()
+        with self._errors_lock:
+            speed = transport.speed_hz
+            if speed is None:
+                return
+            now = transport.clock.monotonic()
+            self._errors.append(now)
+            if len(self._errors) < SPI_ERROR_BURST or (now - self._errors[0]) > SPI_ERROR_WINDOW:
+                return
+            self._errors.clear()
+            slower = [s for s in SPI_SPEEDS if s < speed]
+            if not slower:
+                return
+            with self.lock:
+                transport.speed_hz = slower[-1]
+        warnings.warn("BrickPi3: %d SPI errors at %d Hz. Reduced the SPI speed to %d Hz." % (SPI_ERROR_BURST, speed, slower[-1]), RuntimeWarning)
+
+    def board(self, address):
+        """Return the _BoardState for address, creating it if necessary"""
+        with self.lock:
+            board = self._boards.get(address)
+            if board is None:
+                board = self._boards[address] = _BoardState()
+            return board
+
+
+_buses = weakref.WeakKeyDictionary() # the _BusState of each transport
+_buses_lock = threading.Lock()
+
+
+def _bus_state(transport):
+    """Return the _BusState for a transport, creating it if necessary"""
+    with _buses_lock:
+        bus = _buses.get(transport)
+        if bus is None:
+            bus = _buses[transport] = _BusState()
+        return bus
 
 
 class Enumeration(object):
+    """
+    Named constants, as attributes
+
+    names is either a dict of the numbers by name, or a string of names separated by commas and newlines,
+    each numbered one more than the last unless it has "= number". The BrickPi3 constants are dicts, so
+    that importing the module doesn't parse them.
+    """
+
     def __init__(self, names):  # or *names, with no .split()
+        if isinstance(names, dict):
+            for name, number in names.items():
+                setattr(self, name, number)
+            return
         number = 0
-        for line, name in enumerate(names.split('\n')):
-            if name.find(",") >= 0:
-                # strip out the spaces
-                while(name.find(" ") != -1):
-                    name = name[:name.find(" ")] + name[(name.find(" ") + 1):]
-
-                # strip out the commas
-                while(name.find(",") != -1):
-                    name = name[:name.find(",")] + name[(name.find(",") + 1):]
+        for name in names.split('\n'):
+            if "," in name:
+                # strip out the spaces and the commas
+                name = name.replace(" ", "").replace(",", "")
 
                 # if the value was specified
-                if(name.find("=") != -1):
-                    number = int(float(name[(name.find("=") + 1):]))
-                    name = name[:name.find("=")]
-
-                # optionally print to confirm that it's working correctly
-                #print "%40s has a value of %d" % (name, number)
+                name, equals, value = name.partition("=")
+                if equals:
+                    number = int(float(value))
 
                 setattr(self, name, number)
                 number = number + 1
@@ -95,13 +217,326 @@ class SensorError(Exception):
     """Exception raised if a sensor is not yet configured when trying to read it with get_sensor"""
 
 
-def set_address(address, id):
+class SensorNotConfiguredError(SensorError):
+    """Exception raised if the BrickPi3 reports that a sensor port is not configured, which means the board was reset"""
+
+
+MotorStatus = collections.namedtuple("MotorStatus", ["flags", "power", "encoder", "dps"])
+MotorStatus.__doc__ = """The status of one motor port, as read by get_motor_statuses. See get_motor_status for the fields."""
+
+SensorReadings = collections.namedtuple("SensorReadings", [
+    "values", # the value of each sensor port, as returned by get_sensor, or None
+    "errors", # the exception reading each sensor port raised, or None
+])
+SensorReadings.__doc__ = """
+The sensor values read by get_sensors
+
+The tuples are indexed by port: 0 for PORT_1 to 3 for PORT_4. Ports that weren't read have
+None for both the value and the error.
+"""
+
+
+class BatchResult(object):
+    """
+    The result of a message queued in a BrickPi3Batch
+
+    The value is available once the batch has been sent. Reading the value raises any error
+    that reading the message would have raised, for example a SensorError.
+    """
+    __slots__ = ("done", "_value", "_error")
+
+    def __init__(self):
+        self.done = False
+        self._value = None
+        self._error = None
+
+    def _resolve(self, decode, reply):
+        try:
+            if decode is not None:
+                self._value = decode(reply)
+        except Exception as error:
+            self._error = error
+        self.done = True
+
+    @property
+    def value(self):
+        if not self.done:
+            raise IOError("BrickPi3 batch error: the batch has not been sent")
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def __repr__(self):
+        if not self.done:
+            return "<BatchResult pending>"
+        if self._error is not None:
+            return "<BatchResult error=%r>" % self._error
+        return "<BatchResult value=%r>" % (self._value,)
+
+
+class _MotorWait(object):
+    """
+    The read plan of BrickPi3.wait_for_position and wait_until_encoder, for several motors at once
+
+    Used by BrickPi3, which sleeps between the reads, and by AsyncBrickPi3, which awaits them so that
+    the hardware thread is free for other calls while waiting.
+    """
+
+    def __init__(self, name, targets, reached, clock, timeout):
+        """
+        Keyword arguments:
+        name -- the name of the method waiting, for errors
+        targets -- a dict with the target encoder value of each port number (0 for PORT_A to 3 for PORT_D)
+        reached -- a function of the port number and encoder that returns True once the motor has reached its target
+        clock -- the Clock of the transport
+        timeout -- the longest time in seconds to wait, or None
+        """
+        self.name = name
+        self.pending = dict(targets) # the targets of the motors that haven't reached them
+        self.statuses = [None, None, None, None] # the last MotorStatus read for each port
+        self._reached = reached
+        self._clock = clock
+        self._timeout = timeout
+        self._deadline = None if timeout is None else clock.monotonic() + timeout
+
+    def mask(self):
+        """Return the port mask of the motors to read next"""
+        mask = 0
+        for p in self.pending:
+            mask |= 1 << p
+        return mask
+
+    def update(self, read):
+        """
+        Take the statuses read for the pending motors
+
+        Keyword arguments:
+        read -- the tuple of MotorStatus returned by get_motor_statuses(self.mask())
+
+        Returns the time in seconds to wait before the next read, or None once every motor has reached
+        its target. Raises IOError if the timeout has passed.
+        """
+        delay = None
+        for p in list(self.pending):
+            status = self.statuses[p] = read[p]
+            if self._reached(p, status.encoder):
+                del self.pending[p]
+                continue
+            distance = self.pending[p] - status.encoder
+            if distance * status.dps > 0: # moving towards the target
+                arrival = MOTOR_WAIT_FRACTION * distance / status.dps
+            else:
+                arrival = MOTOR_POLL_MAX
+            if delay is None or arrival < delay:
+                delay = arrival
+        if not self.pending:
+            return None
+        if self._deadline is not None:
+            now = self._clock.monotonic()
+            if now >= self._deadline:
+                raise IOError("%s error: motor port %s did not reach the target within %.1f seconds." %
+                              (self.name, "".join("ABCD"[p] for p in sorted(self.pending)), self._timeout))
+            delay = min(delay, self._deadline - now)
+        return max(delay, MOTOR_POLL_MIN)
+
+
+class _ThreadState(threading.local):
+    """
+    The per-thread state of a BrickPi3
+
+    batch is the active BrickPi3Batch, if any. Each thread gets its own preallocated messages,
+    so that threads can fill in and send them concurrently without locking.
+    """
+
+    def __init__(self, address):
+        self.batch = None
+        self.messages = _build_messages(address)
+        self.sensor_reads = [None, None, None, None]
+
+
+class BrickPi3Batch(object):
+    """
+    Queue BrickPi3 messages and send them together in one bus transfer
+
+    Created by BrickPi3.batch(). While the batch is active (in the thread that entered it), every
+    BrickPi3 method queues its message instead of sending it. Methods that read a value return a
+    BatchResult, which is resolved when the batch exits:
+
+        with BP.batch() as b:
+            b.set_motor_power(BP.PORT_A, 50)
+            encoder = b.get_motor_encoder(BP.PORT_B)
+            sensor = b.get_sensor(BP.PORT_1)
+        print(encoder.value, sensor.value)
+
+    A batch entered while another batch is active joins the outer batch, so all of the messages are
+    sent in order when the outermost batch exits. If the block raises an exception, nothing is sent.
+
+    A batch can span several BrickPi3 objects that share a transport, such as stacked boards, so
+    that all of their messages are sent in one transfer. See BrickPi3Stack.batch().
+    """
+
+    def __init__(self, bp, boards = None):
+        """
+        Keyword arguments:
+        bp -- the BrickPi3 used to send the batch
+        boards = None -- all of the BrickPi3 objects whose messages are queued by the batch. Defaults to just bp.
+        """
+        self._bp = bp
+        self._boards = [bp] if boards is None else list(boards)
+        self._outer = None
+        self._outers = None
+        self.messages = []
+        self._pending = []
+        self._writes = [] # the (board state, kind, port, value) of each queued write, recorded when sent
+
+    def __getattr__(self, name):
+        return getattr(self._bp, name)
+
+    def add(self, outArray, decode = None, write = None):
+        """
+        Queue a message
+
+        Keyword arguments:
+        outArray -- the bytes to send
+        decode = None -- a function that converts the bytes read into the result value
+        write = None -- for the message of a setter, the (board state, kind, port, value) to record in the write cache once it is sent
+
+        Returns a BatchResult.
+        """
+        if self._outer is not None:
+            return self._outer.add(outArray, decode, write)
+        result = BatchResult()
+        self.messages.append(outArray)
+        self._pending.append((decode, result))
+        if write is not None:
+            self._writes.append(write)
+        return result
+
+    def send(self):
+        """Send the queued messages and resolve their results"""
+        messages = self.messages
+        pending = self._pending
+        writes = self._writes
+        self.messages = []
+        self._pending = []
+        self._writes = []
+        if len(messages) == 0:
+            return
+        # Hold the locks of the boards written, so that the writes are recorded in the order they were
+        # sent, and agree with the other threads' writes. The locks are always taken in the same order.
+        boards = sorted(set(write[0] for write in writes), key = id)
+        for board in boards:
+            board.lock.acquire()
+        try:
+            try:
+                replies = self._bp.spi_transfer_many(messages)
+            except Exception: # the boards may not have received the values written
+                for board in boards:
+                    board.forget_writes()
+                raise
+            for board, kind, port, value in writes:
+                board.record_write(kind, port, value)
+        finally:
+            for board in boards:
+                board.lock.release()
+        for (decode, result), reply, message in zip(pending, replies, messages):
+            result._resolve(decode, bytearray(reply))
+            if isinstance(result._error, IOError):
+                self._bp._bus.spi_error(self._bp.transport)
+            elif isinstance(result._error, SensorNotConfiguredError):
+                self._bp._bus.board(message[0]).forget_writes()
+
+    def __enter__(self):
+        self._outers = [board._local.batch for board in self._boards]
+        for outer in self._outers:
+            if outer is not None:
+                self._outer = outer # join the batch that is already active
+                break
+        for board in self._boards:
+            board._local.batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for board, outer in zip(self._boards, self._outers):
+            board._local.batch = outer
+        self._outers = None
+        if self._outer is None:
+            if exc_type is None:
+                self.send()
+            else: # nothing is sent, so nothing is recorded in the write cache
+                self.messages = []
+                self._pending = []
+                self._writes = []
+        self._outer = None
+        return False
+
+
+# The reply decoders take the bytes read as a bytearray (or a list), and convert them into the
+# value returned by the corresponding BrickPi3 method. Most are compiled from the protocol
+# table, see PROTOCOL at the end of this module.
+
+def _decode_version(reply):
+    version = PROTOCOL.GET_FIRMWARE_VERSION.decode(reply)
+    return ("%d.%d.%d" % ((version / 1000000), ((version / 1000) % 1000), (version % 1000)))
+
+
+# The generic spi_read_* and spi_write_* methods take the message type as an argument
+_READ_16 = MessageSpec("READ_16", None, (), (Field("value", "H"),))
+_READ_32 = MessageSpec("READ_32", None, (), (Field("value", "I"),))
+_WRITE_8 = Layout((Field("value", "B"),))
+_WRITE_16 = Layout((Field("value", "H"),))
+_WRITE_24 = Layout((Field("high", "B"), Field("low", "H")))
+_WRITE_32 = Layout((Field("value", "I"),))
+
+
+def _build_messages(address):
+    """
+    Preallocate the messages used by the frequently called methods
+
+    The methods fill in the request bytes in place and decode the reply from a reused buffer,
+    so reading encoders, motor status, voltages and sensors doesn't allocate in steady state.
+
+    Returns a dict of SpiMessages by message type.
+    """
+    messages = {}
+    for name in ("SET_LED", "GET_VOLTAGE_3V3", "GET_VOLTAGE_5V", "GET_VOLTAGE_9V", "GET_VOLTAGE_VCC",
+                 "SET_MOTOR_POWER", "SET_MOTOR_POSITION", "SET_MOTOR_POSITION_KP", "SET_MOTOR_POSITION_KD",
+                 "SET_MOTOR_DPS", "SET_MOTOR_LIMITS", "OFFSET_MOTOR_ENCODER",
+                 "GET_MOTOR_A_ENCODER", "GET_MOTOR_B_ENCODER", "GET_MOTOR_C_ENCODER", "GET_MOTOR_D_ENCODER",
+                 "GET_MOTOR_A_STATUS", "GET_MOTOR_B_STATUS", "GET_MOTOR_C_STATUS", "GET_MOTOR_D_STATUS"):
+        spec = getattr(PROTOCOL, name)
+        messages[spec.message_type] = SpiMessage([address, spec.message_type] + [0] * (spec.length - 2))
+    return messages
+
+
+class _ReadPlan(object):
+    """
+    How to read a sensor port configured for a sensor type
+
+    Compiled by set_sensor_type, so that get_sensor only has to send a message of reply_length
+    bytes and pass the reply to decode.
+    """
+    __slots__ = ("sensor_type", "reply_length", "decode")
+
+    def __init__(self, sensor_type, reply_length, decode):
+        self.sensor_type = sensor_type
+        self.reply_length = reply_length
+        self.decode = decode
+
+
+class _SensorRead(SpiMessage):
+    """A preallocated get_sensor message, for the _ReadPlan it was built from"""
+    __slots__ = ("plan",)
+
+
+def set_address(address, id, transport = None):
     """
     Set the SPI address of the BrickPi3
 
     Keyword arguments:
     address -- the new SPI address to use (1 to 255)
     id -- the BrickPi3's unique serial number ID (so that the address can be set while multiple BrickPi3s are stacked on a Raspberry Pi).
+    transport = None -- the SPI transport to use. Defaults to the SPI bus of the Raspberry Pi.
     """
     address = int(address)
     if address < 1 or address > 255:
@@ -120,10 +555,11 @@ def set_address(address, id):
             raise IOError("brickpi3.set_address error: unknown serial number id problem. Make sure to use a valid 32-digit hex string serial number.")
             return
 
-    _init_spi()
-    outArray = [0, BrickPi3.BPSPI_MESSAGE_TYPE.SET_ADDRESS, address]
-    outArray.extend(id_arr)
-    BP_SPI.xfer2(outArray)
+    if transport is None:
+        transport = _init_spi()
+    outArray = PROTOCOL.SET_ADDRESS.encode(0, address, id_arr)
+    with _bus_state(transport).lock:
+        transport.transfer(outArray)
 
 
 class BrickPi3(object):
@@ -139,123 +575,120 @@ class BrickPi3(object):
 
     MOTOR_FLOAT = -128
 
-    SensorType = [0, 0, 0, 0]
-    I2CInBytes = [0, 0, 0, 0]
-
     I2C_LENGTH_LIMIT = 16
 
-    BPSPI_MESSAGE_TYPE = Enumeration("""
-        NONE,
+    BPSPI_MESSAGE_TYPE = Enumeration({
+        "NONE": 0,
 
-        GET_MANUFACTURER,
-        GET_NAME,
-        GET_HARDWARE_VERSION,
-        GET_FIRMWARE_VERSION,
-        GET_ID,
-        SET_LED,
-        GET_VOLTAGE_3V3,
-        GET_VOLTAGE_5V,
-        GET_VOLTAGE_9V,
-        GET_VOLTAGE_VCC,
-        SET_ADDRESS,
-
-        SET_SENSOR_TYPE,
-
-        GET_SENSOR_1,
-        GET_SENSOR_2,
-        GET_SENSOR_3,
-        GET_SENSOR_4,
-
-        I2C_TRANSACT_1,
-        I2C_TRANSACT_2,
-        I2C_TRANSACT_3,
-        I2C_TRANSACT_4,
-
-        SET_MOTOR_POWER,
-
-        SET_MOTOR_POSITION,
-
-        SET_MOTOR_POSITION_KP,
-
-        SET_MOTOR_POSITION_KD,
-
-        SET_MOTOR_DPS,
-
-        SET_MOTOR_DPS_KP,
-
-        SET_MOTOR_DPS_KD,
-
-        SET_MOTOR_LIMITS,
-
-        OFFSET_MOTOR_ENCODER,
-
-        GET_MOTOR_A_ENCODER,
-        GET_MOTOR_B_ENCODER,
-        GET_MOTOR_C_ENCODER,
-        GET_MOTOR_D_ENCODER,
-
-        GET_MOTOR_A_STATUS,
-        GET_MOTOR_B_STATUS,
-        GET_MOTOR_C_STATUS,
-        GET_MOTOR_D_STATUS,
-    """)
-
-    SENSOR_TYPE = Enumeration("""
-        NONE = 1,
-        I2C,
-        CUSTOM,
-
-        TOUCH,
-        NXT_TOUCH,
-        EV3_TOUCH,
-
-        NXT_LIGHT_ON,
-        NXT_LIGHT_OFF,
-
-        NXT_COLOR_RED,
-        NXT_COLOR_GREEN,
-        NXT_COLOR_BLUE,
-        NXT_COLOR_FULL,
-        NXT_COLOR_OFF,
-
-        NXT_ULTRASONIC,
-
-        EV3_GYRO_ABS,
-        EV3_GYRO_DPS,
-        EV3_GYRO_ABS_DPS,
-
-        EV3_COLOR_REFLECTED,
-        EV3_COLOR_AMBIENT,
-        EV3_COLOR_COLOR,
-        EV3_COLOR_RAW_REFLECTED,
-        EV3_COLOR_COLOR_COMPONENTS,
-
-        EV3_ULTRASONIC_CM,
-        EV3_ULTRASONIC_INCHES,
-        EV3_ULTRASONIC_LISTEN,
-
-        EV3_INFRARED_PROXIMITY,
-        EV3_INFRARED_SEEK,
-        EV3_INFRARED_REMOTE,
-    """)
-
-    SENSOR_STATE = Enumeration("""
-        VALID_DATA,
-        NOT_CONFIGURED,
-        CONFIGURING,
-        NO_DATA,
-        I2C_ERROR,
-    """)
-
-    SENSOR_CUSTOM = Enumeration("""
-        PIN1_9V,
-        PIN5_OUT,
-        PIN5_STATE,
-        PIN6_OUT,
-        PIN6_STATE,
-        PIN1_ADC,
-        PIN6_ADC,
-    """)
+        "GET_MANUFACTURER": 1,
+        "GET_NAME": 2,
+        "GET_HARDWARE_VERSION": 3,
+        "GET_FIRMWARE_VERSION": 4,
+        "GET_ID": 5,
+        "SET_LED": 6,
+        "GET_VOLTAGE_3V3": 7,
+        "GET_VOLTAGE_5V": 8,
+        "GET_VOLTAGE_9V": 9,
+        "GET_VOLTAGE_VCC": 10,
+        "SET_ADDRESS": 11,
+
+        "SET_SENSOR_TYPE": 12,
+
+        "GET_SENSOR_1": 13,
+        "GET_SENSOR_2": 14,
+        "GET_SENSOR_3": 15,
+        "GET_SENSOR_4": 16,
+
+        "I2C_TRANSACT_1": 17,
+        "I2C_TRANSACT_2": 18,
+        "I2C_TRANSACT_3": 19,
+        "I2C_TRANSACT_4": 20,
+
+        "SET_MOTOR_POWER": 21,
+
+        "SET_MOTOR_POSITION": 22,
+
+        "SET_MOTOR_POSITION_KP": 23,
+
+        "SET_MOTOR_POSITION_KD": 24,
+
+        "SET_MOTOR_DPS": 25,
+
+        "SET_MOTOR_DPS_KP": 26,
+
+        "SET_MOTOR_DPS_KD": 27,
+
+        "SET_MOTOR_LIMITS": 28,
+
+        "OFFSET_MOTOR_ENCODER": 29,
+
+        "GET_MOTOR_A_ENCODER": 30,
+        "GET_MOTOR_B_ENCODER": 31,
+        "GET_MOTOR_C_ENCODER": 32,
+        "GET_MOTOR_D_ENCODER": 33,
+
+        "GET_MOTOR_A_STATUS": 34,
+        "GET_MOTOR_B_STATUS": 35,
+        "GET_MOTOR_C_STATUS": 36,
+        "GET_MOTOR_D_STATUS": 37,
+    })
+
+    SENSOR_TYPE = Enumeration({
+        "NONE": 1,
+        "I2C": 2,
+        "CUSTOM": 3,
+
+        "TOUCH": 4,
+        "NXT_TOUCH": 5,
+        "EV3_TOUCH": 6,
+
+        "NXT_LIGHT_ON": 7,
+        "NXT_LIGHT_OFF": 8,
+
+        "NXT_COLOR_RED": 9,
+        "NXT_COLOR_GREEN": 10,
+        "NXT_COLOR_BLUE": 11,
+        "NXT_COLOR_FULL": 12,
+        "NXT_COLOR_OFF": 13,
+
+        "NXT_ULTRASONIC": 14,
+
+        "EV3_GYRO_ABS": 15,
+        "EV3_GYRO_DPS": 16,
+        "EV3_GYRO_ABS_DPS": 17,
+
+        "EV3_COLOR_REFLECTED": 18,
+        "EV3_COLOR_AMBIENT": 19,
+        "EV3_COLOR_COLOR": 20,
+        "EV3_COLOR_RAW_REFLECTED": 21,
+        "EV3_COLOR_COLOR_COMPONENTS": 22,
+
+        "EV3_ULTRASONIC_CM": 23,
+        "EV3_ULTRASONIC_INCHES": 24,
+        "EV3_ULTRASONIC_LISTEN": 25,
+
+        "EV3_INFRARED_PROXIMITY": 26,
+        "EV3_INFRARED_SEEK": 27,
+        "EV3_INFRARED_REMOTE": 28,
+    })
+
+    SENSOR_STATE = Enumeration({
+        "VALID_DATA": 0,
+        "NOT_CONFIGURED": 1,
+        "CONFIGURING": 2,
+        "NO_DATA": 3,
+        "I2C_ERROR": 4,
+    })
+
+    SENSOR_CUSTOM = Enumeration({
+        "PIN1_9V":    0x0002,
+        "PIN5_OUT":   0x0010,
+        "PIN5_STATE": 0x0020,
+        "PIN6_OUT":   0x0100,
+        "PIN6_STATE": 0x0200,
+        "PIN1_ADC":   0x1000,
+        "PIN6_ADC":   0x4000,
+    })
     """
     Flags for use with SENSOR_TYPE.CUSTOM
 
@@ -283,59 +716,66 @@ class BrickPi3(object):
         Enable the analog/digital converter on pin 6.
     """
 
-    SENSOR_CUSTOM.PIN1_9V    = 0x0002
-    SENSOR_CUSTOM.PIN5_OUT   = 0x0010
-    SENSOR_CUSTOM.PIN5_STATE = 0x0020
-    SENSOR_CUSTOM.PIN6_OUT   = 0x0100
-    SENSOR_CUSTOM.PIN6_STATE = 0x0200
-    SENSOR_CUSTOM.PIN1_ADC   = 0x1000
-    SENSOR_CUSTOM.PIN6_ADC   = 0x4000
-
-    SENSOR_I2C_SETTINGS = Enumeration("""
-        MID_CLOCK,
-        PIN1_9V,
-        SAME,
-        ALLOW_STRETCH_ACK,
-        ALLOW_STRETCH_ANY,
-    """)
-
-    SENSOR_I2C_SETTINGS.MID_CLOCK         = 0x01 # Send the clock pulse between reading and writing. Required by the NXT US sensor.
-    SENSOR_I2C_SETTINGS.PIN1_9V           = 0x02 # 9v pullup on pin 1
-    SENSOR_I2C_SETTINGS.SAME              = 0x04 # Keep performing the same transaction e.g. keep polling a sensor
-
-    MOTOR_STATUS_FLAG = Enumeration("""
-        LOW_VOLTAGE_FLOAT,
-        OVERLOADED,
-    """)
-
-    MOTOR_STATUS_FLAG.LOW_VOLTAGE_FLOAT = 0x01 # If the motors are floating due to low battery voltage
-    MOTOR_STATUS_FLAG.OVERLOADED        = 0x02 # If the motors aren't close to the target (applies to position control and dps speed control).
+    SENSOR_I2C_SETTINGS = Enumeration({
+        "MID_CLOCK":         0x01, # Send the clock pulse between reading and writing. Required by the NXT US sensor.
+        "PIN1_9V":           0x02, # 9v pullup on pin 1
+        "SAME":              0x04, # Keep performing the same transaction e.g. keep polling a sensor
+        "ALLOW_STRETCH_ACK": 3,
+        "ALLOW_STRETCH_ANY": 4,
+    })
+
+    MOTOR_STATUS_FLAG = Enumeration({
+        "LOW_VOLTAGE_FLOAT": 0x01, # If the motors are floating due to low battery voltage
+        "OVERLOADED":        0x02, # If the motors aren't close to the target (applies to position control and dps speed control).
+    })
 
     #SUCCESS = 0
     #SPI_ERROR = 1
     #SENSOR_ERROR = 2
     #SENSOR_TYPE_ERROR = 3
 
-    def __init__(self, addr = 1, detect = True): # Configure for the BrickPi. Optionally set the address (default to 1). Optionally disable detection (default to detect).
+    def __init__(self, addr = 1, detect = True, transport = None, spi_speed = None, cache_writes = True): # Configure for the BrickPi. Optionally set the address (default to 1). Optionally disable detection (default to detect).
         """
         Do any necessary configuration, and optionally detect the BrickPi3
 
         Optionally specify the SPI address as something other than 1
         Optionally disable the detection of the BrickPi3 hardware. This can be used for debugging and testing when the BrickPi3 would otherwise not pass the detection tests.
+        Optionally specify the SPI transport. By default the SPI bus of the Raspberry Pi is used. Pass a brickpi3.emulator.EmulatorTransport to run without hardware.
+        Optionally specify the SPI clock speed in Hz. By default a speed suited to the model of Raspberry Pi is used. See also calibrate_spi_speed.
+        Optionally disable the write cache. By default the setters skip writes of the value the board was last sent (see _unchanged).
+        Disable it if another process also controls the BrickPi3.
         """
-        # Initialize SPI on first use
-        _init_spi()
-
         if addr < 1 or addr > 255:
             raise IOError("error: SPI address must be in the range of 1 to 255")
             return
 
+        # Initialize SPI on first use
+        if transport is None:
+            transport = _init_spi()
+        self.transport = transport
+        self._bus = _bus_state(transport)
+        if spi_speed is not None:
+            self.set_spi_speed(spi_speed)
+
         self.SPI_Address = addr
+        self._local = _ThreadState(addr)
+        self.cache_writes = cache_writes
+
+        # The sensor configuration is shared with any other BrickPi3 object for the same board
+        self._board = self._bus.board(addr)
+        self.SensorType = self._board.sensor_type
+        self.I2CInBytes = self._board.i2c_in_bytes
+        self.snapshot = None # the latest Snapshot read by the poller
+        self.poller = None
+        self.snapshot_writer = None # publishes each snapshot to shared memory, see publish_snapshots
+        self.history = None # records each snapshot, see record_history
         if detect == True:
             try:
                 manufacturer = self.get_manufacturer()
                 board = self.get_board()
                 vfw = self.get_version_firmware()
+            except SpiDeviceError:
+                raise
             except IOError:
                 raise IOError("No SPI response")
             if manufacturer != "Dexter Industries" or board != "BrickPi3":
@@ -355,7 +795,392 @@ class BrickPi3(object):
 
         Returns a list of the bytes read.
         """
-        return BP_SPI.xfer2(data_out)
+        with self._bus.lock:
+            return self.transport.transfer(data_out)
+
+    def spi_transfer_many(self, messages):
+        """
+        Conduct several SPI transactions in one bus operation
+
+        Keyword arguments:
+        messages -- a list of messages, each a list of bytes to send
+
+        Returns a list with the bytes read for each message.
+        """
+        with self._bus.lock:
+            return self.transport.transfer_many(messages)
+
+    def _transact(self, outArray, decode = None, write = None):
+        """
+        Send a message, or queue it if a batch is active in this thread
+
+        Keyword arguments:
+        outArray -- the bytes to send
+        decode = None -- a function that converts the bytes read into the return value
+        write = None -- for the message of a setter, the (kind, port, value) to record in the write cache once it is sent
+
+        Returns the decoded value, or a BatchResult if the message was queued.
+        """
+        batch = self._local.batch
+        if batch is not None:
+            return batch.add(outArray, decode, None if write is None else (self._board,) + write)
+        try:
+            reply = self.spi_transfer_array(outArray)
+        except Exception: # the board may not have received the values written
+            self._board.forget_writes()
+            raise
+        if write is not None:
+            self._board.record_write(*write)
+        if decode is not None:
+            try:
+                return decode(bytearray(reply))
+            except IOError:
+                self._bus.spi_error(self.transport)
+                raise
+
+    def _transact_message(self, message, decode = None, write = None):
+        """
+        Send a preallocated message, or queue a copy of it if a batch is active in this thread
+
+        Keyword arguments:
+        message -- the SpiMessage to send
+        decode = None -- a function that converts the bytes read into the return value
+        write = None -- for the message of a setter, the (kind, port, value) to record in the write cache once it is sent
+
+        Returns the decoded value, or a BatchResult if the message was queued.
+        """
+        batch = self._local.batch
+        if batch is not None:
+            return batch.add(list(message.tx), decode, None if write is None else (self._board,) + write)
+        # acquire and release rather than "with", which allocates on every call
+        lock = self._bus.lock
+        lock.acquire()
+        try:
+            self.transport.transfer_message(message)
+        except Exception: # the board may not have received the values written
+            self._board.forget_writes()
+            raise
+        finally:
+            lock.release()
+        if write is not None:
+            self._board.record_write(*write)
+        if decode is not None:
+            try:
+                return decode(message.rx)
+            except IOError:
+                self._bus.spi_error(self.transport)
+                raise
+            except SensorNotConfiguredError:
+                self._board.forget_writes()
+                raise
+
+    def _unchanged(self, kind, port, value, force = False):
+        """
+        Check whether a write to the board would change anything
+
+        The values are recorded once they have been sent (see the write argument of _transact_message), and
+        are forgotten when a transfer fails or a reset of the board is detected: when it stops responding,
+        or reports a configured sensor port as not configured. Call with the board lock held, and keep it
+        until the write has been sent, so that the cache agrees with the board when several threads write.
+
+        Keyword arguments:
+        kind -- the _WRITE_ kind of setting
+        port -- the port(s) written
+        value -- the value written, in a form that can be compared with earlier writes
+        force = False -- send the write even if the value is unchanged
+
+        Returns True if the write can be skipped, because every port was last sent the same value.
+        """
+        if force or not self.cache_writes or port == 0:
+            return False
+        written = self._board.written[kind]
+        for p in range(4):
+            if port & (1 << p) and written[p] != value:
+                return False
+        return True
+
+    def _write(self, kind, port, value, force, message):
+        """
+        Send the preallocated message of a setter, unless it wouldn't change anything. See _unchanged.
+
+        Keyword arguments:
+        kind -- the _WRITE_ kind of setting
+        port -- the port(s) written
+        value -- the value written, in a form that can be compared with earlier writes
+        force -- send the write even if the value is unchanged
+        message -- the SpiMessage to send
+        """
+        lock = self._board.lock
+        lock.acquire()
+        try:
+            if not self._unchanged(kind, port, value, force):
+                self._transact_message(message, write = (kind, port, value))
+        finally:
+            lock.release()
+
+    def batch(self):
+        """
+        Start a batch of messages to send together in one bus operation
+
+        Use the returned BrickPi3Batch as a context manager. See BrickPi3Batch for details.
+        """
+        return BrickPi3Batch(self)
+
+    def poll(self):
+        """
+        Read every configured sensor, all four motor statuses and the battery voltage in one bus transfer
+
+        The result is also stored in self.snapshot, for reads that use max_age.
+
+        Returns a Snapshot.
+        """
+        return _read_snapshots([self], self.batch())[0]
+
+    def _transact_messages(self, messages):
+        """
+        Send several preallocated messages in one bus transfer
+
+        Keyword arguments:
+        messages -- a list of SpiMessages. The bytes read are stored in each message's rx.
+        """
+        lock = self._bus.lock
+        lock.acquire()
+        try:
+            self.transport.transfer_messages(messages)
+        finally:
+            lock.release()
+
+    def get_sensors(self, port_mask = 0x0F):
+        """
+        Read several sensors in one bus transfer
+
+        Keyword arguments:
+        port_mask = 0x0F -- The sensor ports. PORT_1, PORT_2, PORT_3, and/or PORT_4. Defaults to all four.
+
+        Returns a SensorReadings. A port that can't be read (for example a SensorError while it is
+        configuring) has its exception in errors, and doesn't prevent reading the other ports.
+        """
+        if self._local.batch is not None:
+            raise IOError("get_sensors error: can't be called while a batch is active.")
+        values = [None, None, None, None]
+        errors = [None, None, None, None]
+        reads = self._sensor_messages(port_mask, errors)
+        self._transact_messages(reads)
+        self._decode_sensor_messages(reads, values, errors)
+        return SensorReadings(tuple(values), tuple(errors))
+
+    def _sensor_messages(self, port_mask, errors):
+        """
+        Return this thread's preallocated get_sensor messages for several ports
+
+        Keyword arguments:
+        port_mask -- the sensor ports
+        errors -- a list, indexed by port, that receives the error for a port that isn't configured
+        """
+        reads = []
+        for p in range(4):
+            if port_mask & (1 << p):
+                plan = self._board.read_plans[p]
+                read = self._local.sensor_reads[p]
+                if read is None or read.plan is not plan:
+                    try:
+                        read = self._bind_sensor_read(p, self.BPSPI_MESSAGE_TYPE.GET_SENSOR_1 + p, plan)
+                    except IOError as error: # not configured
+                        errors[p] = error
+                        continue
+                reads.append(read)
+        return reads
+
+    def _decode_sensor_messages(self, reads, values, errors):
+        """
+        Decode the replies to messages from _sensor_messages
+
+        Keyword arguments:
+        reads -- the messages, after they were sent
+        values -- a list, indexed by port, that receives each sensor value
+        errors -- a list, indexed by port, that receives the error for a port that couldn't be read
+        """
+        for read in reads:
+            p = read.tx[1] - self.BPSPI_MESSAGE_TYPE.GET_SENSOR_1
+            try:
+                values[p] = read.plan.decode(read.rx)
+            except SensorNotConfiguredError as error:
+                self._board.forget_writes()
+                errors[p] = error
+            except SensorError as error:
+                errors[p] = error
+            except IOError as error:
+                self._bus.spi_error(self.transport)
+                errors[p] = error
+
+    def get_motor_statuses(self, port_mask = 0x0F):
+        """
+        Read several motor statuses in one bus transfer
+
+        Keyword arguments:
+        port_mask = 0x0F -- The motor ports. PORT_A, PORT_B, PORT_C, and/or PORT_D. Defaults to all four.
+
+        Returns a tuple with a MotorStatus for each motor port, indexed from 0 for PORT_A to 3 for
+        PORT_D. Ports that weren't read are None.
+        """
+        if self._local.batch is not None:
+            raise IOError("get_motor_statuses error: can't be called while a batch is active.")
+        messages = [self._local.messages[self.BPSPI_MESSAGE_TYPE.GET_MOTOR_A_STATUS + p] for p in range(4) if port_mask & (1 << p)]
+        self._transact_messages(messages)
+        statuses = [None, None, None, None]
+        try:
+            for message in messages:
+                statuses[message.tx[1] - self.BPSPI_MESSAGE_TYPE.GET_MOTOR_A_STATUS] = MotorStatus(*_decode_motor_status(message.rx))
+        except IOError:
+            self._bus.spi_error(self.transport)
+            raise
+        return tuple(statuses)
+
+    def stream(self, sensors = 0, encoders = 0, hz = 100, count = None):
+        """
+        Read sensors and motor encoders at a fixed rate
+
+        Each sample reads all of the ports in one bus transfer. The samples are scheduled from the
+        time of the first one, so the rate doesn't drift. If a sample is late by more than a period
+        (because the consumer was busy), the deadlines that were missed are skipped and counted in
+        the stream's missed attribute.
+
+        Keyword arguments:
+        sensors = 0 -- The sensor ports. PORT_1, PORT_2, PORT_3, and/or PORT_4.
+        encoders = 0 -- The motor ports to read the encoders of. PORT_A, PORT_B, PORT_C, and/or PORT_D.
+        hz = 100 -- the number of samples per second
+        count = None -- the number of samples to take, or None to stream until the stream is closed
+
+        Returns a Stream, an iterator of Samples: (timestamp_ns, values). timestamp_ns is the transport
+        clock time in nanoseconds, and values is a tuple with the value of each sensor port and then
+        each encoder, in port order. A sensor value is None if the sensor couldn't be read, for example
+        while it is configuring.
+        """
+        from .stream import Stream # imported here, because it imports this module
+        return Stream(self, sensors, encoders, hz, count)
+
+    def start_poller(self, hz = 100):
+        """
+        Start reading the sensors, motor status and battery voltage in a background thread
+
+        Each poll reads every configured sensor port, all four motor statuses and the battery
+        voltage in one bus transfer, and publishes them as an immutable Snapshot in self.snapshot.
+        get_sensor, get_motor_status, get_motor_encoder and get_voltage_battery return values
+        from the snapshot instead of reading the BrickPi3 when called with max_age.
+
+        Keyword arguments:
+        hz = 100 -- the number of times to poll per second
+
+        Returns the Poller.
+        """
+        if self.poller is None:
+            self.poller = Poller(self, hz)
+            self.poller.start()
+        return self.poller
+
+    def stop_poller(self):
+        """Stop the background poller started with start_poller"""
+        if self.poller is not None:
+            self.poller.stop()
+            self.poller = None
+
+    def publish_snapshots(self, path = None):
+        """
+        Publish every new snapshot to shared memory, for other processes to read with brickpi3.SnapshotReader
+
+        Keyword arguments:
+        path = None -- the shared memory file. Defaults to /dev/shm/brickpi3-<SPI address>.
+
+        Returns the path.
+        """
+        from .shm import SnapshotWriter, default_path
+        if path is None:
+            path = default_path(self.SPI_Address)
+        if self.snapshot_writer is not None:
+            self.snapshot_writer.close()
+        self.snapshot_writer = SnapshotWriter(path)
+        return path
+
+    def record_history(self, capacity = 1000):
+        """
+        Record every new snapshot in a fixed size history of each sensor and motor value
+
+        Keyword arguments:
+        capacity = 1000 -- the number of values kept for each sensor and motor value. Older values are overwritten.
+
+        Returns the brickpi3.history.History. Snapshots are read by the poller (see start_poller) and by poll().
+        """
+        from .history import History
+        self.history = History(capacity)
+        return self.history
+
+    def _fresh_snapshot(self, max_age):
+        """Return the latest snapshot if it is no older than max_age seconds, otherwise None"""
+        snapshot = self.snapshot
+        if snapshot is not None and (self.transport.clock.monotonic() - snapshot.timestamp) <= max_age:
+            return snapshot
+        return None
+
+    def get_spi_speed(self):
+        """
+        Get the SPI clock speed
+
+        Returns the speed in Hz, or None if the transport's speed can't be changed.
+        """
+        return self.transport.speed_hz
+
+    def set_spi_speed(self, speed_hz):
+        """
+        Set the SPI clock speed. The speed is shared by every BrickPi3 on the bus.
+
+        Keyword arguments:
+        speed_hz -- the speed in Hz
+        """
+        if self.transport.speed_hz is None:
+            raise IOError("set_spi_speed error: the SPI speed of this transport can't be changed")
+        with self._bus.lock:
+            self.transport.speed_hz = int(speed_hz)
+
+    def calibrate_spi_speed(self, speeds = SPI_SPEEDS, trials = 20):
+        """
+        Find the fastest SPI clock speed that the BrickPi3 responds to reliably, and use it
+
+        Starting from the slowest speed, the manufacturer and serial number are read trials times at
+        each speed, and compared with the values read at the current speed. Stepping up stops at the
+        first speed that gives a wrong or missing response.
+
+        Keyword arguments:
+        speeds = SPI_SPEEDS -- the speeds to try in Hz
+        trials = 20 -- the number of times to check each speed
+
+        Returns the chosen speed in Hz.
+        """
+        original = self.get_spi_speed()
+        expected = self._read_echo()
+        best = None
+        for speed in sorted(speeds):
+            self.set_spi_speed(speed)
+            try:
+                reliable = all(self._read_echo() == expected for t in range(trials))
+            except IOError:
+                reliable = False
+            if not reliable:
+                break
+            best = speed
+        if best is None:
+            self.set_spi_speed(original)
+            raise IOError("calibrate_spi_speed error: no reliable SPI speed found")
+        self.set_spi_speed(best)
+        return best
+
+    def _read_echo(self):
+        """
+        Read the manufacturer and the serial number in one transfer, for checking the bus
+
+        The replies are decoded directly, so that errors don't count towards reducing the SPI speed.
+        """
+        replies = self.spi_transfer_many([PROTOCOL.GET_MANUFACTURER.encode(self.SPI_Address), PROTOCOL.GET_ID.encode(self.SPI_Address)])
+        return (PROTOCOL.GET_MANUFACTURER.decode(bytearray(replies[0])), PROTOCOL.GET_ID.decode(bytearray(replies[1])))
 
     def spi_write_8(self, MessageType, Value):
         """
@@ -365,8 +1190,8 @@ class BrickPi3(object):
         MessageType -- the SPI message type
         Value -- the value to be sent
         """
-        outArray = [self.SPI_Address, MessageType, (int(Value) & 0xFF)]
-        self.spi_transfer_array(outArray)
+        outArray = [self.SPI_Address, MessageType] + _WRITE_8.pack(Value)
+        self._transact(outArray)
 
     def spi_read_16(self, MessageType):
         """
@@ -378,12 +1203,8 @@ class BrickPi3(object):
         Returns:
         value
         """
-        outArray = [self.SPI_Address, MessageType, 0, 0, 0, 0]
-        reply = self.spi_transfer_array(outArray)
-        if(reply[3] == 0xA5):
-            return int((reply[4] << 8) | reply[5])
-        raise IOError("No SPI response")
-        return
+        outArray = [self.SPI_Address, MessageType] + [0] * (_READ_16.length - 2)
+        return self._transact(outArray, _READ_16.decode)
 
     def spi_write_16(self, MessageType, Value):
         """
@@ -393,8 +1214,8 @@ class BrickPi3(object):
         MessageType -- the SPI message type
         Value -- the value to be sent
         """
-        outArray = [self.SPI_Address, MessageType, ((Value >> 8) & 0xFF), (Value & 0xFF)]
-        self.spi_transfer_array(outArray)
+        outArray = [self.SPI_Address, MessageType] + _WRITE_16.pack(Value)
+        self._transact(outArray)
 
     def spi_write_24(self, MessageType, Value):
         """
@@ -404,8 +1225,8 @@ class BrickPi3(object):
         MessageType -- the SPI message type
         Value -- the value to be sent
         """
-        outArray = [self.SPI_Address, MessageType, ((Value >> 16) & 0xFF), ((Value >> 8) & 0xFF), (Value & 0xFF)]
-        self.spi_transfer_array(outArray)
+        outArray = [self.SPI_Address, MessageType] + _WRITE_24.pack(Value >> 16, Value)
+        self._transact(outArray)
 
     def spi_read_32(self, MessageType):
         """
@@ -417,12 +1238,8 @@ class BrickPi3(object):
         Returns :
         value
         """
-        outArray = [self.SPI_Address, MessageType, 0, 0, 0, 0, 0, 0]
-        reply = self.spi_transfer_array(outArray)
-        if(reply[3] == 0xA5):
-            return int((reply[4] << 24) | (reply[5] << 16) | (reply[6] << 8) | reply[7])
-        raise IOError("No SPI response")
-        return
+        outArray = [self.SPI_Address, MessageType] + [0] * (_READ_32.length - 2)
+        return self._transact(outArray, _READ_32.decode)
 
     def spi_write_32(self, MessageType, Value):
         """
@@ -432,8 +1249,8 @@ class BrickPi3(object):
         MessageType -- the SPI message type
         Value -- the value to be sent
         """
-        outArray = [self.SPI_Address, MessageType, ((Value >> 24) & 0xFF), ((Value >> 16) & 0xFF), ((Value >> 8) & 0xFF), (Value & 0xFF)]
-        self.spi_transfer_array(outArray)
+        outArray = [self.SPI_Address, MessageType] + _WRITE_32.pack(Value)
+        self._transact(outArray)
 
     def get_manufacturer(self):
         """
@@ -442,18 +1259,7 @@ class BrickPi3(object):
         Returns:
         BrickPi3 manufacturer name string
         """
-        outArray = [self.SPI_Address, self.BPSPI_MESSAGE_TYPE.GET_MANUFACTURER, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-        reply = self.spi_transfer_array(outArray)
-        if(reply[3] == 0xA5):
-            name = ""
-            for c in range(4, 24):
-                if reply[c] != 0:
-                    name += chr(reply[c])
-                else:
-                    break
-            return name
-        raise IOError("No SPI response")
-        return
+        return self._transact(PROTOCOL.GET_MANUFACTURER.encode(self.SPI_Address), PROTOCOL.GET_MANUFACTURER.decode)
 
     def get_board(self):
         """
@@ -462,18 +1268,7 @@ class BrickPi3(object):
         Returns:
         BrickPi3 board name string
         """
-        outArray = [self.SPI_Address, self.BPSPI_MESSAGE_TYPE.GET_NAME, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-        reply = self.spi_transfer_array(outArray)
-        if(reply[3] == 0xA5):
-            name = ""
-            for c in range(4, 24):
-                if reply[c] != 0:
-                    name += chr(reply[c])
-                else:
-                    break
-            return name
-        raise IOError("No SPI response")
-        return
+        return self._transact(PROTOCOL.GET_NAME.encode(self.SPI_Address), PROTOCOL.GET_NAME.decode)
 
     def get_version_hardware(self):
         """
@@ -482,8 +1277,7 @@ class BrickPi3(object):
         Returns:
         hardware version
         """
-        version = self.spi_read_32(self.BPSPI_MESSAGE_TYPE.GET_HARDWARE_VERSION)
-        return ("%d.%d.%d" % ((version / 1000000), ((version / 1000) % 1000), (version % 1000)))
+        return self._transact(PROTOCOL.GET_HARDWARE_VERSION.encode(self.SPI_Address), _decode_version)
 
     def get_version_firmware(self):
         """
@@ -492,8 +1286,7 @@ class BrickPi3(object):
         Returns:
         firmware version
         """
-        version = self.spi_read_32(self.BPSPI_MESSAGE_TYPE.GET_FIRMWARE_VERSION)
-        return ("%d.%d.%d" % ((version / 1000000), ((version / 1000) % 1000), (version % 1000)))
+        return self._transact(PROTOCOL.GET_FIRMWARE_VERSION.encode(self.SPI_Address), _decode_version)
 
     def get_id(self):
         """
@@ -502,21 +1295,19 @@ class BrickPi3(object):
         Returns:
         serial number as 32 char HEX formatted string
         """
-        outArray = [self.SPI_Address, self.BPSPI_MESSAGE_TYPE.GET_ID, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-        reply = self.spi_transfer_array(outArray)
-        if(reply[3] == 0xA5):
-            return ("%02X%02X%02X%02X%02X%02X%02X%02X%02X%02X%02X%02X%02X%02X%02X%02X" % (reply[4], reply[5], reply[6], reply[7], reply[8], reply[9], reply[10], reply[11], reply[12], reply[13], reply[14], reply[15], reply[16], reply[17], reply[18], reply[19]))
-        raise IOError("No SPI response")
-        return
+        return self._transact(PROTOCOL.GET_ID.encode(self.SPI_Address), PROTOCOL.GET_ID.decode)
 
-    def set_led(self, value):
+    def set_led(self, value, force = False):
         """
         Control the onboard LED
 
         Keyword arguments:
         value -- the value (in percent) to set the LED brightness to. -1 returns control of the LED to the firmware.
+        force = False -- send the value even if it is the value last sent
         """
-        self.spi_write_8(self.BPSPI_MESSAGE_TYPE.SET_LED, value)
+        message = self._local.messages[self.BPSPI_MESSAGE_TYPE.SET_LED]
+        PROTOCOL.SET_LED.pack_into(message.tx, value)
+        self._write(_WRITE_LED, 1, value, force, message)
 
     def get_voltage_3v3(self):
         """
@@ -525,8 +1316,7 @@ class BrickPi3(object):
         Returns:
         3.3v circuit voltage
         """
-        value = self.spi_read_16(self.BPSPI_MESSAGE_TYPE.GET_VOLTAGE_3V3)
-        return (value / 1000.0)
+        return self._transact_message(self._local.messages[self.BPSPI_MESSAGE_TYPE.GET_VOLTAGE_3V3], _decode_voltage)
 
     def get_voltage_5v(self):
         """
@@ -535,8 +1325,7 @@ class BrickPi3(object):
         Returns:
         5v circuit voltage
         """
-        value = self.spi_read_16(self.BPSPI_MESSAGE_TYPE.GET_VOLTAGE_5V)
-        return (value / 1000.0)
+        return self._transact_message(self._local.messages[self.BPSPI_MESSAGE_TYPE.GET_VOLTAGE_5V], _decode_voltage)
 
     def get_voltage_9v(self):
         """
@@ -545,20 +1334,25 @@ class BrickPi3(object):
         Returns:
         9v circuit voltage
         """
-        value = self.spi_read_16(self.BPSPI_MESSAGE_TYPE.GET_VOLTAGE_9V)
-        return (value / 1000.0)
+        return self._transact_message(self._local.messages[self.BPSPI_MESSAGE_TYPE.GET_VOLTAGE_9V], _decode_voltage)
 
-    def get_voltage_battery(self):
+    def get_voltage_battery(self, max_age = None):
         """
         Get the battery voltage
 
+        Keyword arguments:
+        max_age = None -- if the poller read the voltage within this many seconds, return that value instead of reading it
+
         Returns:
         battery voltage
         """
-        value = self.spi_read_16(self.BPSPI_MESSAGE_TYPE.GET_VOLTAGE_VCC)
-        return (value / 1000.0)
+        if max_age is not None:
+            snapshot = self._fresh_snapshot(max_age)
+            if snapshot is not None:
+                return snapshot.voltage_battery
+        return self._transact_message(self._local.messages[self.BPSPI_MESSAGE_TYPE.GET_VOLTAGE_VCC], _decode_voltage)
 
-    def set_sensor_type(self, port, type, params = 0):
+    def set_sensor_type(self, port, type, params = 0, force = False):
         """
         Set the sensor type
 
@@ -566,6 +1360,7 @@ class BrickPi3(object):
         port -- The sensor port(s). PORT_1, PORT_2, PORT_3, and/or PORT_4.
         type -- The sensor type
         params = 0 -- the parameters needed for some sensor types.
+        force = False -- configure the port(s) even if they were last set to the same type and params
 
         params is used for the following sensor types:
             CUSTOM -- a 16-bit integer used to configure the hardware.
@@ -578,32 +1373,138 @@ class BrickPi3(object):
                     params[4] -- List of bytes to write
                     params[5] -- Number of bytes to read
         """
+        with self._board.lock:
+            outArray = self._use_sensor_type(port, type, params)
+            written = tuple(outArray[3:]) # the type and params
+            if not self._unchanged(_WRITE_SENSOR_TYPE, port, written, force):
+                self._transact(outArray, write = (_WRITE_SENSOR_TYPE, port, written))
+
+    def _use_sensor_type(self, port, type, params):
+        """
+        Set up the reads of the port(s) for a sensor type, without sending anything to the board
+
+        Call with the board lock held. Returns the SET_SENSOR_TYPE message that configures the board.
+        """
         for p in range(4):
             if port & (1 << p):
                 self.SensorType[p] = type
         if(type == self.SENSOR_TYPE.CUSTOM):
-            outArray = [self.SPI_Address, self.BPSPI_MESSAGE_TYPE.SET_SENSOR_TYPE, int(port), type, ((params[0] >> 8) & 0xFF), (params[0] & 0xFF)]
-
-            #self.spi_write_24(self.BPSPI_MESSAGE_TYPE.SET_SENSOR_TYPE, int(port), ((type << 16) + (params[0])))
+            outArray = PROTOCOL.SET_SENSOR_TYPE.encode(self.SPI_Address, port, type) + CUSTOM_PARAMETERS.pack(params[0])
         elif(type == self.SENSOR_TYPE.I2C):
             if len(params) >= 2:
-                outArray = [self.SPI_Address, self.BPSPI_MESSAGE_TYPE.SET_SENSOR_TYPE, int(port), type, params[0], params[1]] # Settings, SpeedUS
+                outArray = PROTOCOL.SET_SENSOR_TYPE.encode(self.SPI_Address, port, type) + I2C_PARAMETERS.pack(params[0], params[1]) # Settings, SpeedUS
                 if params[0] & self.SENSOR_I2C_SETTINGS.SAME and len(params) >= 6:
-                    outArray.append((params[2] >> 24) & 0xFF) # DelayUS
-                    outArray.append((params[2] >> 16) & 0xFF) #   ''
-                    outArray.append((params[2] >> 8) & 0xFF)  #   ''
-                    outArray.append(params[2] & 0xFF)         #   ''
-                    outArray.append(params[3] & 0xFF)   # Address
-                    outArray.append(params[5] & 0xFF)   # InBytes
+                    outArray.extend(I2C_SAME_PARAMETERS.pack(params[2], params[3], params[5], len(params[4]))) # DelayUS, Address, InBytes, OutBytes
                     for p in range(4):
                         if port & (1 << p):
                             self.I2CInBytes[p] = params[5] & 0xFF
-                    outArray.append(len(params[4]))     # OutBytes
                     outArray.extend(params[4])          # OutArray
         else:
-            outArray = [self.SPI_Address, self.BPSPI_MESSAGE_TYPE.SET_SENSOR_TYPE, int(port), type]
+            outArray = PROTOCOL.SET_SENSOR_TYPE.encode(self.SPI_Address, port, type)
 
-        self.spi_transfer_array(outArray)
+        for p in range(4):
+            if port & (1 << p):
+                sensor_filter = self._board.sensor_filters[p]
+                if hasattr(sensor_filter, "reset"): # the values of the old sensor type don't apply
+                    sensor_filter.reset()
+                self._board.read_plans[p] = _filtered_plan(_read_plan(type, self.I2CInBytes[p]), sensor_filter, self._board.lock)
+        return outArray
+
+    def configure_sensors(self, types, timeout = 60.0):
+        """
+        Set the sensor types of several ports, and wait for the sensors in the background
+
+        Keyword arguments:
+        types -- a dict with the sensor type for each sensor port (one port per entry), such as {BP.PORT_1: BP.SENSOR_TYPE.EV3_GYRO_ABS}.
+                 Use a tuple of (type, params) for the sensor types that need params. See set_sensor_type.
+        timeout = 60.0 -- the longest time in seconds to wait for the sensors
+
+        The pending ports are read together, first after SENSOR_POLL_MIN seconds and then backing off to SENSOR_POLL_MAX.
+
+        Returns a dict with a concurrent.futures.Future for each port. Each future's result is the first valid value
+        read from the port. If the port isn't ready within the timeout, the future's exception is a SensorError.
+        """
+        import concurrent.futures # imported here, as it takes longer to import than the rest of the drivers
+        ports = (self.PORT_1, self.PORT_2, self.PORT_3, self.PORT_4)
+        for port in types:
+            if port not in ports:
+                raise IOError("configure_sensors error. Must be one sensor port per entry. PORT_1, PORT_2, PORT_3, or PORT_4.")
+        futures = {}
+        with self.batch():
+            for port in types:
+                if isinstance(types[port], tuple):
+                    self.set_sensor_type(port, *types[port])
+                else:
+                    self.set_sensor_type(port, types[port])
+                futures[port] = concurrent.futures.Future()
+        waiter = threading.Thread(target = self._wait_for_sensors, args = (dict(futures), timeout), name = "BrickPi3 sensor configuration", daemon = True)
+        waiter.start()
+        return futures
+
+    def _wait_for_sensors(self, futures, timeout):
+        """Read the ports of futures until each reports valid data, and resolve its future with the value"""
+        clock = self.transport.clock
+        deadline = clock.monotonic() + timeout
+        delay = SENSOR_POLL_MIN
+        while True:
+            for port, future in list(futures.items()):
+                if future.cancelled():
+                    del futures[port]
+                elif self._board.read_plans[port.bit_length() - 1] is None:
+                    future.set_exception(IOError("configure_sensors error: sensor type %d is not supported by get_sensor." % self.SensorType[port.bit_length() - 1]))
+                    del futures[port]
+            if not futures:
+                return
+            now = clock.monotonic()
+            if now >= deadline:
+                for port, future in futures.items():
+                    future.set_exception(SensorError("configure_sensors error: the sensor on port %d was not ready within %.1f seconds." % (port.bit_length(), timeout)))
+                return
+            clock.sleep(delay)
+            delay = min(delay * 2, SENSOR_POLL_MAX)
+            mask = 0
+            for port in futures:
+                mask |= port
+            try:
+                values, errors = self.get_sensors(mask)
+            except IOError: # keep trying through transient bus errors until the timeout
+                continue
+            for port, future in list(futures.items()):
+                p = port.bit_length() - 1
+                if errors[p] is None:
+                    if not future.cancelled():
+                        future.set_result(values[p])
+                    del futures[port]
+
+    def set_sensor_filter(self, port, *filters):
+        """
+        Filter the values read from a sensor port
+
+        Keyword arguments:
+        port -- The sensor port (one at a time). PORT_1, PORT_2, PORT_3, or PORT_4.
+        filters -- the filters to apply in order, such as brickpi3.filters.Median and brickpi3.filters.EMA.
+                   Any function of one value can be used. No filters removes the filter of the port.
+
+        The filters run once for each value read from the bus, by get_sensor, get_sensors, the poller and streams,
+        one value at a time (under the board lock) when several threads read the port. Each of these reads is a new
+        sample, so a filter that depends on the rate of its samples (like EMA) gets them faster when more threads read
+        the port. To filter at a steady rate, let the poller read the port, and read it elsewhere with max_age, which
+        returns the poller's filtered value without filtering it again.
+        Filters with a reset method (like those of brickpi3.filters) are reset when the sensor type is set.
+        """
+        if port not in (self.PORT_1, self.PORT_2, self.PORT_3, self.PORT_4):
+            raise IOError("set_sensor_filter error. Must be one sensor port at a time. PORT_1, PORT_2, PORT_3, or PORT_4.")
+        if len(filters) == 0:
+            sensor_filter = None
+        elif len(filters) == 1:
+            sensor_filter = filters[0]
+        else:
+            from .filters import Pipeline
+            sensor_filter = Pipeline(*filters)
+        p = port.bit_length() - 1
+        with self._board.lock:
+            self._board.sensor_filters[p] = sensor_filter
+            self._board.read_plans[p] = _filtered_plan(_read_plan(self.SensorType[p], self.I2CInBytes[p]), sensor_filter, self._board.lock)
 
     def transact_i2c(self, port, Address, OutArray, InBytes):
         """
@@ -631,26 +1532,24 @@ class BrickPi3(object):
             raise IOError("transact_i2c error. Must be one sensor port at a time. PORT_1, PORT_2, PORT_3, or PORT_4.")
             return
 
-        if self.SensorType[port_index] != self.SENSOR_TYPE.I2C:
-            return
-        outArray = [self.SPI_Address, message_type, Address, InBytes]
-        self.I2CInBytes[port_index] = InBytes
-        OutBytes = len(OutArray)
-        if(OutBytes > self.I2C_LENGTH_LIMIT):
-            outArray.append(self.I2C_LENGTH_LIMIT)
-            for b in range(self.I2C_LENGTH_LIMIT):
-                outArray.append(OutArray[b])
-        else:
-            outArray.append(OutBytes)
-            outArray.extend(OutArray)
-        self.spi_transfer_array(outArray)
+        OutBytes = min(len(OutArray), self.I2C_LENGTH_LIMIT)
+        outArray = PROTOCOL.spec(message_type).encode(self.SPI_Address, Address, InBytes, OutBytes)
+        outArray.extend(OutArray[:OutBytes])
+        with self._board.lock:
+            if self.SensorType[port_index] != self.SENSOR_TYPE.I2C:
+                return
+            self.I2CInBytes[port_index] = InBytes
+            self._board.read_plans[port_index] = _filtered_plan(_read_plan(self.SENSOR_TYPE.I2C, InBytes), self._board.sensor_filters[port_index], self._board.lock)
+            self._transact(outArray)
 
-    def get_sensor(self, port):
+    def get_sensor(self, port, max_age = None):
         """
         Read a sensor value
 
         Keyword arguments:
         port -- The sensor port (one at a time). PORT_1, PORT_2, PORT_3, or PORT_4.
+        max_age = None -- if the poller read the sensor within this many seconds, return that value instead of reading it.
+                          Lists returned from the snapshot are shared, and must not be modified.
 
         Returns the value(s) for the specified sensor.
             The following sensor types each return a single value:
@@ -701,216 +1600,61 @@ class BrickPi3(object):
         else:
             raise IOError("get_sensor error. Must be one sensor port at a time. PORT_1, PORT_2, PORT_3, or PORT_4.")
             return
-        if self.SensorType[port_index] == self.SENSOR_TYPE.CUSTOM:
-            outArray = [self.SPI_Address, message_type, 0, 0, 0, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if(reply[3] == 0xA5):
-                if(reply[4] == self.SensorType[port_index] and reply[5] == self.SENSOR_STATE.VALID_DATA):
-                    return [(((reply[8] & 0x0F) << 8) | reply[9]), (((reply[8] >> 4) & 0x0F) | (reply[7] << 4)), (reply[6] & 0x01), ((reply[6] >> 1) & 0x01)]
-                else:
-                    raise SensorError("get_sensor error: Invalid sensor data")
-                    return
-            else:
-                raise IOError("get_sensor error: No SPI response")
-                return
-
-        elif self.SensorType[port_index] == self.SENSOR_TYPE.I2C:
-            outArray = [self.SPI_Address, message_type, 0, 0, 0, 0]
-            for b in range(self.I2CInBytes[port_index]):
-                outArray.append(0)
-            reply = self.spi_transfer_array(outArray)
-            if(reply[3] == 0xA5):
-                if(reply[4] == self.SensorType[port_index] and reply[5] == self.SENSOR_STATE.VALID_DATA and len(reply) - 6 == self.I2CInBytes[port_index]):
-                    values = []
-                    for b in range(6, len(reply)):
-                        values.append(reply[b])
-                    return values
-                else:
-                    raise SensorError("get_sensor error: Invalid sensor data")
-                    return
-            else:
-                raise IOError("get_sensor error: No SPI response")
-                return
-
-        elif(self.SensorType[port_index] == self.SENSOR_TYPE.TOUCH
-          or self.SensorType[port_index] == self.SENSOR_TYPE.NXT_TOUCH
-          or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_TOUCH
-          or self.SensorType[port_index] == self.SENSOR_TYPE.NXT_ULTRASONIC
-          or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_COLOR_REFLECTED
-          or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_COLOR_AMBIENT
-          or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_COLOR_COLOR
-          or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_ULTRASONIC_LISTEN
-          or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_INFRARED_PROXIMITY):
-            outArray = [self.SPI_Address, message_type, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if(reply[3] == 0xA5):
-                if((reply[4] == self.SensorType[port_index] or (self.SensorType[port_index] == self.SENSOR_TYPE.TOUCH and (reply[4] == self.SENSOR_TYPE.NXT_TOUCH or reply[4] == self.SENSOR_TYPE.EV3_TOUCH))) and reply[5] == self.SENSOR_STATE.VALID_DATA):
-                    return reply[6]
-                else:
-                    raise SensorError("get_sensor error: Invalid sensor data")
-                    return
-            else:
-                raise IOError("get_sensor error: No SPI response")
-                return
-
-        elif self.SensorType[port_index] == self.SENSOR_TYPE.NXT_COLOR_FULL:
-            outArray = [self.SPI_Address, message_type, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if(reply[3] == 0xA5):
-                if(reply[4] == self.SensorType[port_index] and reply[5] == self.SENSOR_STATE.VALID_DATA):
-                    return [reply[6], ((reply[7] << 2) | ((reply[11] >> 6) & 0x03)), ((reply[8] << 2) | ((reply[11] >> 4) & 0x03)), ((reply[9] << 2) | ((reply[11] >> 2) & 0x03)), ((reply[10] << 2) | (reply[11] & 0x03))]
-                else:
-                    raise SensorError("get_sensor error: Invalid sensor data")
-                    return
-            else:
-                raise IOError("get_sensor error: No SPI response")
-                return
-
-        elif(self.SensorType[port_index] == self.SENSOR_TYPE.NXT_LIGHT_ON
-          or self.SensorType[port_index] == self.SENSOR_TYPE.NXT_LIGHT_OFF
-          or self.SensorType[port_index] == self.SENSOR_TYPE.NXT_COLOR_RED
-          or self.SensorType[port_index] == self.SENSOR_TYPE.NXT_COLOR_GREEN
-          or self.SensorType[port_index] == self.SENSOR_TYPE.NXT_COLOR_BLUE
-          or self.SensorType[port_index] == self.SENSOR_TYPE.NXT_COLOR_OFF
-          or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_GYRO_ABS
-          or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_GYRO_DPS
-          or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_ULTRASONIC_CM
-          or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_ULTRASONIC_INCHES):
-            outArray = [self.SPI_Address, message_type, 0, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if(reply[3] == 0xA5):
-                if(reply[4] == self.SensorType[port_index] and reply[5] == self.SENSOR_STATE.VALID_DATA):
-                    value = int((reply[6] << 8) | reply[7])
-                    if((self.SensorType[port_index] == self.SENSOR_TYPE.EV3_GYRO_ABS
-                    or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_GYRO_DPS)
-                    and (value & 0x8000)):
-                        value = value - 0x10000
-                    elif(self.SensorType[port_index] == self.SENSOR_TYPE.EV3_ULTRASONIC_CM
-                      or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_ULTRASONIC_INCHES):
-                        value = value / 10
-                    return value
-                else:
-                    raise SensorError("get_sensor error: Invalid sensor data")
-                    return
-            else:
-                raise IOError("get_sensor error: No SPI response")
-                return
-
-        elif(self.SensorType[port_index] == self.SENSOR_TYPE.EV3_COLOR_RAW_REFLECTED
-          or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_GYRO_ABS_DPS):
-            outArray = [self.SPI_Address, message_type, 0, 0, 0, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if(reply[3] == 0xA5):
-                if(reply[4] == self.SensorType[port_index] and reply[5] == self.SENSOR_STATE.VALID_DATA):
-                    results = [int((reply[6] << 8) | reply[7]), int((reply[8] << 8) | reply[9])]
-                    if self.SensorType[port_index] == self.SENSOR_TYPE.EV3_GYRO_ABS_DPS:
-                        for r in range(len(results)):
-                            if results[r] >= 0x8000:
-                                results[r] = results[r] - 0x10000
-                    return results
-                else:
-                    raise SensorError("get_sensor error: Invalid sensor data")
-                    return
-            else:
-                raise IOError("get_sensor error: No SPI response")
-                return
-
-        elif(self.SensorType[port_index] == self.SENSOR_TYPE.EV3_COLOR_COLOR_COMPONENTS):
-            outArray = [self.SPI_Address, message_type, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if(reply[3] == 0xA5):
-                if(reply[4] == self.SensorType[port_index] and reply[5] == self.SENSOR_STATE.VALID_DATA):
-                    return [int((reply[6] << 8) | reply[7]), int((reply[8] << 8) | reply[9]), int((reply[10] << 8) | reply[11]), int((reply[12] << 8) | reply[13])]
-                else:
-                    raise SensorError("get_sensor error: Invalid sensor data")
-                    return
-            else:
-                raise IOError("get_sensor error: No SPI response")
-                return
-
-        elif(self.SensorType[port_index] == self.SENSOR_TYPE.EV3_INFRARED_SEEK):
-            outArray = [self.SPI_Address, message_type, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if(reply[3] == 0xA5):
-                if(reply[4] == self.SensorType[port_index] and reply[5] == self.SENSOR_STATE.VALID_DATA):
-                    results = [[int(reply[6]), int(reply[7])], [int(reply[8]), int(reply[9])], [int(reply[10]), int(reply[11])], [int(reply[12]), int(reply[13])]]
-                    for c in range(len(results)):
-                        for v in range(len(results[c])):
-                            if results[c][v] >= 0x80:
-                                results[c][v] = results[c][v] - 0x100
-                    return results
-                else:
-                    raise SensorError("get_sensor error: Invalid sensor data")
-                    return
-            else:
-                raise IOError("get_sensor error: No SPI response")
-                return
-
-        elif(self.SensorType[port_index] == self.SENSOR_TYPE.EV3_INFRARED_REMOTE):
-            outArray = [self.SPI_Address, message_type, 0, 0, 0, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if(reply[3] == 0xA5):
-                if(reply[4] == self.SensorType[port_index] and reply[5] == self.SENSOR_STATE.VALID_DATA):
-                    results = [0, 0, 0, 0]
-                    for r in range(len(results)):
-                        value = int(reply[6 + r])
-                        if value == 1:
-                            results[r] = [1, 0, 0, 0, 0]
-                        elif value == 2:
-                            results[r] = [0, 1, 0, 0, 0]
-                        elif value == 3:
-                            results[r] = [0, 0, 1, 0, 0]
-                        elif value == 4:
-                            results[r] = [0, 0, 0, 1, 0]
-                        elif value == 5:
-                            results[r] = [1, 0, 1, 0, 0]
-                        elif value == 6:
-                            results[r] = [1, 0, 0, 1, 0]
-                        elif value == 7:
-                            results[r] = [0, 1, 1, 0, 0]
-                        elif value == 8:
-                            results[r] = [0, 1, 0, 1, 0]
-                        elif value == 9:
-                            results[r] = [0, 0, 0, 0, 1]
-                        elif value == 10:
-                            results[r] = [1, 1, 0, 0, 0]
-                        elif value == 11:
-                            results[r] = [0, 0, 1, 1, 0]
-                        else:
-                            results[r] = [0, 0, 0, 0, 0]
-                    return results
-                else:
-                    raise SensorError("get_sensor error: Invalid sensor data")
-                    return
-            else:
-                raise IOError("get_sensor error: No SPI response")
-                return
+        if max_age is not None:
+            snapshot = self._fresh_snapshot(max_age)
+            if snapshot is not None and snapshot.sensor_types[port_index] == self.SensorType[port_index]:
+                if snapshot.sensor_errors[port_index] is not None:
+                    raise snapshot.sensor_errors[port_index]
+                return snapshot.sensors[port_index]
+        # The plan is replaced, never modified, when the port is configured. The decoder checks that the
+        # reply is for the plan's sensor type, so no lock is needed if the port is reconfigured meanwhile.
+        plan = self._board.read_plans[port_index]
+        read = self._local.sensor_reads[port_index]
+        if read is None or read.plan is not plan:
+            read = self._bind_sensor_read(port_index, message_type, plan)
+        return self._transact_message(read, plan.decode)
+
+    def _bind_sensor_read(self, port_index, message_type, plan):
+        """
+        Preallocate this thread's get_sensor message for a read plan
 
-        raise IOError("get_sensor error: Sensor not configured or not supported.")
-        return # sensor not configured or not supported.
+        Keyword arguments:
+        port_index -- the sensor port index (0 to 3)
+        message_type -- the GET_SENSOR message type for the port
+        plan -- the _ReadPlan of the port
+        """
+        if plan is None:
+            raise IOError("get_sensor error: Sensor not configured or not supported.")
+        read = _SensorRead([self.SPI_Address, message_type] + [0] * (plan.reply_length - 2))
+        read.plan = plan
+        self._local.sensor_reads[port_index] = read
+        return read
 
-    def set_motor_power(self, port, power):
+    def set_motor_power(self, port, power, force = False):
         """
         Set the motor power in percent
 
         Keyword arguments:
         port -- The Motor port(s). PORT_A, PORT_B, PORT_C, and/or PORT_D.
         power -- The power from -100 to 100, or -128 for float
+        force = False -- send the value even if it is the value last sent to the port(s)
         """
-        outArray = [self.SPI_Address, self.BPSPI_MESSAGE_TYPE.SET_MOTOR_POWER, int(port), int(power)]
-        self.spi_transfer_array(outArray)
+        message = self._local.messages[self.BPSPI_MESSAGE_TYPE.SET_MOTOR_POWER]
+        PROTOCOL.SET_MOTOR_POWER.pack_into(message.tx, port, power)
+        self._write(_WRITE_MOTOR_CONTROL, port, (self.BPSPI_MESSAGE_TYPE.SET_MOTOR_POWER, power), force, message)
 
-    def set_motor_position(self, port, position):
+    def set_motor_position(self, port, position, force = False):
         """
         Set the motor target position in degrees
 
         Keyword arguments:
         port -- The motor port(s). PORT_A, PORT_B, PORT_C, and/or PORT_D.
         position -- The target position
+        force = False -- send the value even if it is the value last sent to the port(s)
         """
-        position = int(position)
-        outArray = [self.SPI_Address, self.BPSPI_MESSAGE_TYPE.SET_MOTOR_POSITION, int(port), ((position >> 24) & 0xFF), ((position >> 16) & 0xFF), ((position >> 8) & 0xFF), (position & 0xFF)]
-        self.spi_transfer_array(outArray)
+        message = self._local.messages[self.BPSPI_MESSAGE_TYPE.SET_MOTOR_POSITION]
+        PROTOCOL.SET_MOTOR_POSITION.pack_into(message.tx, port, position)
+        self._write(_WRITE_MOTOR_CONTROL, port, (self.BPSPI_MESSAGE_TYPE.SET_MOTOR_POSITION, position), force, message)
 
     def set_motor_position_relative(self, port, degrees):
         """
@@ -920,11 +1664,89 @@ class BrickPi3(object):
         port -- The motor port(s). PORT_A, PORT_B, PORT_C, and/or PORT_D.
         degrees -- The relative target position in degrees
         """
+        encoders = self._read_motor_encoders(port)
+        with self.batch():
+            for p in range(4):
+                if port & (1 << p):
+                    self.set_motor_position((1 << p), (encoders[p] + degrees))
+
+    def wait_for_position(self, port, tolerance = 2, timeout = None, position = None):
+        """
+        Wait for motors to reach their target positions
+
+        Instead of reading the encoders as fast as possible, the time until each motor arrives is predicted
+        from its encoder and speed, and the next read is after MOTOR_WAIT_FRACTION of the soonest predicted
+        time, so the reads are dense only near the target. The pending motors are read together, in one bus transfer.
+
+        Keyword arguments:
+        port -- The motor port(s). PORT_A, PORT_B, PORT_C, and/or PORT_D.
+        tolerance = 2 -- how close in degrees each encoder must be to its target
+        timeout = None -- the longest time in seconds to wait, or None to wait until the motors arrive
+        position = None -- the target position of every port, or a dict with the target position of each port.
+                           Defaults to the target last sent with set_motor_position, as long as the encoder hasn't been offset since.
+
+        Returns a tuple with the last MotorStatus read for each motor port, indexed from 0 for PORT_A to 3 for
+        PORT_D. Ports that weren't waited for are None. Raises IOError if the timeout passes first.
+        """
+        return self._wait_for_motors(self._position_wait(port, tolerance, timeout, position))
+
+    def _position_wait(self, port, tolerance, timeout, position):
+        """Return the _MotorWait of wait_for_position"""
+        targets = {}
+        sent = self._board.motor_control # not the write cache, which a transient bus error clears
         for p in range(4):
             if port & (1 << p):
-                self.set_motor_position((1 << p), (self.get_motor_encoder(1 << p) + degrees))
+                if isinstance(position, dict):
+                    targets[p] = position[1 << p]
+                elif position is not None:
+                    targets[p] = position
+                elif sent[p] is not None and sent[p][0] == self.BPSPI_MESSAGE_TYPE.SET_MOTOR_POSITION:
+                    targets[p] = sent[p][1]
+                else:
+                    raise IOError("wait_for_position error: the target position of motor port %s is unknown. Use the position argument." % "ABCD"[p])
+        return _MotorWait("wait_for_position", targets, lambda p, encoder: abs(targets[p] - encoder) <= tolerance, self.transport.clock, timeout)
 
-    def set_motor_position_kp(self, port, kp = 25):
+    def wait_until_encoder(self, port, threshold, timeout = None):
+        """
+        Wait for motor encoders to reach a value, from whichever side they start
+
+        The encoders are read as in wait_for_position, so motors driven by power or dps can be waited for too.
+
+        Keyword arguments:
+        port -- The motor port(s). PORT_A, PORT_B, PORT_C, and/or PORT_D.
+        threshold -- the encoder value, or a dict with the encoder value of each port
+        timeout = None -- the longest time in seconds to wait, or None to wait until the encoders reach the values
+
+        Returns a tuple with the last MotorStatus read for each motor port, as wait_for_position. Raises IOError if the timeout passes first.
+        """
+        return self._wait_for_motors(self._encoder_wait(port, threshold, timeout))
+
+    def _encoder_wait(self, port, threshold, timeout):
+        """Return the _MotorWait of wait_until_encoder"""
+        targets = {}
+        for p in range(4):
+            if port & (1 << p):
+                targets[p] = threshold[1 << p] if isinstance(threshold, dict) else threshold
+        rising = {} # whether each encoder started below its threshold
+
+        def reached(p, encoder):
+            if p not in rising:
+                rising[p] = encoder < targets[p]
+            return encoder >= targets[p] if rising[p] else encoder <= targets[p]
+        return _MotorWait("wait_until_encoder", targets, reached, self.transport.clock, timeout)
+
+    def _wait_for_motors(self, wait):
+        """Read the motor statuses of a _MotorWait until every motor has reached its target. Returns the last statuses read."""
+        if self._local.batch is not None:
+            raise IOError("%s error: can't be called while a batch is active." % wait.name)
+        clock = self.transport.clock
+        while True:
+            delay = wait.update(self.get_motor_statuses(wait.mask()))
+            if delay is None:
+                return tuple(wait.statuses)
+            clock.sleep(delay)
+
+    def set_motor_position_kp(self, port, kp = 25, force = False):
         """
         Set the motor target position KP constant
 
@@ -935,11 +1757,13 @@ class BrickPi3(object):
         Keyword arguments:
         port -- The motor port(s). PORT_A, PORT_B, PORT_C, and/or PORT_D.
         kp -- The KP constant (default 25)
+        force = False -- send the value even if it is the value last sent to the port(s)
         """
-        outArray = [self.SPI_Address, self.BPSPI_MESSAGE_TYPE.SET_MOTOR_POSITION_KP, int(port), int(kp)]
-        self.spi_transfer_array(outArray)
+        message = self._local.messages[self.BPSPI_MESSAGE_TYPE.SET_MOTOR_POSITION_KP]
+        PROTOCOL.SET_MOTOR_POSITION_KP.pack_into(message.tx, port, kp)
+        self._write(_WRITE_MOTOR_KP, port, kp, force, message)
 
-    def set_motor_position_kd(self, port, kd = 70):
+    def set_motor_position_kd(self, port, kd = 70, force = False):
         """
         Set the motor target position KD constant
 
@@ -950,23 +1774,26 @@ class BrickPi3(object):
         Keyword arguments:
         port -- The motor port(s). PORT_A, PORT_B, PORT_C, and/or PORT_D.
         kd -- The KD constant (default 70)
+        force = False -- send the value even if it is the value last sent to the port(s)
         """
-        outArray = [self.SPI_Address, self.BPSPI_MESSAGE_TYPE.SET_MOTOR_POSITION_KD, int(port), int(kd)]
-        self.spi_transfer_array(outArray)
+        message = self._local.messages[self.BPSPI_MESSAGE_TYPE.SET_MOTOR_POSITION_KD]
+        PROTOCOL.SET_MOTOR_POSITION_KD.pack_into(message.tx, port, kd)
+        self._write(_WRITE_MOTOR_KD, port, kd, force, message)
 
-    def set_motor_dps(self, port, dps):
+    def set_motor_dps(self, port, dps, force = False):
         """
         Set the motor target speed in degrees per second
 
         Keyword arguments:
         port -- The motor port(s). PORT_A, PORT_B, PORT_C, and/or PORT_D.
         dps -- The target speed in degrees per second
+        force = False -- send the value even if it is the value last sent to the port(s)
         """
-        dps = int(dps)
-        outArray = [self.SPI_Address, self.BPSPI_MESSAGE_TYPE.SET_MOTOR_DPS, int(port), ((dps >> 8) & 0xFF), (dps & 0xFF)]
-        self.spi_transfer_array(outArray)
+        message = self._local.messages[self.BPSPI_MESSAGE_TYPE.SET_MOTOR_DPS]
+        PROTOCOL.SET_MOTOR_DPS.pack_into(message.tx, port, dps)
+        self._write(_WRITE_MOTOR_CONTROL, port, (self.BPSPI_MESSAGE_TYPE.SET_MOTOR_DPS, dps), force, message)
 
-    def set_motor_limits(self, port, power = 0, dps = 0):
+    def set_motor_limits(self, port, power = 0, dps = 0, force = False):
         """
         Set the motor speed limit
 
@@ -974,17 +1801,70 @@ class BrickPi3(object):
         port -- The motor port(s). PORT_A, PORT_B, PORT_C, and/or PORT_D.
         power -- The power limit in percent (0 to 100), with 0 being no limit (100)
         dps -- The speed limit in degrees per second, with 0 being no limit
+        force = False -- send the value even if it is the value last sent to the port(s)
         """
-        dps = int(dps)
-        outArray = [self.SPI_Address, self.BPSPI_MESSAGE_TYPE.SET_MOTOR_LIMITS, int(port), int(power), ((dps >> 8) & 0xFF), (dps & 0xFF)]
-        self.spi_transfer_array(outArray)
+        message = self._local.messages[self.BPSPI_MESSAGE_TYPE.SET_MOTOR_LIMITS]
+        PROTOCOL.SET_MOTOR_LIMITS.pack_into(message.tx, port, power, dps)
+        self._write(_WRITE_MOTOR_LIMITS, port, (power, dps), force, message)
 
-    def get_motor_status(self, port):
+    def set_motors_power(self, values, force = False):
+        """
+        Set the power of several motors at the same time
+
+        Keyword arguments:
+        values -- a dict with the power for each motor port(s), such as {BP.PORT_B: 40, BP.PORT_C: -40}
+        force = False -- send the values even if they are the values last sent to the ports
+        """
+        self._set_motors(self.set_motor_power, values, force)
+
+    def set_motors_dps(self, values, force = False):
+        """
+        Set the target speed of several motors at the same time
+
+        Keyword arguments:
+        values -- a dict with the target speed in degrees per second for each motor port(s), such as {BP.PORT_B: 360, BP.PORT_C: 180}
+        force = False -- send the values even if they are the values last sent to the ports
+        """
+        self._set_motors(self.set_motor_dps, values, force)
+
+    def set_motors_position(self, values, force = False):
+        """
+        Set the target position of several motors at the same time
+
+        Keyword arguments:
+        values -- a dict with the target position in degrees for each motor port(s), such as {BP.PORT_B: 90, BP.PORT_C: -90}
+        force = False -- send the values even if they are the values last sent to the ports
+        """
+        self._set_motors(self.set_motor_position, values, force)
+
+    def _set_motors(self, setter, values, force):
+        """
+        Call a motor setter once for each distinct value, with the ports that share it, in one bus transfer
+
+        Keyword arguments:
+        setter -- the set_motor_ method
+        values -- a dict with the value for each motor port(s)
+        force -- passed to the setter
+        """
+        ports = {} # the ports of each value, in the order they are first seen
+        for port, value in values.items():
+            ports[value] = ports.get(value, 0) | port
+        if len(ports) == 1: # one message
+            for value, port in ports.items():
+                setter(port, value, force)
+        else:
+            with self.batch():
+                for value, port in ports.items():
+                    setter(port, value, force)
+
+    def get_motor_status(self, port, max_age = None):
         """
         Read a motor status
 
         Keyword arguments:
         port -- The motor port (one at a time). PORT_A, PORT_B, PORT_C, or PORT_D.
+        max_age = None -- if the poller read the status within this many seconds, return that value instead of reading it.
+                          Lists returned from the snapshot are shared, and must not be modified.
 
         Returns a list:
             flags -- 8-bits of bit-flags that indicate motor status:
@@ -1006,31 +1886,19 @@ class BrickPi3(object):
             raise IOError("get_motor_status error. Must be one motor port at a time. PORT_A, PORT_B, PORT_C, or PORT_D.")
             return
 
-        outArray = [self.SPI_Address, message_type, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-        reply = self.spi_transfer_array(outArray)
-        if(reply[3] == 0xA5):
-            speed = int(reply[5])
-            if speed & 0x80:
-                speed = speed - 0x100
+        if max_age is not None:
+            snapshot = self._fresh_snapshot(max_age)
+            if snapshot is not None:
+                return snapshot.motor_status[message_type - self.BPSPI_MESSAGE_TYPE.GET_MOTOR_A_STATUS]
+        return self._transact_message(self._local.messages[message_type], _decode_motor_status)
 
-            encoder = int((reply[6] << 24) | (reply[7] << 16) | (reply[8] << 8) | reply[9])
-            if encoder & 0x80000000: # MT was 0x10000000, but I think it should be 0x80000000
-                encoder = int(encoder - 0x100000000)
-
-            dps = int((reply[10] << 8) | reply[11])
-            if dps & 0x8000:
-                dps = dps - 0x10000
-
-            return [reply[4], speed, encoder, dps]
-        raise IOError("No SPI response")
-        return
-
-    def get_motor_encoder(self, port):
+    def get_motor_encoder(self, port, max_age = None):
         """
         Read a motor encoder in degrees
 
         Keyword arguments:
         port -- The motor port (one at a time). PORT_A, PORT_B, PORT_C, or PORT_D.
+        max_age = None -- if the poller read the motor status within this many seconds, return the encoder from it instead of reading it
 
         Returns the encoder position in degrees
         """
@@ -1046,10 +1914,11 @@ class BrickPi3(object):
             raise IOError("get_motor_encoder error. Must be one motor port at a time. PORT_A, PORT_B, PORT_C, or PORT_D.")
             return
 
-        encoder = self.spi_read_32(message_type)
-        if encoder & 0x80000000:
-            encoder = int(encoder - 0x100000000)
-        return int(encoder)
+        if max_age is not None:
+            snapshot = self._fresh_snapshot(max_age)
+            if snapshot is not None:
+                return snapshot.motor_status[message_type - self.BPSPI_MESSAGE_TYPE.GET_MOTOR_A_ENCODER][2]
+        return self._transact_message(self._local.messages[message_type], _decode_motor_encoder)
 
     def offset_motor_encoder(self, port, position):
         """
@@ -1061,9 +1930,14 @@ class BrickPi3(object):
 
         You can zero the encoder by offsetting it by the current position
         """
-        position = int(position)
-        outArray = [self.SPI_Address, self.BPSPI_MESSAGE_TYPE.OFFSET_MOTOR_ENCODER, int(port), ((position >> 24) & 0xFF), ((position >> 16) & 0xFF), ((position >> 8) & 0xFF), (position & 0xFF)]
-        self.spi_transfer_array(outArray)
+        written = self._board.written[_WRITE_MOTOR_CONTROL]
+        for p in range(4):
+            if port & (1 << p):
+                written[p] = None # a position target now means a different position
+                self._board.motor_control[p] = None
+        message = self._local.messages[self.BPSPI_MESSAGE_TYPE.OFFSET_MOTOR_ENCODER]
+        PROTOCOL.OFFSET_MOTOR_ENCODER.pack_into(message.tx, port, position)
+        self._transact_message(message)
 
     def reset_motor_encoder(self, port):
         """
@@ -1072,34 +1946,223 @@ class BrickPi3(object):
         Keyword arguments:
         port -- The motor port(s). PORT_A, PORT_B, PORT_C, and/or PORT_D.
         """
-        if port & self.PORT_A:
-            self.offset_motor_encoder(self.PORT_A, self.get_motor_encoder(self.PORT_A))
+        encoders = self._read_motor_encoders(port)
+        with self.batch():
+            for p in range(4):
+                if port & (1 << p):
+                    self.offset_motor_encoder((1 << p), encoders[p])
 
-        if port & self.PORT_B:
-            self.offset_motor_encoder(self.PORT_B, self.get_motor_encoder(self.PORT_B))
+    def _read_motor_encoders(self, port):
+        """
+        Read the encoders of the specified motor port(s) in one bus operation
 
-        if port & self.PORT_C:
-            self.offset_motor_encoder(self.PORT_C, self.get_motor_encoder(self.PORT_C))
+        The encoders are read immediately, even if a batch is active, because the caller needs the values.
 
-        if port & self.PORT_D:
-            self.offset_motor_encoder(self.PORT_D, self.get_motor_encoder(self.PORT_D))
+        Returns a list of the four encoder values, with None for ports that were not read.
+        """
+        batch = BrickPi3Batch(self)
+        outer = self._local.batch
+        self._local.batch = batch
+        try:
+            results = [(self.get_motor_encoder(1 << p) if port & (1 << p) else None) for p in range(4)]
+        finally:
+            self._local.batch = outer
+        batch.send()
+        return [(r.value if r is not None else None) for r in results]
 
     def reset_all(self):
         """
         Reset the BrickPi. Set all the sensors' type to NONE, set the motors to float, and motors' limits and constants to default, and return control of the LED to the firmware.
         """
-        # reset all sensors
-        self.set_sensor_type(self.PORT_1 + self.PORT_2 + self.PORT_3 + self.PORT_4, self.SENSOR_TYPE.NONE)
+        with self.batch():
+            # reset all sensors
+            self.set_sensor_type(self.PORT_1 + self.PORT_2 + self.PORT_3 + self.PORT_4, self.SENSOR_TYPE.NONE)
 
-        # turn off all motors
-        self.set_motor_power(self.PORT_A + self.PORT_B + self.PORT_C + self.PORT_D, self.MOTOR_FLOAT)
+            # turn off all motors
+            self.set_motor_power(self.PORT_A + self.PORT_B + self.PORT_C + self.PORT_D, self.MOTOR_FLOAT)
 
-        # reset motor limits
-        self.set_motor_limits(self.PORT_A + self.PORT_B + self.PORT_C + self.PORT_D)
+            # reset motor limits
+            self.set_motor_limits(self.PORT_A + self.PORT_B + self.PORT_C + self.PORT_D)
 
-        # reset motor kP and kD constants
-        self.set_motor_position_kp(self.PORT_A + self.PORT_B + self.PORT_C + self.PORT_D)
-        self.set_motor_position_kd(self.PORT_A + self.PORT_B + self.PORT_C + self.PORT_D)
+            # reset motor kP and kD constants
+            self.set_motor_position_kp(self.PORT_A + self.PORT_B + self.PORT_C + self.PORT_D)
+            self.set_motor_position_kd(self.PORT_A + self.PORT_B + self.PORT_C + self.PORT_D)
 
-        # return the LED to the control of the FW
-        self.set_led(-1)
+            # return the LED to the control of the FW
+            self.set_led(-1)
+
+
+# The message layouts, compiled from the table in protocol.py
+PROTOCOL = Protocol(BrickPi3.BPSPI_MESSAGE_TYPE)
+
+# Every port (and every voltage) has the same reply layout
+_decode_voltage = PROTOCOL.GET_VOLTAGE_VCC.decode
+_decode_motor_encoder = PROTOCOL.GET_MOTOR_A_ENCODER.decode
+_decode_motor_status = PROTOCOL.GET_MOTOR_A_STATUS.decode
+
+
+_U16 = struct.Struct(">H")
+_S16 = struct.Struct(">h")
+_U16_2 = struct.Struct(">HH")
+_S16_2 = struct.Struct(">hh")
+_U16_4 = struct.Struct(">HHHH")
+_S8_8 = struct.Struct(">8b")
+
+# The buttons reported for each EV3_INFRARED_REMOTE code: red up, red down, blue up, blue down, broadcast
+_IR_REMOTE_BUTTONS = ((0, 0, 0, 0, 0), (1, 0, 0, 0, 0), (0, 1, 0, 0, 0), (0, 0, 1, 0, 0), (0, 0, 0, 1, 0), (1, 0, 1, 0, 0),
+                      (1, 0, 0, 1, 0), (0, 1, 1, 0, 0), (0, 1, 0, 1, 0), (0, 0, 0, 0, 1), (1, 1, 0, 0, 0), (0, 0, 1, 1, 0))
+
+
+# The converters below take a validated get_sensor reply, and return the sensor value(s).
+
+def _sensor_8(reply):
+    return reply[6]
+
+
+def _sensor_u16(reply):
+    return _U16.unpack_from(reply, 6)[0]
+
+
+def _sensor_s16(reply):
+    return _S16.unpack_from(reply, 6)[0]
+
+
+def _sensor_u16_tenths(reply):
+    return _U16.unpack_from(reply, 6)[0] / 10
+
+
+def _sensor_u16_2(reply):
+    return list(_U16_2.unpack_from(reply, 6))
+
+
+def _sensor_s16_2(reply):
+    return list(_S16_2.unpack_from(reply, 6))
+
+
+def _sensor_u16_4(reply):
+    return list(_U16_4.unpack_from(reply, 6))
+
+
+def _sensor_custom(reply):
+    return [(((reply[8] & 0x0F) << 8) | reply[9]), (((reply[8] >> 4) & 0x0F) | (reply[7] << 4)), (reply[6] & 0x01), ((reply[6] >> 1) & 0x01)]
+
+
+def _sensor_i2c(reply):
+    return list(reply[6:])
+
+
+def _sensor_nxt_color_full(reply):
+    return [reply[6], ((reply[7] << 2) | ((reply[11] >> 6) & 0x03)), ((reply[8] << 2) | ((reply[11] >> 4) & 0x03)), ((reply[9] << 2) | ((reply[11] >> 2) & 0x03)), ((reply[10] << 2) | (reply[11] & 0x03))]
+
+
+def _sensor_infrared_seek(reply):
+    values = _S8_8.unpack_from(reply, 6)
+    return [[values[0], values[1]], [values[2], values[3]], [values[4], values[5]], [values[6], values[7]]]
+
+
+def _sensor_infrared_remote(reply):
+    results = [None, None, None, None]
+    for r in range(4):
+        code = reply[6 + r]
+        results[r] = list(_IR_REMOTE_BUTTONS[code] if code < len(_IR_REMOTE_BUTTONS) else _IR_REMOTE_BUTTONS[0])
+    return results
+
+
+def _sensor_decoder(sensor_type, reply_length, convert):
+    """
+    Return a get_sensor reply decoder for a sensor type
+
+    Keyword arguments:
+    sensor_type -- the sensor type the port is configured for
+    reply_length -- the number of bytes in the message
+    convert -- the function that converts a valid reply into the sensor value(s)
+    """
+    ST = BrickPi3.SENSOR_TYPE
+    if sensor_type == ST.TOUCH:
+        accepted = (ST.TOUCH, ST.NXT_TOUCH, ST.EV3_TOUCH) # the firmware reports which kind of touch sensor it found
+    else:
+        accepted = (sensor_type,)
+    VALID_DATA = BrickPi3.SENSOR_STATE.VALID_DATA
+    NOT_CONFIGURED = BrickPi3.SENSOR_STATE.NOT_CONFIGURED
+
+    def decode(reply):
+        if(reply[3] != 0xA5):
+            raise IOError("get_sensor error: No SPI response")
+        if(reply[5] != VALID_DATA or len(reply) != reply_length or reply[4] not in accepted):
+            if reply[5] == NOT_CONFIGURED:
+                raise SensorNotConfiguredError("get_sensor error: Sensor not configured. The BrickPi3 may have been reset.")
+            raise SensorError("get_sensor error: Invalid sensor data")
+        return convert(reply)
+    return decode
+
+
+def _sensor_formats():
+    """Return {sensor type: (reply length, converter)} for the sensor types that get_sensor supports, except I2C"""
+    ST = BrickPi3.SENSOR_TYPE
+    formats = {ST.CUSTOM: (10, _sensor_custom), ST.NXT_COLOR_FULL: (12, _sensor_nxt_color_full)}
+    for sensor_type in (ST.TOUCH, ST.NXT_TOUCH, ST.EV3_TOUCH, ST.NXT_ULTRASONIC, ST.EV3_COLOR_REFLECTED, ST.EV3_COLOR_AMBIENT,
+                        ST.EV3_COLOR_COLOR, ST.EV3_ULTRASONIC_LISTEN, ST.EV3_INFRARED_PROXIMITY):
+        formats[sensor_type] = (7, _sensor_8)
+    for sensor_type in (ST.NXT_LIGHT_ON, ST.NXT_LIGHT_OFF, ST.NXT_COLOR_RED, ST.NXT_COLOR_GREEN, ST.NXT_COLOR_BLUE, ST.NXT_COLOR_OFF):
+        formats[sensor_type] = (8, _sensor_u16)
+    for sensor_type in (ST.EV3_GYRO_ABS, ST.EV3_GYRO_DPS):
+        formats[sensor_type] = (8, _sensor_s16)
+    for sensor_type in (ST.EV3_ULTRASONIC_CM, ST.EV3_ULTRASONIC_INCHES):
+        formats[sensor_type] = (8, _sensor_u16_tenths)
+    formats[ST.EV3_COLOR_RAW_REFLECTED] = (10, _sensor_u16_2)
+    formats[ST.EV3_GYRO_ABS_DPS] = (10, _sensor_s16_2)
+    formats[ST.EV3_INFRARED_REMOTE] = (10, _sensor_infrared_remote)
+    formats[ST.EV3_COLOR_COLOR_COMPONENTS] = (14, _sensor_u16_4)
+    formats[ST.EV3_INFRARED_SEEK] = (14, _sensor_infrared_seek)
+    return formats
+
+
+_SENSOR_FORMATS = _sensor_formats()
+_read_plans = {} # the compiled _ReadPlans, by (sensor type, I2C bytes to read)
+
+
+def _read_plan(sensor_type, in_bytes = 0):
+    """
+    Return the _ReadPlan for a sensor port configuration, or None if get_sensor doesn't support it
+
+    Keyword arguments:
+    sensor_type -- the sensor type
+    in_bytes = 0 -- the number of bytes an I2C sensor port reads
+    """
+    key = (sensor_type, in_bytes if sensor_type == BrickPi3.SENSOR_TYPE.I2C else 0)
+    plan = _read_plans.get(key)
+    if plan is None:
+        if sensor_type == BrickPi3.SENSOR_TYPE.I2C:
+            reply_length, convert = 6 + in_bytes, _sensor_i2c
+        elif sensor_type in _SENSOR_FORMATS:
+            reply_length, convert = _SENSOR_FORMATS[sensor_type]
+        else:
+            return None
+        plan = _read_plans.setdefault(key, _ReadPlan(sensor_type, reply_length, _sensor_decoder(sensor_type, reply_length, convert)))
+    return plan
+
+
+def _filtered_plan(plan, sensor_filter, lock):
+    """
+    Return a _ReadPlan that passes the values decoded by plan through sensor_filter
+
+    The filter runs once for each value read from the bus, with lock held, so that the values that
+    several threads read at once are filtered one at a time.
+
+    Keyword arguments:
+    plan -- the _ReadPlan, or None
+    sensor_filter -- a function of one value, or None for no filter
+    lock -- the lock of the board, which is never held while a reply is decoded
+    """
+    if plan is None or sensor_filter is None:
+        return plan
+    decode = plan.decode
+
+    def filtered(reply):
+        value = decode(reply)
+        lock.acquire()
+        try:
+            return sensor_filter(value)
+        finally:
+            lock.release()
+    return _ReadPlan(plan.sensor_type, plan.reply_length, filtered)
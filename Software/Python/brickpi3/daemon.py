@@ -0,0 +1,378 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# brickpi3d, a daemon that lets several processes share one BrickPi3.
+#
+# The daemon owns the SPI device and serves raw BrickPi3 messages over a Unix domain
+# socket. Requests that arrive from different clients at the same time are sent to the
+# bus together in one transfer. Clients use BrickPi3Client, which has the same API as
+# BrickPi3:
+#
+#     $ brickpi3d &
+#     >>> BP = brickpi3.BrickPi3Client()
+#     >>> BP.get_voltage_battery()
+#
+# Protocol. Every request and reply is a frame:
+#     request -- count (1 byte), then for each message: length (1 byte), the message bytes
+#     reply   -- status (1 byte). If the status is STATUS_OK, the same layout as a request,
+#                with the bytes read for each message. If the status is STATUS_ERROR,
+#                length (2 bytes, big endian) and a UTF-8 error description.
+#
+# Sensor settings. The sensor type of a port decides how its replies are decoded, and each
+# client keeps its own. The daemon only forwards messages, so it doesn't track them. One
+# program configures a sensor with set_sensor_type, and the others that read it call
+# use_sensor_type, which sets up the decoding without sending anything. Calling
+# set_sensor_type again would configure the sensor again for every client, and an EV3
+# sensor takes about a second to be detected again.
+
+import os         # for removing and setting the permissions of the socket file
+import selectors  # for serving several clients from one thread
+import socket     # for the Unix domain socket
+import stat       # for checking that an existing socket file is a socket
+import struct     # for the error length
+
+from .core import BrickPi3
+from .transport import Transport
+
+DEFAULT_SOCKET = os.environ.get("BRICKPI3D_SOCKET", "/tmp/brickpi3d.sock")
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+MESSAGES_MAX = 255       # the most messages in one frame
+MESSAGE_LENGTH_MAX = 255 # the longest message
+OUTPUT_MAX = 1 << 20     # a client is dropped if this many bytes of its replies are waiting for it to read them
+
+_ERROR_LENGTH = struct.Struct(">H")
+
+
+def _encode_messages(messages, status = None):
+    """Return a frame holding a list of messages, optionally preceded by a status byte"""
+    frame = bytearray() if status is None else bytearray([status])
+    frame.append(len(messages))
+    for message in messages:
+        frame.append(len(message))
+        frame.extend(message)
+    return frame
+
+
+def _decode_messages(buffer, offset):
+    """
+    Parse the messages of a frame from buffer, starting at offset
+
+    Returns (messages, the offset after the frame), or (None, offset) if the frame is not complete yet.
+    """
+    if offset >= len(buffer):
+        return None, offset
+    count = buffer[offset]
+    position = offset + 1
+    messages = []
+    for i in range(count):
+        if position >= len(buffer):
+            return None, offset
+        length = buffer[position]
+        if position + 1 + length > len(buffer):
+            return None, offset
+        messages.append(buffer[(position + 1):(position + 1 + length)])
+        position += 1 + length
+    return messages, position
+
+
+def _remove_stale_socket(path):
+    """
+    Remove the socket file left by a daemon that is no longer running
+
+    Raises IOError if the path is not a socket, or if a daemon is still serving it.
+    """
+    try:
+        mode = os.lstat(path).st_mode
+    except OSError: # nothing there
+        return
+    if not stat.S_ISSOCK(mode):
+        raise IOError("brickpi3d error: %s exists and is not a socket" % path)
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError: # nothing is listening, so it is stale
+        os.unlink(path)
+        return
+    finally:
+        probe.close()
+    raise IOError("brickpi3d error: another daemon is serving %s" % path)
+
+
+class _Connection(object):
+    """A connected client, the bytes it has sent that haven't been processed, and the replies it hasn't read yet"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()
+        self.output = bytearray()
+
+
+class BrickPi3Daemon(object):
+    """
+    Serves a BrickPi3 transport to clients over a Unix domain socket
+
+    Each pass of the server loop collects the complete requests from every client, sends all
+    of their messages in one transfer_many call, and replies to each client in turn. The
+    messages of one request are always sent together and in order. The client sockets are
+    non-blocking, and replies that a client isn't reading yet are buffered, so a slow client
+    doesn't hold up the others.
+    """
+
+    def __init__(self, transport, path = DEFAULT_SOCKET, mode = 0o660):
+        """
+        Keyword arguments:
+        transport -- the transport to serve, normally a SpidevTransport
+        path = DEFAULT_SOCKET -- the path of the socket. A socket left at the path by a daemon that is no longer running is replaced.
+        mode = 0o660 -- the permissions of the socket file
+        """
+        self.transport = transport
+        self.path = path
+        self.requests = 0  # the number of requests served
+        self.transfers = 0 # the number of bus transfers used to serve them
+        _remove_stale_socket(path)
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(path)
+        os.chmod(path, mode)
+        self._inode = os.stat(path).st_ino # to remove only this socket file when closing
+        self._listener.listen(16)
+        self._listener.setblocking(False)
+        self._wake_read, self._wake_write = socket.socketpair()
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._listener, selectors.EVENT_READ)
+        self._selector.register(self._wake_read, selectors.EVENT_READ)
+        self._running = True # until shutdown, which can be called before serve_forever starts
+
+    def serve_forever(self):
+        """Serve clients until shutdown() is called"""
+        try:
+            while self._running:
+                requests = []
+                for key, events in self._selector.select():
+                    if key.fileobj is self._listener:
+                        self._accept()
+                    elif key.fileobj is self._wake_read:
+                        self._wake_read.recv(64)
+                    else:
+                        connection = key.data
+                        if events & selectors.EVENT_WRITE and connection.sock.fileno() >= 0:
+                            self._flush(connection)
+                        if events & selectors.EVENT_READ and connection.sock.fileno() >= 0: # not dropped
+                            self._receive(connection, requests)
+                if requests:
+                    self._serve(requests)
+        finally:
+            self._close()
+
+    def shutdown(self):
+        """Stop serve_forever. Can be called from another thread."""
+        self._running = False
+        self._wake_write.send(b"\0")
+
+    def _accept(self):
+        try:
+            sock, address = self._listener.accept()
+        except BlockingIOError: # the client gave up
+            return
+        sock.setblocking(False)
+        self._selector.register(sock, selectors.EVENT_READ, _Connection(sock))
+
+    def _drop(self, connection):
+        self._selector.unregister(connection.sock)
+        connection.sock.close()
+
+    def _receive(self, connection, requests):
+        """Read from a client, and add its complete requests to requests"""
+        try:
+            data = connection.sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(connection)
+            return
+        connection.buffer.extend(data)
+        offset = 0
+        while True:
+            messages, offset = _decode_messages(connection.buffer, offset)
+            if messages is None:
+                break
+            requests.append((connection, messages))
+        del connection.buffer[:offset]
+
+    def _serve(self, requests):
+        """Send the messages of all of the requests in one transfer, and reply to each client"""
+        messages = []
+        for connection, request in requests:
+            messages.extend(request)
+        try:
+            replies = self.transport.transfer_many(messages)
+            error = None
+        except Exception as e:
+            error = str(e).encode("utf-8")
+        self.requests += len(requests)
+        self.transfers += 1
+
+        position = 0
+        for connection, request in requests:
+            if error is None:
+                frame = _encode_messages(replies[position:(position + len(request))], STATUS_OK)
+            else:
+                frame = bytearray([STATUS_ERROR]) + _ERROR_LENGTH.pack(len(error)) + error
+            position += len(request)
+            if connection.sock.fileno() < 0: # dropped
+                continue
+            pending = len(connection.output) > 0
+            connection.output.extend(frame)
+            if not pending:
+                self._flush(connection)
+
+    def _flush(self, connection):
+        """Send as much of a client's buffered replies as its socket takes, and wait to send the rest"""
+        try:
+            sent = connection.sock.send(connection.output)
+        except BlockingIOError:
+            sent = 0
+        except OSError: # the client went away
+            self._drop(connection)
+            return
+        del connection.output[:sent]
+        if len(connection.output) > OUTPUT_MAX: # the client isn't reading its replies
+            self._drop(connection)
+        elif connection.output:
+            self._selector.modify(connection.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, connection)
+        else:
+            self._selector.modify(connection.sock, selectors.EVENT_READ, connection)
+
+    def _close(self):
+        for key in list(self._selector.get_map().values()):
+            if isinstance(key.data, _Connection):
+                key.data.sock.close()
+        self._selector.close()
+        self._listener.close()
+        self._wake_read.close()
+        self._wake_write.close()
+        try:
+            if os.stat(self.path).st_ino == self._inode:
+                os.unlink(self.path)
+        except OSError: # already removed
+            pass
+
+
+class SocketTransport(Transport):
+    """Transport that sends BrickPi3 messages through a brickpi3d daemon"""
+
+    def __init__(self, path = DEFAULT_SOCKET):
+        """
+        Connect to the daemon
+
+        Keyword arguments:
+        path = DEFAULT_SOCKET -- the path of the daemon's socket
+        """
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.sock.connect(path)
+        except OSError as e:
+            self.sock.close()
+            raise IOError("brickpi3d not running at %s: %s" % (path, e))
+        self._buffer = bytearray()
+
+    def _receive(self):
+        """Read one reply frame, and return the messages it holds"""
+        while True:
+            if len(self._buffer) > 0:
+                status = self._buffer[0]
+                if status == STATUS_OK:
+                    messages, offset = _decode_messages(self._buffer, 1)
+                    if messages is not None:
+                        del self._buffer[:offset]
+                        return messages
+                elif status == STATUS_ERROR:
+                    if len(self._buffer) >= 3:
+                        length = _ERROR_LENGTH.unpack_from(self._buffer, 1)[0]
+                        if len(self._buffer) >= 3 + length:
+                            error = self._buffer[3:(3 + length)].decode("utf-8")
+                            del self._buffer[:(3 + length)]
+                            raise IOError("brickpi3d error: %s" % error)
+                else:
+                    raise IOError("brickpi3d error: unknown reply status %d" % status)
+            data = self.sock.recv(65536)
+            if not data:
+                raise IOError("brickpi3d closed the connection")
+            self._buffer.extend(data)
+
+    def transfer(self, data_out):
+        return self.transfer_many([data_out])[0]
+
+    def transfer_many(self, messages):
+        replies = []
+        for start in range(0, len(messages), MESSAGES_MAX):
+            chunk = messages[start:(start + MESSAGES_MAX)]
+            for message in chunk:
+                if len(message) > MESSAGE_LENGTH_MAX:
+                    raise IOError("brickpi3d error: message longer than %d bytes" % MESSAGE_LENGTH_MAX)
+            self.sock.sendall(_encode_messages(chunk))
+            replies.extend(list(reply) for reply in self._receive())
+        return replies
+
+    def close(self):
+        self.sock.close()
+
+
+class BrickPi3Client(BrickPi3):
+    """A BrickPi3 that is shared with other processes through the brickpi3d daemon"""
+
+    def __init__(self, addr = 1, detect = True, path = DEFAULT_SOCKET):
+        """
+        Connect to the daemon, and optionally detect the BrickPi3
+
+        Keyword arguments:
+        addr = 1 -- the SPI address, as for BrickPi3
+        detect = True -- detect the BrickPi3, as for BrickPi3
+        path = DEFAULT_SOCKET -- the path of the daemon's socket
+        """
+        # other clients can change the board's settings, so every write is sent
+        BrickPi3.__init__(self, addr, detect, SocketTransport(path), cache_writes = False)
+
+    def use_sensor_type(self, port, type, params = 0):
+        """
+        Read a sensor that another client configured
+
+        Sets the sensor type of the port(s) in this client, so that get_sensor can decode their values,
+        without sending it to the board. The keyword arguments are the same as for set_sensor_type.
+        """
+        with self._board.lock:
+            self._use_sensor_type(port, type, params)
+
+
+def main():
+    import argparse # for the command line
+    parser = argparse.ArgumentParser(description = "Share a BrickPi3 between processes")
+    parser.add_argument("--socket", default = DEFAULT_SOCKET, help = "the path of the Unix domain socket (default %(default)s)")
+    parser.add_argument("--mode", default = "660", help = "the permissions of the socket, in octal (default %(default)s)")
+    parser.add_argument("--emulate", action = "store_true", help = "serve the firmware emulator instead of the SPI bus")
+    args = parser.parse_args()
+
+    if args.emulate:
+        from .emulator import EmulatorTransport
+        transport = EmulatorTransport()
+    else:
+        from .core import _init_spi
+        transport = _init_spi()
+    daemon = BrickPi3Daemon(transport, args.socket, int(args.mode, 8))
+    print("brickpi3d serving %s" % args.socket)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
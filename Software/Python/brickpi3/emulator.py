@@ -0,0 +1,553 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# In-process emulator of the BrickPi3 firmware SPI protocol.
+#
+# The emulator answers the same BPSPI_MESSAGE_TYPE messages as a real BrickPi3
+# (including the 0xA5 reply marker, the sensor configuration state machine, motor
+# control and encoders, and I2C transactions) so that programs and benchmarks can
+# run on any Linux machine. Use it through EmulatorTransport:
+#
+#     import brickpi3
+#     from brickpi3.emulator import EmulatorTransport
+#
+#     BP = brickpi3.BrickPi3(transport = EmulatorTransport())
+#
+# Pass a brickpi3.VirtualClock to run faster than real time.
+
+import math       # for the motor model
+import threading  # for the bus lock
+
+from .transport import Transport, SYSTEM_CLOCK
+from .core import BrickPi3, PROTOCOL
+from .protocol import REQUEST_OFFSET, I2C_PARAMETERS, I2C_SAME_PARAMETERS
+
+_MT = BrickPi3.BPSPI_MESSAGE_TYPE
+_ST = BrickPi3.SENSOR_TYPE
+_SS = BrickPi3.SENSOR_STATE
+
+# Sensor types that are configured over the EV3 UART protocol, grouped by device.
+# Switching between modes of the same device is fast, connecting a device is slow.
+_EV3_DEVICES = [
+    (_ST.EV3_GYRO_ABS, _ST.EV3_GYRO_DPS, _ST.EV3_GYRO_ABS_DPS),
+    (_ST.EV3_COLOR_REFLECTED, _ST.EV3_COLOR_AMBIENT, _ST.EV3_COLOR_COLOR, _ST.EV3_COLOR_RAW_REFLECTED, _ST.EV3_COLOR_COLOR_COMPONENTS),
+    (_ST.EV3_ULTRASONIC_CM, _ST.EV3_ULTRASONIC_INCHES, _ST.EV3_ULTRASONIC_LISTEN),
+    (_ST.EV3_INFRARED_PROXIMITY, _ST.EV3_INFRARED_SEEK, _ST.EV3_INFRARED_REMOTE),
+]
+_EV3_DEVICE = {}
+for _device in _EV3_DEVICES:
+    for _type in _device:
+        _EV3_DEVICE[_type] = _device
+
+# EV3 IR remote button combinations, indexed by the code reported by the firmware
+_IR_REMOTE_CODES = [
+    [0, 0, 0, 0, 0],
+    [1, 0, 0, 0, 0],
+    [0, 1, 0, 0, 0],
+    [0, 0, 1, 0, 0],
+    [0, 0, 0, 1, 0],
+    [1, 0, 1, 0, 0],
+    [1, 0, 0, 1, 0],
+    [0, 1, 1, 0, 0],
+    [0, 1, 0, 1, 0],
+    [0, 0, 0, 0, 1],
+    [1, 1, 0, 0, 0],
+    [0, 0, 1, 1, 0],
+]
+
+
+def _u8(value):
+    return [int(value) & 0xFF]
+
+
+def _u16(value):
+    value = int(value)
+    return [(value >> 8) & 0xFF, value & 0xFF]
+
+
+def _encode_sensor(type, value):
+    """
+    Encode a sensor value into the bytes the firmware reports after the type and state
+
+    Keyword arguments:
+    type -- the sensor type
+    value -- the value in the same form that BrickPi3.get_sensor returns it
+    """
+    if type == _ST.CUSTOM:
+        pin1_adc, pin6_adc, pin5_state, pin6_state = value
+        return [(pin5_state & 0x01) | ((pin6_state & 0x01) << 1),
+                (pin6_adc >> 4) & 0xFF,
+                ((pin6_adc & 0x0F) << 4) | ((pin1_adc >> 8) & 0x0F),
+                pin1_adc & 0xFF]
+    if type in (_ST.TOUCH, _ST.NXT_TOUCH, _ST.EV3_TOUCH, _ST.NXT_ULTRASONIC, _ST.EV3_COLOR_REFLECTED,
+                _ST.EV3_COLOR_AMBIENT, _ST.EV3_COLOR_COLOR, _ST.EV3_ULTRASONIC_LISTEN, _ST.EV3_INFRARED_PROXIMITY):
+        return _u8(value)
+    if type == _ST.NXT_COLOR_FULL:
+        color, red, green, blue, ambient = value
+        return [color & 0xFF, (red >> 2) & 0xFF, (green >> 2) & 0xFF, (blue >> 2) & 0xFF, (ambient >> 2) & 0xFF,
+                ((red & 0x03) << 6) | ((green & 0x03) << 4) | ((blue & 0x03) << 2) | (ambient & 0x03)]
+    if type in (_ST.EV3_ULTRASONIC_CM, _ST.EV3_ULTRASONIC_INCHES):
+        return _u16(round(value * 10))
+    if type in (_ST.NXT_LIGHT_ON, _ST.NXT_LIGHT_OFF, _ST.NXT_COLOR_RED, _ST.NXT_COLOR_GREEN,
+                _ST.NXT_COLOR_BLUE, _ST.NXT_COLOR_OFF, _ST.EV3_GYRO_ABS, _ST.EV3_GYRO_DPS):
+        return _u16(value)
+    if type in (_ST.EV3_COLOR_RAW_REFLECTED, _ST.EV3_GYRO_ABS_DPS, _ST.EV3_COLOR_COLOR_COMPONENTS):
+        data = []
+        for v in value:
+            data.extend(_u16(v))
+        return data
+    if type == _ST.EV3_INFRARED_SEEK:
+        data = []
+        for heading, distance in value:
+            data.extend([heading & 0xFF, distance & 0xFF])
+        return data
+    if type == _ST.EV3_INFRARED_REMOTE:
+        return [_IR_REMOTE_CODES.index(list(buttons)) if list(buttons) in _IR_REMOTE_CODES else 0 for buttons in value]
+    return []
+
+
+class VirtualMotor(object):
+    """
+    Model of one BrickPi3 motor port
+
+    The motor is treated as an ideal actuator: in power mode it turns at a speed
+    proportional to the power, in dps mode it turns at the target speed, and in
+    position mode it approaches the target with a speed proportional to the error.
+    """
+
+    def __init__(self, max_dps = 1000):
+        self.max_dps = max_dps
+        self.flags = 0
+        self.mode = "float"
+        self.power = BrickPi3.MOTOR_FLOAT
+        self.target_position = 0
+        self.target_dps = 0
+        self.position_kp = 25
+        self.position_kd = 70
+        self.dps_kp = 0
+        self.dps_kd = 0
+        self.limit_power = 0
+        self.limit_dps = 0
+        self.position = 0.0
+        self.speed = 0.0
+        self.last_update = None
+
+    def _speed_limit(self):
+        limit = self.max_dps
+        if self.limit_dps:
+            limit = min(limit, self.limit_dps)
+        if self.limit_power:
+            limit = min(limit, self.max_dps * self.limit_power / 100.0)
+        return limit
+
+    def update(self, now):
+        """Advance the motor model to time now (in seconds)"""
+        if self.last_update is None:
+            self.last_update = now
+        dt = now - self.last_update
+        self.last_update = now
+        if dt <= 0:
+            return
+
+        if self.mode == "power":
+            power = max(-100, min(100, self.power))
+            if self.limit_power:
+                power = max(-self.limit_power, min(self.limit_power, power))
+            self.speed = self.max_dps * power / 100.0
+            self.position += self.speed * dt
+        elif self.mode == "dps":
+            limit = self._speed_limit()
+            self.speed = max(-limit, min(limit, self.target_dps))
+            self.position += self.speed * dt
+        elif self.mode == "position":
+            limit = self._speed_limit()
+            rate = self.position_kp * 0.4 # convergence rate in 1/s
+            error = self.target_position - self.position
+            direction = 1 if error >= 0 else -1
+            saturated_error = limit / rate
+            if abs(error) > saturated_error:
+                saturated_time = (abs(error) - saturated_error) / limit
+                if dt <= saturated_time:
+                    self.position += direction * limit * dt
+                    self.speed = direction * limit
+                    return
+                dt -= saturated_time
+                error = direction * saturated_error
+            error *= math.exp(-rate * dt)
+            if abs(error) < 0.5:
+                error = 0.0
+            self.position = self.target_position - error
+            self.speed = rate * error
+        else:
+            self.speed = 0.0
+
+    def reported_power(self):
+        if self.mode == "float":
+            return BrickPi3.MOTOR_FLOAT
+        if self.mode == "power":
+            return max(-100, min(100, self.power))
+        return int(max(-100, min(100, self.speed * 100.0 / self.max_dps)))
+
+
+class VirtualSensorPort(object):
+    """Model of one BrickPi3 sensor port"""
+
+    def __init__(self):
+        self.type = _ST.NONE
+        self.params = []
+        self.ready_at = 0.0
+        self.value = None
+        self.i2c_address = 0
+        self.i2c_out = []
+        self.i2c_in_bytes = 0
+        self.i2c_same = False
+        self.i2c_data = None
+
+
+class VirtualBoard(object):
+    """Model of the state of one BrickPi3"""
+
+    def __init__(self, address = 1, id = None):
+        """
+        Keyword arguments:
+        address = 1 -- the SPI address of the board
+        id = None -- the 32-digit hex serial number. Derived from the address by default.
+        """
+        self.address = address
+        if id is None:
+            id = "%032X" % (0xD1B3 << 96 | address)
+        self.id = list(bytearray.fromhex(id))
+        self.manufacturer = "Dexter Industries"
+        self.name = "BrickPi3"
+        self.hardware_version = 3002001
+        self.firmware_version = 1004000
+        self.led = -1
+        self.voltage_3v3 = 3.3
+        self.voltage_5v = 5.0
+        self.voltage_9v = 9.0
+        self.voltage_battery = 9.6
+        self.sensors = [VirtualSensorPort() for p in range(4)]
+        self.motors = [VirtualMotor() for p in range(4)]
+        self.i2c_devices = [{} for p in range(4)]
+
+
+class BrickPi3Emulator(object):
+    """
+    Emulates one or more BrickPi3 boards sharing an SPI bus
+
+    Sensor values are set with set_sensor_value() in the same form that
+    BrickPi3.get_sensor returns them. I2C devices are simulated with handlers
+    attached using attach_i2c_device().
+    """
+
+    def __init__(self, addresses = (1,), clock = None):
+        """
+        Keyword arguments:
+        addresses = (1,) -- the SPI addresses of the emulated boards
+        clock = None -- the time source. Pass a brickpi3.VirtualClock to run faster than real time.
+        """
+        if clock is None:
+            clock = SYSTEM_CLOCK
+        self.clock = clock
+        self.boards = [VirtualBoard(address) for address in addresses]
+        self.ev3_connect_time = 1.0      # time for an EV3 sensor to be detected and configured
+        self.ev3_mode_switch_time = 0.01 # time for an EV3 sensor to change mode
+        self.i2c_configure_time = 0.05   # time to set up an I2C sensor port
+        self._lock = threading.Lock()
+
+    def board(self, address = 1):
+        """Return the VirtualBoard with the specified SPI address"""
+        for board in self.boards:
+            if board.address == address:
+                return board
+        raise IOError("BrickPi3Emulator error: no board with SPI address %d" % address)
+
+    def set_sensor_value(self, port, value, address = 1):
+        """
+        Set the value reported by a sensor
+
+        Keyword arguments:
+        port -- The sensor port(s). PORT_1, PORT_2, PORT_3, and/or PORT_4.
+        value -- the value, in the same form that BrickPi3.get_sensor returns it
+        address = 1 -- the SPI address of the board
+        """
+        board = self.board(address)
+        with self._lock:
+            for p in range(4):
+                if port & (1 << p):
+                    board.sensors[p].value = value
+
+    def reset_board(self, address = 1):
+        """
+        Simulate a reset of a board, such as after a brown out: the sensors, motors and LED return to their defaults
+
+        Keyword arguments:
+        address = 1 -- the SPI address of the board
+        """
+        board = self.board(address)
+        with self._lock:
+            values = [sensor.value for sensor in board.sensors]
+            board.sensors = [VirtualSensorPort() for p in range(4)]
+            for sensor, value in zip(board.sensors, values):
+                sensor.value = value # the value is what the sensor measures, not part of the board
+            board.motors = [VirtualMotor() for p in range(4)]
+            board.led = -1
+
+    def attach_i2c_device(self, port, i2c_address, handler, address = 1):
+        """
+        Attach a simulated I2C device to a sensor port
+
+        Keyword arguments:
+        port -- The sensor port (one at a time). PORT_1, PORT_2, PORT_3, or PORT_4.
+        i2c_address -- The I2C address for the device. Bits 1-7, not 0-6.
+        handler -- a function called with (bytes written, number of bytes to read) that returns the bytes read
+        address = 1 -- the SPI address of the board
+        """
+        board = self.board(address)
+        with self._lock:
+            for p in range(4):
+                if port & (1 << p):
+                    board.i2c_devices[p][i2c_address] = handler
+
+    def transfer(self, data_out):
+        """
+        Process one SPI message
+
+        Keyword arguments:
+        data_out -- a list of bytes sent to the bus
+
+        Returns a list of the bytes read.
+        """
+        reply = [0] * len(data_out)
+        if len(data_out) < 2:
+            return reply
+        with self._lock:
+            now = self.clock.monotonic()
+            if data_out[1] == _MT.SET_ADDRESS:
+                self._set_address(data_out)
+                return reply
+            for board in self.boards:
+                if data_out[0] == board.address or data_out[0] == 0:
+                    data = self._process(board, data_out, now)
+                    if data is not None:
+                        reply[3] = 0xA5
+                        for i in range(min(len(data), len(reply) - 4)):
+                            reply[4 + i] = data[i]
+        return reply
+
+    def _set_address(self, data_out):
+        spec = PROTOCOL.SET_ADDRESS
+        if len(data_out) < spec.length:
+            return
+        address, id = spec.unpack_request(data_out)
+        id = list(bytearray(id))
+        for board in self.boards:
+            if id == board.id or id == [0] * 16:
+                board.address = address
+
+    def _process(self, board, data_out, now):
+        """Apply a message to a board. Returns the data bytes of the reply for read messages."""
+        message_type = data_out[1]
+        spec = PROTOCOL.spec(message_type)
+        if spec is None or len(data_out) < REQUEST_OFFSET + spec.request.size:
+            return None
+        fields = spec.unpack_request(data_out)
+        extra = data_out[(REQUEST_OFFSET + spec.request.size):]
+
+        if message_type == _MT.GET_MANUFACTURER:
+            return spec.reply_data(board.manufacturer)
+        if message_type == _MT.GET_NAME:
+            return spec.reply_data(board.name)
+        if message_type == _MT.GET_HARDWARE_VERSION:
+            return spec.reply_data(board.hardware_version)
+        if message_type == _MT.GET_FIRMWARE_VERSION:
+            return spec.reply_data(board.firmware_version)
+        if message_type == _MT.GET_ID:
+            return spec.reply_data(board.id)
+        if message_type == _MT.SET_LED:
+            board.led = fields[0]
+            return None
+        if message_type == _MT.GET_VOLTAGE_3V3:
+            return spec.reply_data(board.voltage_3v3)
+        if message_type == _MT.GET_VOLTAGE_5V:
+            return spec.reply_data(board.voltage_5v)
+        if message_type == _MT.GET_VOLTAGE_9V:
+            return spec.reply_data(board.voltage_9v)
+        if message_type == _MT.GET_VOLTAGE_VCC:
+            return spec.reply_data(board.voltage_battery)
+
+        if message_type == _MT.SET_SENSOR_TYPE:
+            self._set_sensor_type(board, fields, list(extra), now)
+            return None
+        if _MT.GET_SENSOR_1 <= message_type <= _MT.GET_SENSOR_4:
+            return self._get_sensor(board, spec, message_type - _MT.GET_SENSOR_1, now)
+        if _MT.I2C_TRANSACT_1 <= message_type <= _MT.I2C_TRANSACT_4:
+            self._i2c_transact(board, message_type - _MT.I2C_TRANSACT_1, fields, list(extra))
+            return None
+
+        if _MT.SET_MOTOR_POWER <= message_type <= _MT.OFFSET_MOTOR_ENCODER:
+            self._set_motor(board, message_type, fields, now)
+            return None
+        if _MT.GET_MOTOR_A_ENCODER <= message_type <= _MT.GET_MOTOR_D_ENCODER:
+            motor = board.motors[message_type - _MT.GET_MOTOR_A_ENCODER]
+            motor.update(now)
+            return spec.reply_data(int(round(motor.position)))
+        if _MT.GET_MOTOR_A_STATUS <= message_type <= _MT.GET_MOTOR_D_STATUS:
+            motor = board.motors[message_type - _MT.GET_MOTOR_A_STATUS]
+            motor.update(now)
+            return spec.reply_data(motor.flags, motor.reported_power(), int(round(motor.position)), int(motor.speed))
+        return None
+
+    def _set_sensor_type(self, board, fields, params, now):
+        port_mask, type = fields
+        for p in range(4):
+            if not port_mask & (1 << p):
+                continue
+            sensor = board.sensors[p]
+            old_type = sensor.type
+            if type in _EV3_DEVICE:
+                if old_type in _EV3_DEVICE[type] and now >= sensor.ready_at:
+                    delay = self.ev3_mode_switch_time
+                else:
+                    delay = self.ev3_connect_time
+            elif type in (_ST.I2C, _ST.NXT_ULTRASONIC):
+                delay = self.i2c_configure_time
+            else:
+                delay = 0.0
+            sensor.type = type
+            sensor.params = params
+            sensor.ready_at = now + delay
+            sensor.i2c_same = False
+            sensor.i2c_data = None
+            same_end = I2C_PARAMETERS.size + I2C_SAME_PARAMETERS.size
+            if type == _ST.I2C and len(params) >= same_end and params[0] & BrickPi3.SENSOR_I2C_SETTINGS.SAME:
+                delay, address, in_bytes, out_bytes = I2C_SAME_PARAMETERS.unpack_from(params, I2C_PARAMETERS.size)
+                sensor.i2c_same = True
+                sensor.i2c_address = address
+                sensor.i2c_in_bytes = in_bytes
+                sensor.i2c_out = params[same_end:(same_end + out_bytes)]
+
+    def _i2c_transact(self, board, port_index, fields, data):
+        sensor = board.sensors[port_index]
+        if sensor.type != _ST.I2C:
+            return
+        sensor.i2c_address, sensor.i2c_in_bytes, out_bytes = fields
+        sensor.i2c_out = data[:out_bytes]
+        sensor.i2c_data = self._run_i2c(board, port_index)
+
+    def _run_i2c(self, board, port_index):
+        sensor = board.sensors[port_index]
+        handler = board.i2c_devices[port_index].get(sensor.i2c_address)
+        if handler is None:
+            return None
+        data = list(handler(list(sensor.i2c_out), sensor.i2c_in_bytes))
+        return (data + [0] * sensor.i2c_in_bytes)[:sensor.i2c_in_bytes]
+
+    def _get_sensor(self, board, spec, port_index, now):
+        sensor = board.sensors[port_index]
+        if sensor.type == _ST.NONE:
+            return spec.reply_data(sensor.type, _SS.NOT_CONFIGURED)
+        if now < sensor.ready_at:
+            return spec.reply_data(sensor.type, _SS.CONFIGURING)
+        if sensor.type == _ST.I2C:
+            if sensor.i2c_same:
+                sensor.i2c_data = self._run_i2c(board, port_index)
+            if sensor.i2c_data is None:
+                if sensor.i2c_same or sensor.i2c_address:
+                    return spec.reply_data(sensor.type, _SS.I2C_ERROR)
+                return spec.reply_data(sensor.type, _SS.NO_DATA)
+            return spec.reply_data(sensor.type, _SS.VALID_DATA) + sensor.i2c_data
+        value = sensor.value
+        data = [0] * 16
+        if value is not None:
+            data = _encode_sensor(sensor.type, value) + data
+        return spec.reply_data(sensor.type, _SS.VALID_DATA) + data
+
+    def _set_motor(self, board, message_type, fields, now):
+        port_mask = fields[0]
+        for p in range(4):
+            if not port_mask & (1 << p):
+                continue
+            motor = board.motors[p]
+            motor.update(now)
+            if message_type == _MT.SET_MOTOR_POWER:
+                motor.power = fields[1]
+                motor.mode = "float" if motor.power == BrickPi3.MOTOR_FLOAT else "power"
+            elif message_type == _MT.SET_MOTOR_POSITION:
+                motor.target_position = fields[1]
+                motor.mode = "position"
+            elif message_type == _MT.SET_MOTOR_POSITION_KP:
+                motor.position_kp = fields[1]
+            elif message_type == _MT.SET_MOTOR_POSITION_KD:
+                motor.position_kd = fields[1]
+            elif message_type == _MT.SET_MOTOR_DPS:
+                motor.target_dps = fields[1]
+                motor.mode = "dps"
+            elif message_type == _MT.SET_MOTOR_DPS_KP:
+                motor.dps_kp = fields[1]
+            elif message_type == _MT.SET_MOTOR_DPS_KD:
+                motor.dps_kd = fields[1]
+            elif message_type == _MT.SET_MOTOR_LIMITS:
+                motor.limit_power, motor.limit_dps = fields[1:3]
+            elif message_type == _MT.OFFSET_MOTOR_ENCODER:
+                offset = fields[1]
+                motor.position -= offset
+                motor.target_position -= offset
+
+
+class EmulatorTransport(Transport):
+    """
+    Transport that sends BrickPi3 messages to a BrickPi3Emulator
+
+    Each transfer optionally takes the time it would on a real bus: a fixed per-transfer
+    latency plus the time to clock the bytes at speed_hz. With a VirtualClock the time is
+    only simulated, so benchmarks run faster than real time.
+    """
+
+    def __init__(self, emulator = None, latency = 0.0, speed_hz = None, clock = None, max_speed_hz = None):
+        """
+        Keyword arguments:
+        emulator = None -- the BrickPi3Emulator to talk to. A new single board emulator is created by default.
+        latency = 0.0 -- the fixed time each transfer takes, in seconds
+        speed_hz = None -- the simulated SPI clock speed in Hz. None to ignore the time spent clocking bytes.
+        clock = None -- the time source for a new emulator. Ignored if emulator is specified.
+        max_speed_hz = None -- the fastest speed_hz that the simulated bus is reliable at. Faster transfers read only zeros.
+        """
+        if emulator is None:
+            emulator = BrickPi3Emulator(clock = clock)
+        self.emulator = emulator
+        self.clock = emulator.clock
+        self.latency = latency
+        self.speed_hz = speed_hz
+        self.max_speed_hz = max_speed_hz
+        self.transfers = 0
+
+    def _wait(self, byte_count):
+        delay = self.latency
+        if self.speed_hz:
+            delay += byte_count * 8.0 / self.speed_hz
+        self.clock.sleep(delay)
+
+    def _reliable(self):
+        return self.max_speed_hz is None or self.speed_hz is None or self.speed_hz <= self.max_speed_hz
+
+    def transfer(self, data_out):
+        self.transfers += 1
+        reply = self.emulator.transfer(data_out)
+        self._wait(len(data_out))
+        if not self._reliable():
+            return [0] * len(data_out)
+        return reply
+
+    def transfer_many(self, messages):
+        # like SpidevTransport, all of the messages share a single transfer latency
+        self.transfers += 1
+        replies = [self.emulator.transfer(data_out) for data_out in messages]
+        self._wait(sum(len(data_out) for data_out in messages))
+        if not self._reliable():
+            return [[0] * len(data_out) for data_out in messages]
+        return replies
@@ -72,36 +72,19 @@ try:
         time.sleep(0.2)
     print("\nSensor ready. Starting mode switching.")
 
-    while True:
-        BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.EV3_COLOR_REFLECTED)
-        time.sleep(0.02)
-        try:
-            value1 = BP.get_sensor(BP.PORT_1)
-        except (brickpi3.SensorError, OSError) as error:
-            value1 = f"Error: {error}"
-
-        BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.EV3_COLOR_AMBIENT)
-        time.sleep(0.02)
-        try:
-            value2 = BP.get_sensor(BP.PORT_1)
-        except (brickpi3.SensorError, OSError) as error:
-            value2 = f"Error: {error}"
+    # The scheduler switches the mode and reads the sensor as soon as it reports valid data for the new mode,
+    # rather than waiting a fixed time after each switch.
+    modes = [BP.SENSOR_TYPE.EV3_COLOR_REFLECTED, BP.SENSOR_TYPE.EV3_COLOR_AMBIENT, BP.SENSOR_TYPE.EV3_COLOR_COLOR, BP.SENSOR_TYPE.EV3_COLOR_COLOR_COMPONENTS]
+    scheduler = brickpi3.ModeScheduler(BP, {BP.PORT_1: modes})
 
-        BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.EV3_COLOR_COLOR)
-        time.sleep(0.02)
-        try:
-            value3 = BP.get_sensor(BP.PORT_1)
-        except (brickpi3.SensorError, OSError) as error:
-            value3 = f"Error: {error}"
-
-        BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.EV3_COLOR_COLOR_COMPONENTS)
-        time.sleep(0.02)
+    while True:
         try:
-            value4 = BP.get_sensor(BP.PORT_1)
+            readings = scheduler.read()[BP.PORT_1]
         except (brickpi3.SensorError, OSError) as error:
-            value4 = f"Error: {error}"
+            print(f"Error: {error}")
+            continue
 
-        print(value1, "   ", value2, "   ", value3, "   ", value4)
+        print(readings[modes[0]], "   ", readings[modes[1]], "   ", readings[modes[2]], "   ", readings[modes[3]])
 
 except KeyboardInterrupt: # except the program gets interrupted by Ctrl+C on the keyboard.
     BP.reset_all()        # Unconfigure the sensors, disable the motors, and restore the LED to the control of the BrickPi3 firmware.
@@ -25,28 +25,17 @@ BP = brickpi3.BrickPi3() # Create an instance of the BrickPi3 class. BP will be
 
 
 
-# Configure for an EV3 color sensor.
-# BP.set_sensor_type configures the BrickPi3 for a specific sensor.
+# Configure for an EV3 gyro sensor.
+# BP.configure_sensors configures the BrickPi3 for specific sensors, and returns a future for each port
+# that completes when the sensor reports its first valid reading.
 # BP.PORT_1 specifies that the sensor will be on sensor port 1.
 # BP.Sensor_TYPE.EV3_GYRO_ABS_DPS specifies that the sensor will be an EV3 gyro sensor.
-BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.EV3_GYRO_ABS_DPS)
+futures = BP.configure_sensors({BP.PORT_1: BP.SENSOR_TYPE.EV3_GYRO_ABS_DPS}, timeout = 60)
 
-# Pre-loop: Poll sensor until valid reading or 1 min elapsed
 print("Waiting for valid sensor reading (up to 1 minute)...")
-start_time = time.time()
-valid_reading = False
-while time.time() - start_time < 60:
-    try:
-        value = BP.get_sensor(BP.PORT_1)
-        print(".", end="", flush=True)
-        if value is not None:
-            print(".", end="", flush=True)
-            valid_reading = True
-            break
-    except (brickpi3.SensorError, OSError):
-        print(".", end="", flush=True)
-    time.sleep(0.2)
-if not valid_reading:
+try:
+    futures[BP.PORT_1].result()
+except (brickpi3.SensorError, OSError):
     print("\nNo valid sensor reading received after 1 minute. Exiting.")
     exit(1)
 
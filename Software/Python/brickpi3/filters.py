@@ -0,0 +1,171 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Incremental filters for noisy sensor values.
+#
+# Each filter takes one value at a time and returns the filtered value, keeping only the
+# state it needs. Attach them to a sensor port, and get_sensor (as well as get_sensors,
+# the poller and streams) returns the filtered values:
+#
+#     from brickpi3.filters import OutlierReject, Median, EMA
+#     BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.EV3_ULTRASONIC_CM)
+#     BP.set_sensor_filter(BP.PORT_1, OutlierReject(50), Median(5), EMA(0.3))
+#     distance = BP.get_sensor(BP.PORT_1)
+#
+# The filters work on sensors that return a single number.
+
+import bisect # for the sorted window of Median
+
+
+class Median(object):
+    """
+    The median of the last few values, updated in place as each value arrives
+
+    Each value is added to a sorted copy of the window, and the oldest is removed, with a binary search. Moving
+    the values along the list after the search is O(size), but for windows of a few dozen values it is a single
+    memmove that takes less time than the O(log size) bookkeeping of a pair of heaps, or a skip list, in Python.
+    """
+    __slots__ = ("size", "_window", "_sorted", "_next")
+
+    def __init__(self, size = 5):
+        """
+        Keyword arguments:
+        size = 5 -- the number of values in the window
+        """
+        if size < 1:
+            raise ValueError("Median error: size must be at least 1")
+        self.size = size
+        self.reset()
+
+    def __call__(self, value):
+        window = self._window
+        sorted_values = self._sorted
+        if len(window) < self.size:
+            window.append(value)
+        else:
+            # replace the oldest value, in the window and in the sorted copy
+            del sorted_values[bisect.bisect_left(sorted_values, window[self._next])]
+            window[self._next] = value
+            self._next = (self._next + 1) % self.size
+        bisect.insort(sorted_values, value)
+        return sorted_values[len(sorted_values) // 2]
+
+    def reset(self):
+        """Forget the previous values"""
+        self._window = []
+        self._sorted = []
+        self._next = 0
+
+
+class EMA(object):
+    """An exponential moving average"""
+    __slots__ = ("alpha", "value")
+
+    def __init__(self, alpha = 0.2):
+        """
+        Keyword arguments:
+        alpha = 0.2 -- the weight of each new value, from 0 (never change) to 1 (no filtering)
+        """
+        if not 0 < alpha <= 1:
+            raise ValueError("EMA error: alpha must be greater than 0, and at most 1")
+        self.alpha = alpha
+        self.value = None
+
+    def __call__(self, value):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+    def reset(self):
+        """Forget the previous values"""
+        self.value = None
+
+
+class Kalman(object):
+    """A one dimensional Kalman filter, for a value that changes slowly and is measured with noise"""
+    __slots__ = ("process_noise", "measurement_noise", "value", "variance")
+
+    def __init__(self, process_noise = 1.0, measurement_noise = 10.0):
+        """
+        Keyword arguments:
+        process_noise = 1.0 -- how much the true value is expected to change between readings (a variance)
+        measurement_noise = 10.0 -- how noisy the readings are (a variance)
+        """
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.value = None
+        self.variance = 0.0 # the variance of the estimated value
+
+    def __call__(self, value):
+        if self.value is None:
+            self.value = value
+            self.variance = self.measurement_noise
+            return value
+        variance = self.variance + self.process_noise
+        gain = variance / (variance + self.measurement_noise)
+        self.value += gain * (value - self.value)
+        self.variance = (1 - gain) * variance
+        return self.value
+
+    def reset(self):
+        """Forget the previous values"""
+        self.value = None
+        self.variance = 0.0
+
+
+class OutlierReject(object):
+    """
+    Replaces values that jump too far from the last accepted value with the last accepted value
+
+    A jump that persists for more than max_rejects values is accepted as a real change.
+    """
+    __slots__ = ("threshold", "max_rejects", "value", "rejects")
+
+    def __init__(self, threshold, max_rejects = 3):
+        """
+        Keyword arguments:
+        threshold -- the largest accepted change from the last accepted value
+        max_rejects = 3 -- the number of values in a row that can be rejected
+        """
+        self.threshold = threshold
+        self.max_rejects = max_rejects
+        self.value = None
+        self.rejects = 0
+
+    def __call__(self, value):
+        if self.value is not None and abs(value - self.value) > self.threshold and self.rejects < self.max_rejects:
+            self.rejects += 1
+            return self.value
+        self.value = value
+        self.rejects = 0
+        return value
+
+    def reset(self):
+        """Forget the previous values"""
+        self.value = None
+        self.rejects = 0
+
+
+class Pipeline(object):
+    """Several filters (or functions of one value) applied in order"""
+    __slots__ = ("filters",)
+
+    def __init__(self, *filters):
+        self.filters = filters
+
+    def __call__(self, value):
+        for f in self.filters:
+            value = f(value)
+        return value
+
+    def reset(self):
+        """Forget the previous values of every filter"""
+        for f in self.filters:
+            if hasattr(f, "reset"):
+                f.reset()
@@ -0,0 +1,261 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# A fixed size history of sensor and motor values.
+#
+# Each channel keeps its most recent timestamps and values in preallocated array ring
+# buffers, so recording never allocates and old values are overwritten rather than kept
+# forever. The poller records every snapshot:
+#
+#     history = BP.record_history(capacity = 6000)
+#     BP.start_poller(hz = 100)
+#     ...
+#     history["motor_a_dps"].mean(seconds = 0.5)
+#     points = history["sensor_1"].downsample(200) # for plotting
+#
+# The arrays returned by window() can be wrapped by NumPy without a copy: numpy.frombuffer(values).
+
+import array     # for the ring buffers
+import numbers   # for Real
+import threading # for the lock
+
+
+class Channel(object):
+    """The history of one value: a ring buffer of timestamps (in seconds) and values"""
+
+    def __init__(self, capacity):
+        """
+        Keyword arguments:
+        capacity -- the number of values kept. Older values are overwritten.
+        """
+        if capacity < 1:
+            raise ValueError("History error: capacity must be at least 1")
+        self.capacity = capacity
+        self.count = 0    # the number of values kept
+        self.appended = 0 # the number of values appended in total
+        self._timestamps = array.array("d", [0.0]) * capacity
+        self._values = array.array("d", [0.0]) * capacity
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, value):
+        """
+        Add a value. Timestamps must not decrease.
+
+        Keyword arguments:
+        timestamp -- the time of the value in seconds
+        value -- the value
+        """
+        self._lock.acquire()
+        try:
+            slot = self.appended % self.capacity
+            self._timestamps[slot] = timestamp
+            self._values[slot] = value
+            self.appended += 1
+            if self.count < self.capacity:
+                self.count += 1
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """Discard the values"""
+        self._lock.acquire()
+        try:
+            self.count = 0
+        finally:
+            self._lock.release()
+
+    def latest(self):
+        """Return the newest (timestamp, value), or None if the channel is empty"""
+        self._lock.acquire()
+        try:
+            if self.count == 0:
+                return None
+            slot = (self.appended - 1) % self.capacity
+            return (self._timestamps[slot], self._values[slot])
+        finally:
+            self._lock.release()
+
+    def window(self, seconds = None):
+        """
+        Return the values of the last seconds, oldest first
+
+        Keyword arguments:
+        seconds = None -- the length of the window, counted back from the newest value. Defaults to every value kept.
+
+        Returns two arrays of doubles: the timestamps, and the values.
+        """
+        self._lock.acquire()
+        try:
+            count = self.count
+            first = self.appended - count # the logical index of the oldest value
+            if seconds is not None and count > 0:
+                timestamps = self._timestamps
+                capacity = self.capacity
+                start = timestamps[(self.appended - 1) % capacity] - seconds
+                low, high = first, self.appended
+                while low < high: # binary search for the first value in the window
+                    middle = (low + high) // 2
+                    if timestamps[middle % capacity] < start:
+                        low = middle + 1
+                    else:
+                        high = middle
+                first = low
+            return self._slice(self._timestamps, first), self._slice(self._values, first)
+        finally:
+            self._lock.release()
+
+    def _slice(self, buffer, first):
+        """Return the entries of buffer from logical index first to the newest, in order"""
+        begin = first % self.capacity
+        end = self.appended % self.capacity
+        if first == self.appended:
+            return buffer[0:0]
+        if begin < end:
+            return buffer[begin:end]
+        return buffer[begin:] + buffer[:end]
+
+    def min(self, seconds = None):
+        """Return the smallest value of the last seconds, or None if there are none"""
+        values = self.window(seconds)[1]
+        return min(values) if values else None
+
+    def max(self, seconds = None):
+        """Return the largest value of the last seconds, or None if there are none"""
+        values = self.window(seconds)[1]
+        return max(values) if values else None
+
+    def mean(self, seconds = None):
+        """Return the mean of the values of the last seconds, or None if there are none"""
+        values = self.window(seconds)[1]
+        return sum(values) / len(values) if values else None
+
+    def downsample(self, points, seconds = None):
+        """
+        Reduce the values of the last seconds to a few points that keep the shape of the curve, for plotting
+
+        Uses the Largest Triangle Three Buckets algorithm.
+
+        Keyword arguments:
+        points -- the number of points to return. At least 3.
+        seconds = None -- the length of the window. Defaults to every value kept.
+
+        Returns a list of (timestamp, value).
+        """
+        if points < 3:
+            raise ValueError("History error: downsample needs at least 3 points")
+        timestamps, values = self.window(seconds)
+        count = len(values)
+        if count <= points:
+            return list(zip(timestamps, values))
+
+        bucket_size = (count - 2) / float(points - 2)
+        selected = 0
+        result = [(timestamps[0], values[0])]
+        for bucket in range(points - 2):
+            start = int(bucket * bucket_size) + 1
+            end = int((bucket + 1) * bucket_size) + 1
+            # the average of the next bucket is the third corner of the triangles
+            next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+            if end >= count - 1:
+                next_start, next_end = count - 1, count
+            else:
+                next_start = end
+            next_count = next_end - next_start
+            average_t = sum(timestamps[next_start:next_end]) / next_count
+            average_v = sum(values[next_start:next_end]) / next_count
+
+            selected_t = timestamps[selected]
+            selected_v = values[selected]
+            largest = -1.0
+            for i in range(start, end):
+                area = abs((selected_t - average_t) * (values[i] - selected_v) -
+                           (selected_t - timestamps[i]) * (average_v - selected_v))
+                if area > largest:
+                    largest = area
+                    chosen = i
+            selected = chosen
+            result.append((timestamps[selected], values[selected]))
+        result.append((timestamps[count - 1], values[count - 1]))
+        return result
+
+
+class History(object):
+    """
+    The histories of several values, by name. Channels are created when they are first recorded.
+
+    record() names the channels of a Snapshot "sensor_1" to "sensor_4" (numeric sensor values
+    only), "motor_a_power", "motor_a_encoder" and "motor_a_dps" to "motor_d_...", and "voltage_battery".
+    """
+
+    def __init__(self, capacity = 1000):
+        """
+        Keyword arguments:
+        capacity = 1000 -- the number of values kept by each channel
+        """
+        if capacity < 1:
+            raise ValueError("History error: capacity must be at least 1")
+        self.capacity = capacity
+        self.channels = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        return self.channels[name]
+
+    def __contains__(self, name):
+        return name in self.channels
+
+    def channel(self, name):
+        """Return the channel called name, creating it if needed"""
+        channel = self.channels.get(name)
+        if channel is None:
+            self._lock.acquire()
+            try:
+                channel = self.channels.get(name)
+                if channel is None:
+                    channel = Channel(self.capacity)
+                    self.channels[name] = channel
+            finally:
+                self._lock.release()
+        return channel
+
+    def append(self, name, timestamp, value):
+        """
+        Add a value to a channel
+
+        Keyword arguments:
+        name -- the channel name
+        timestamp -- the time of the value in seconds
+        value -- the value
+        """
+        self.channel(name).append(timestamp, value)
+
+    def record(self, snapshot):
+        """Add the values of a Snapshot"""
+        timestamp = snapshot.timestamp
+        for p in range(4):
+            value = snapshot.sensors[p]
+            if isinstance(value, numbers.Real):
+                self.channel(_SENSOR_CHANNELS[p]).append(timestamp, value)
+        for p in range(4):
+            flags, power, encoder, dps = snapshot.motor_status[p]
+            names = _MOTOR_CHANNELS[p]
+            self.channel(names[0]).append(timestamp, power)
+            self.channel(names[1]).append(timestamp, encoder)
+            self.channel(names[2]).append(timestamp, dps)
+        self.channel("voltage_battery").append(timestamp, snapshot.voltage_battery)
+
+    def clear(self):
+        """Discard the values of every channel"""
+        for channel in list(self.channels.values()):
+            channel.clear()
+
+
+_SENSOR_CHANNELS = ["sensor_%d" % (p + 1) for p in range(4)]
+_MOTOR_CHANNELS = [["motor_%s_%s" % (port, value) for value in ("power", "encoder", "dps")] for port in "abcd"]
@@ -0,0 +1,298 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Coordinated motion of several motors, for plotters and arms.
+#
+# set_motor_position makes each motor jump to its target at its own speed, so the axes of a
+# move arrive at different times. MotionEngine plans each move so that every axis starts and
+# stops together, following a straight line with a trapezoidal (or S-curve) velocity
+# profile, and streams the position setpoints at a fixed rate. Each tick sends the setpoints
+# and reads the motor statuses in one bus transfer, to measure how closely the motors follow:
+#
+#     engine = brickpi3.MotionEngine(BP, {"X": BP.PORT_A, "Y": BP.PORT_B}, max_dps = 720, acceleration = 2000)
+#     engine.move_to({"X": 360, "Y": 90})
+#     engine.move_by({"Y": -90}, profile = "s-curve")
+#     engine.gcode("G91\nG1 X10 Y10 F600", degrees_per_unit = 36)
+#     engine.run()
+#     engine.max_tracking_error
+#
+# Positions are in degrees of the motor encoders.
+
+import collections # for the queue of moves
+import math        # for sqrt
+import re          # for G-code comments
+
+PROFILES = ("trapezoid", "s-curve")
+
+_S_CURVE_VELOCITY = 1.875     # the peak velocity of the minimum jerk curve, for a move of length and duration 1
+_S_CURVE_ACCELERATION = 5.7735 # its peak acceleration
+
+
+def _trapezoid(velocity, acceleration):
+    """
+    Plan a move from 0 to 1 with a trapezoidal velocity profile
+
+    Keyword arguments:
+    velocity -- the highest speed, in lengths of the move per second
+    acceleration -- the highest acceleration, in lengths of the move per second squared
+
+    Returns the duration, and the function of time that returns the position (0 to 1).
+    """
+    if velocity * velocity / acceleration < 1: # cruising speed is reached
+        ramp = velocity / acceleration
+        duration = ramp + 1.0 / velocity
+    else: # a triangle: accelerate to the middle, then decelerate
+        ramp = math.sqrt(1.0 / acceleration)
+        velocity = acceleration * ramp
+        duration = 2 * ramp
+    ramp_length = 0.5 * acceleration * ramp * ramp
+
+    def position(t):
+        if t <= 0:
+            return 0.0
+        if t >= duration:
+            return 1.0
+        if t < ramp:
+            return 0.5 * acceleration * t * t
+        if t < duration - ramp:
+            return ramp_length + velocity * (t - ramp)
+        remaining = duration - t
+        return 1.0 - 0.5 * acceleration * remaining * remaining
+    return duration, position
+
+
+def _s_curve(velocity, acceleration):
+    """
+    Plan a move from 0 to 1 along a minimum jerk curve, which has no steps in acceleration
+
+    Keyword arguments:
+    velocity -- the highest speed, in lengths of the move per second
+    acceleration -- the highest acceleration, in lengths of the move per second squared
+
+    Returns the duration, and the function of time that returns the position (0 to 1).
+    """
+    duration = max(_S_CURVE_VELOCITY / velocity, math.sqrt(_S_CURVE_ACCELERATION / acceleration))
+
+    def position(t):
+        if t <= 0:
+            return 0.0
+        if t >= duration:
+            return 1.0
+        s = t / duration
+        return s * s * s * (10 + s * (6 * s - 15))
+    return duration, position
+
+
+class MotionEngine(object):
+    """Plans coordinated moves of several motors, and streams their position setpoints"""
+
+    def __init__(self, bp, axes, max_dps = 500, acceleration = 1000, hz = 100):
+        """
+        Keyword arguments:
+        bp -- the BrickPi3
+        axes -- a dict with the motor port of each axis name, such as {"X": BP.PORT_A, "Y": BP.PORT_B}
+        max_dps = 500 -- the speed limit of the axes in degrees per second, or a dict of the limit of each axis
+        acceleration = 1000 -- the acceleration limit of the axes in degrees per second squared, or a dict of the limit of each axis
+        hz = 100 -- the number of setpoints sent per second
+        """
+        if hz <= 0:
+            raise ValueError("MotionEngine error: hz must be greater than 0")
+        self.bp = bp
+        self.axes = dict(axes)
+        self.ports = 0
+        for name, port in self.axes.items():
+            if port not in (bp.PORT_A, bp.PORT_B, bp.PORT_C, bp.PORT_D) or port & self.ports:
+                raise IOError("MotionEngine error: axis %r must have a motor port of its own. PORT_A, PORT_B, PORT_C, or PORT_D." % name)
+            self.ports |= port
+        self.max_dps = self._per_axis(max_dps)
+        self.acceleration = self._per_axis(acceleration)
+        self.period_ns = int(1000000000 / hz)
+        self.setpoints = None         # the last position sent for each axis
+        self.tracking_error = {}      # the latest setpoint minus encoder of each axis, for the setpoint sent one tick earlier
+        self.max_tracking_error = {}  # the largest tracking error (by size) of each axis during run
+        self.ticks = 0                # the number of setpoints sent
+        self.missed = 0               # the number of ticks skipped because a tick took too long
+        self._queue = collections.deque()
+
+    def _per_axis(self, value):
+        if isinstance(value, dict):
+            return dict((name, value[name]) for name in self.axes)
+        return dict((name, value) for name in self.axes)
+
+    def move_to(self, targets, profile = "trapezoid", feed = None):
+        """
+        Queue a move to a position
+
+        Keyword arguments:
+        targets -- a dict with the target position in degrees of each axis that moves
+        profile = "trapezoid" -- the velocity profile: "trapezoid" or "s-curve"
+        feed = None -- the speed limit along the path in degrees per second, in addition to the limits of each axis
+        """
+        self._queue_move(targets, False, profile, feed)
+
+    def move_by(self, distances, profile = "trapezoid", feed = None):
+        """
+        Queue a move relative to the end of the previous move
+
+        Keyword arguments:
+        distances -- a dict with the distance in degrees to move each axis that moves
+        profile = "trapezoid" -- the velocity profile: "trapezoid" or "s-curve"
+        feed = None -- the speed limit along the path in degrees per second, in addition to the limits of each axis
+        """
+        self._queue_move(distances, True, profile, feed)
+
+    def _queue_move(self, values, relative, profile, feed):
+        for name in values:
+            if name not in self.axes:
+                raise IOError("MotionEngine error: %r is not an axis." % name)
+        if profile not in PROFILES:
+            raise ValueError("MotionEngine error: profile must be one of %s" % ", ".join(PROFILES))
+        self._queue.append(("move", dict(values), relative, profile, feed))
+
+    def dwell(self, seconds):
+        """Queue a pause, holding the current position"""
+        self._queue.append(("dwell", seconds))
+
+    def gcode(self, program, degrees_per_unit = 1.0, profile = "trapezoid"):
+        """
+        Queue the moves of a G-code program
+
+        Supported: G0 and G1 (with F, the feed rate in units per minute, along the path), G4 (with P in
+        milliseconds or S in seconds), G90 (absolute positions, the default) and G91 (relative positions).
+        The axis letters are the axis names. Comments in parentheses or after ; are ignored. Any other
+        word, such as an M code or an N line number, raises ValueError.
+
+        Keyword arguments:
+        program -- the G-code, as a string
+        degrees_per_unit = 1.0 -- the motor degrees per G-code unit, or a dict of the degrees per unit of each axis
+        profile = "trapezoid" -- the velocity profile of the moves
+        """
+        scale = self._per_axis(degrees_per_unit)
+        letters = set(["F", "P", "S"] + [name.upper() for name in self.axes])
+        relative = False
+        feed = None
+        for number, line in enumerate(program.splitlines()):
+            line = re.sub(r"\([^)]*\)?", " ", line.split(";")[0])
+            words = line.upper().split()
+            codes = [word for word in words if word[0] == "G"]
+            values = {}
+            for word in words:
+                if word[0] != "G" and word[0] not in letters:
+                    raise ValueError("MotionEngine error: G-code line %d: %s is not supported" % (number + 1, word))
+            try:
+                for word in words:
+                    if word[0] != "G":
+                        values[word[0]] = float(word[1:])
+            except ValueError:
+                raise ValueError("MotionEngine error: G-code line %d: %r" % (number + 1, line.strip()))
+            move = None
+            for code in codes:
+                if code in ("G90", "G90.0"):
+                    relative = False
+                elif code in ("G91", "G91.0"):
+                    relative = True
+                elif code in ("G0", "G00", "G1", "G01"):
+                    move = code
+                elif code in ("G4", "G04"):
+                    self.dwell(values.get("P", 0) / 1000.0 if "P" in values else values.get("S", 0))
+                else:
+                    raise ValueError("MotionEngine error: G-code line %d: %s is not supported" % (number + 1, code))
+            if "F" in values:
+                feed = values["F"] / 60.0
+            if move is not None:
+                targets = {}
+                for name in self.axes:
+                    if name.upper() in values:
+                        targets[name] = values[name.upper()] * scale[name]
+                if move in ("G1", "G01") and feed is not None:
+                    # the feed rate is along the path in G-code units, so it is converted with the path
+                    self._queue.append(("move", targets, relative, profile, (feed, scale)))
+                else:
+                    self._queue.append(("move", targets, relative, profile, None))
+
+    def _plan(self, start, end, profile, feed):
+        """Return the duration and position function of a move from start to end"""
+        velocity = None
+        acceleration = None
+        for name in self.axes:
+            distance = abs(end[name] - start[name])
+            if distance > 0:
+                v = self.max_dps[name] / distance
+                a = self.acceleration[name] / distance
+                velocity = v if velocity is None else min(velocity, v)
+                acceleration = a if acceleration is None else min(acceleration, a)
+        if velocity is None: # nothing moves
+            return 0.0, lambda t: 1.0
+        if feed is not None:
+            if isinstance(feed, tuple): # G-code units per second, and the degrees per unit of each axis
+                feed, scale = feed
+                length = math.sqrt(sum(((end[name] - start[name]) / scale[name]) ** 2 for name in self.axes))
+            else:
+                length = math.sqrt(sum((end[name] - start[name]) ** 2 for name in self.axes))
+            if feed > 0:
+                velocity = min(velocity, feed / length)
+        if profile == "s-curve":
+            return _s_curve(velocity, acceleration)
+        return _trapezoid(velocity, acceleration)
+
+    def run(self):
+        """Run the queued moves, and return when the last one has finished"""
+        bp = self.bp
+        clock = bp.transport.clock
+        if self.setpoints is None: # start from where the motors are
+            statuses = bp.get_motor_statuses(self.ports)
+            self.setpoints = dict((name, statuses[port.bit_length() - 1].encoder) for name, port in self.axes.items())
+        self.max_tracking_error = dict((name, 0) for name in self.axes)
+        next_ns = clock.monotonic_ns() # the time of the latest tick, when the setpoints were last sent
+        while self._queue:
+            item = self._queue.popleft()
+            start = dict(self.setpoints)
+            if item[0] == "dwell":
+                end = start
+                duration, position = item[1], (lambda t: 1.0)
+            else:
+                kind, values, relative, profile, feed = item
+                end = dict(start)
+                for name, value in values.items():
+                    end[name] = start[name] + value if relative else value
+                duration, position = self._plan(start, end, profile, feed)
+            # The move starts from the setpoints sent at the latest tick, so its first tick is one period in
+            start_ns = next_ns
+            t = 0.0
+            while t < duration:
+                next_ns = self._wait(clock, next_ns)
+                t = (next_ns - start_ns) / 1000000000.0
+                s = position(t)
+                self._tick(dict((name, start[name] + (end[name] - start[name]) * s) for name in self.axes))
+            self.setpoints = end
+
+    def _tick(self, setpoints):
+        """Send the setpoints and read the motor statuses, in one bus transfer"""
+        bp = self.bp
+        with bp.batch():
+            bp.set_motors_position(dict((self.axes[name], int(round(value))) for name, value in setpoints.items()))
+            statuses = [(name, bp.get_motor_status(port)) for name, port in self.axes.items()]
+        previous = self.setpoints if self.ticks > 0 else setpoints
+        for name, status in statuses:
+            error = previous[name] - status.value[2]
+            self.tracking_error[name] = error
+            if abs(error) > abs(self.max_tracking_error.get(name, 0)):
+                self.max_tracking_error[name] = error
+        self.setpoints = setpoints
+        self.ticks += 1
+
+    def _wait(self, clock, next_ns):
+        """Wait for the next tick after next_ns, skipping ticks that have passed. Returns the time of the next tick."""
+        next_ns += self.period_ns
+        now = clock.monotonic_ns()
+        if now >= next_ns + self.period_ns: # behind by a tick or more
+            skipped = (now - next_ns) // self.period_ns
+            self.missed += skipped
+            next_ns += skipped * self.period_ns
+        if next_ns > now:
+            clock.sleep((next_ns - now) / 1000000000.0)
+        return next_ns
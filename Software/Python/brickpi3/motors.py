@@ -0,0 +1,157 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Groups of motors that move together, such as a drive base.
+#
+# A MotorGroup names its motors, and can invert the direction of some of them (a motor
+# mounted the other way round). Commands to the group are sent with as few messages as
+# possible, in one bus transfer: the same value for several ports is one message with a
+# port mask.
+#
+#     drive = brickpi3.MotorGroup(BP, {"left": BP.PORT_C, "right": BP.PORT_B}, inverted = ["left"])
+#     drive.set_dps(360)                          # both wheels forward
+#     drive.set_dps({"left": 180, "right": 360})  # a curve
+#     drive.get_status()["left"].encoder
+
+from .core import BrickPi3, MotorStatus
+
+
+class MotorGroup(object):
+    """Several motors of a BrickPi3, controlled together"""
+
+    def __init__(self, bp, members, inverted = ()):
+        """
+        Keyword arguments:
+        bp -- the BrickPi3
+        members -- a dict with the motor port of each member name, such as {"left": BP.PORT_C, "right": BP.PORT_B}
+        inverted = () -- the names of the members that turn the other way. Their power, speed, position and encoder are negated.
+        """
+        self.bp = bp
+        self.members = dict(members)
+        self.inverted = frozenset(inverted)
+        used = 0
+        for name, port in self.members.items():
+            if port not in (bp.PORT_A, bp.PORT_B, bp.PORT_C, bp.PORT_D):
+                raise IOError("MotorGroup error: member %r must be one motor port. PORT_A, PORT_B, PORT_C, or PORT_D." % name)
+            if port & used:
+                raise IOError("MotorGroup error: member %r uses a port of another member." % name)
+            used |= port
+        self.ports = used # all of the member ports
+        for name in self.inverted:
+            if name not in self.members:
+                raise IOError("MotorGroup error: inverted member %r is not a member." % name)
+
+    def _values(self, value, power = False):
+        """
+        Return a dict of the value for each member port, with the inverted members negated
+
+        Keyword arguments:
+        value -- the value for every member, or a dict of the value of each member name
+        power = False -- whether the value is a power, for which MOTOR_FLOAT (-128) means float and isn't negated
+        """
+        if not isinstance(value, dict):
+            value = dict((name, value) for name in self.members)
+        values = {}
+        for name, v in value.items():
+            if name not in self.members:
+                raise IOError("MotorGroup error: %r is not a member." % name)
+            if name in self.inverted and not (power and v == BrickPi3.MOTOR_FLOAT):
+                v = -v
+            values[self.members[name]] = v
+        return values
+
+    def set_power(self, power, force = False):
+        """
+        Set the motor power in percent
+
+        Keyword arguments:
+        power -- the power (-100 to 100, or -128 to float) for every member, or a dict of the power of each member name
+        force = False -- send the values even if they are the values last sent to the ports
+        """
+        self.bp.set_motors_power(self._values(power, power = True), force)
+
+    def set_dps(self, dps, force = False):
+        """
+        Set the motor target speed in degrees per second
+
+        Keyword arguments:
+        dps -- the target speed for every member, or a dict of the target speed of each member name
+        force = False -- send the values even if they are the values last sent to the ports
+        """
+        self.bp.set_motors_dps(self._values(dps), force)
+
+    def set_position(self, position, force = False):
+        """
+        Set the motor target position in degrees
+
+        Keyword arguments:
+        position -- the target position for every member, or a dict of the target position of each member name
+        force = False -- send the values even if they are the values last sent to the ports
+        """
+        self.bp.set_motors_position(self._values(position), force)
+
+    def float(self):
+        """Let every member turn freely"""
+        self.bp.set_motor_power(self.ports, BrickPi3.MOTOR_FLOAT)
+
+    def set_limits(self, power = 0, dps = 0, force = False):
+        """
+        Set the speed limits of every member. See BrickPi3.set_motor_limits.
+
+        Keyword arguments:
+        power = 0 -- the power limit in percent (0 to 100), with 0 being no limit
+        dps = 0 -- the speed limit in degrees per second, with 0 being no limit
+        force = False -- send the values even if they are the values last sent to the ports
+        """
+        self.bp.set_motor_limits(self.ports, power, dps, force)
+
+    def set_position_kp(self, kp = 25, force = False):
+        """Set the target position KP constant of every member. See BrickPi3.set_motor_position_kp."""
+        self.bp.set_motor_position_kp(self.ports, kp, force)
+
+    def set_position_kd(self, kd = 70, force = False):
+        """Set the target position KD constant of every member. See BrickPi3.set_motor_position_kd."""
+        self.bp.set_motor_position_kd(self.ports, kd, force)
+
+    def reset_encoders(self):
+        """Reset the encoders of every member to 0"""
+        self.bp.reset_motor_encoder(self.ports)
+
+    def wait_for_position(self, tolerance = 2, timeout = None):
+        """
+        Wait for every member to reach the target set with set_position. See BrickPi3.wait_for_position.
+
+        Returns a dict with the last MotorStatus read for each member name. The power, encoder and dps of inverted members are negated.
+        """
+        return self._statuses(self.bp.wait_for_position(self.ports, tolerance, timeout))
+
+    def get_status(self):
+        """
+        Read the status of every member in one bus transfer
+
+        Returns a dict with a MotorStatus for each member name. The power, encoder and dps of inverted members are negated.
+        """
+        return self._statuses(self.bp.get_motor_statuses(self.ports))
+
+    def _statuses(self, statuses):
+        """
+        Convert a tuple of MotorStatus by port into a dict by member name, with the inverted members negated
+
+        A power of MOTOR_FLOAT (-128) means the motor is floating, so it isn't negated.
+        """
+        result = {}
+        for name, port in self.members.items():
+            status = statuses[port.bit_length() - 1]
+            if name in self.inverted:
+                power = status.power if status.power == BrickPi3.MOTOR_FLOAT else -status.power
+                status = MotorStatus(status.flags, power, -status.encoder, -status.dps)
+            result[name] = status
+        return result
+
+    def get_encoders(self):
+        """Read the encoder of every member in one bus transfer. Returns a dict with the encoder of each member name."""
+        return dict((name, status.encoder) for name, status in self.get_status().items())
@@ -0,0 +1,139 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Reading several modes of the sensors, by switching their sensor types.
+#
+# A sensor takes some time to change mode after set_sensor_type. Rather than sleeping a
+# fixed time after each switch, ModeScheduler switches every port at once, and then polls
+# all of the ports that are still settling in one bus transfer until each reports valid
+# data for its new mode. Each port is switched to its next mode as soon as it is read, so
+# while one port settles the others are being read:
+#
+#     scheduler = brickpi3.ModeScheduler(BP, {
+#         BP.PORT_1: [BP.SENSOR_TYPE.EV3_COLOR_REFLECTED, BP.SENSOR_TYPE.EV3_COLOR_AMBIENT],
+#         BP.PORT_2: [BP.SENSOR_TYPE.EV3_GYRO_ABS, BP.SENSOR_TYPE.EV3_GYRO_DPS],
+#     })
+#     readings = scheduler.read()
+#     readings[BP.PORT_1][BP.SENSOR_TYPE.EV3_COLOR_AMBIENT]
+
+from .core import SensorError, SensorNotConfiguredError
+
+
+class ModeScheduler(object):
+    """Reads a list of sensor types (modes) on each of several sensor ports"""
+
+    def __init__(self, bp, modes, poll_interval = 0.001, timeout = 1.0, connect_timeout = 5.0):
+        """
+        Keyword arguments:
+        bp -- the BrickPi3
+        modes -- a dict with the list of sensor types to read for each sensor port, such as {BP.PORT_1: [type, type]}
+        poll_interval = 0.001 -- the time in seconds between checks of the ports that are changing mode
+        timeout = 1.0 -- the longest time in seconds to wait for a port to change mode, or for a port with one mode to recover from an error
+        connect_timeout = 5.0 -- the longest time in seconds to wait for the first valid read of a port, which includes the time to detect the sensor
+        """
+        self.bp = bp
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.cycles = 0 # the number of completed calls to read
+        self._ports = []
+        for port in sorted(modes):
+            if port not in (bp.PORT_1, bp.PORT_2, bp.PORT_3, bp.PORT_4):
+                raise IOError("ModeScheduler error: %r is not one sensor port. PORT_1, PORT_2, PORT_3, or PORT_4." % (port,))
+            types = list(modes[port])
+            if len(types) == 0:
+                raise IOError("ModeScheduler error: no sensor types for sensor port %d." % port.bit_length())
+            self._ports.append((port, types))
+        self._position = {} # the index of the mode each port is set to, or reading
+        self._waiting = {} # the clock time each port was switched, or first read with an error since its last valid read
+        self._connected = set() # the ports that have had a valid read
+
+    def _switch(self, ports):
+        """Set each of the ports to the sensor type at its position, in one bus transfer"""
+        bp = self.bp
+        now = bp.transport.clock.monotonic()
+        with bp.batch():
+            for port, types in ports:
+                bp.set_sensor_type(port, types[self._position[port]])
+                self._waiting[port] = now
+
+    def read(self):
+        """
+        Read every mode of every port once
+
+        Each port continues from the mode it was left in, so the next read's first mode may already be set.
+
+        Returns a dict with a dict of values by sensor type for each sensor port.
+        """
+        bp = self.bp
+        clock = bp.transport.clock
+        if not self._position:
+            for port, types in self._ports:
+                self._position[port] = 0
+            self._switch(self._ports)
+
+        readings = {}
+        remaining = {}
+        for port, types in self._ports:
+            readings[port] = {}
+            remaining[port] = len(types)
+        pending = list(self._ports)
+        while pending:
+            mask = 0
+            for port, types in pending:
+                mask |= port
+            values, errors = bp.get_sensors(mask)
+            switches = []
+            resend = []
+            waiting = []
+            now = clock.monotonic()
+            for port, types in pending:
+                p = port.bit_length() - 1
+                error = errors[p]
+                if error is None:
+                    self._connected.add(port)
+                    self._waiting.pop(port, None)
+                    position = self._position[port]
+                    readings[port][types[position]] = values[p]
+                    remaining[port] -= 1
+                    if len(types) > 1:
+                        self._position[port] = (position + 1) % len(types)
+                        switches.append((port, types))
+                    if remaining[port] > 0:
+                        waiting.append((port, types))
+                elif not isinstance(error, SensorError): # no SPI response
+                    raise error
+                else:
+                    if isinstance(error, SensorNotConfiguredError):
+                        # The board was reset, and has forgotten the sensor type. Set it again, and wait
+                        # for the sensor to be detected again.
+                        self._connected.discard(port)
+                        resend.append((port, types))
+                        waiting.append((port, types))
+                        continue
+                    # The timeout runs from the switch, or from the first error since the port's last valid read
+                    started = self._waiting.setdefault(port, now)
+                    timeout = self.timeout if port in self._connected else self.connect_timeout
+                    if now - started > timeout:
+                        # Set the sensor type again, in case the switch was lost, so that a later read may
+                        # recover. This also starts a new timeout.
+                        self._switch([(port, types)])
+                        raise SensorError("ModeScheduler error: sensor port %d didn't report sensor type %d within %.3f seconds." %
+                                          (p + 1, types[self._position[port]], timeout))
+                    waiting.append((port, types)) # still changing mode
+            if switches or resend:
+                self._switch(switches + resend)
+            pending = waiting
+            if pending:
+                clock.sleep(self.poll_interval)
+        self.cycles += 1
+        return readings
+
+    def __iter__(self):
+        """Read every mode of every port, over and over"""
+        while True:
+            yield self.read()
@@ -0,0 +1,147 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Background polling of a BrickPi3 into an immutable snapshot.
+#
+# The poller reads every configured sensor port, the status of all four motors and
+# the battery voltage in one batched bus transfer, at a fixed rate. Threads can then
+# read the latest values without an SPI transfer of their own:
+#
+#     BP.start_poller(hz = 100)
+#     value = BP.get_sensor(BP.PORT_1, max_age = 0.02)
+
+import collections # for namedtuple
+import threading   # for the polling thread
+
+Snapshot = collections.namedtuple("Snapshot", [
+    "timestamp",       # the transport clock time (in seconds) when the values were read
+    "sensor_types",    # the sensor type each port was configured for when it was read
+    "sensors",         # the value of each sensor port, as returned by get_sensor, or None
+    "sensor_errors",   # the exception reading each sensor port raised, or None
+    "motor_status",    # the status of each motor port, as returned by get_motor_status
+    "voltage_battery", # the battery voltage
+])
+Snapshot.__doc__ = """
+An immutable record of the state of a BrickPi3 at one point in time
+
+The tuples are indexed by port: 0 for PORT_1/PORT_A to 3 for PORT_4/PORT_D.
+"""
+
+
+def _read_snapshots(boards, batch):
+    """
+    Read the state of several BrickPi3s in one batch, and publish it as their snapshots
+
+    Keyword arguments:
+    boards -- the BrickPi3 objects to read. They must share a transport.
+    batch -- an unsent BrickPi3Batch that covers all of the boards
+
+    Returns a list with the new Snapshot of each board.
+    """
+    queued = []
+    with batch:
+        for bp in boards:
+            sensor_types = tuple(bp.SensorType)
+            sensors = [None, None, None, None]
+            sensor_errors = [None, None, None, None]
+            for p in range(4):
+                if sensor_types[p] not in (0, bp.SENSOR_TYPE.NONE):
+                    try:
+                        sensors[p] = bp.get_sensor(1 << p)
+                    except IOError as error: # sensor type not supported by get_sensor
+                        sensor_errors[p] = error
+            motor_status = [bp.get_motor_status(1 << p) for p in range(4)]
+            voltage_battery = bp.get_voltage_battery()
+            queued.append((sensor_types, sensors, sensor_errors, motor_status, voltage_battery))
+
+    timestamp = boards[0].transport.clock.monotonic()
+    snapshots = []
+    for bp, (sensor_types, sensors, sensor_errors, motor_status, voltage_battery) in zip(boards, queued):
+        for p in range(4):
+            if sensors[p] is not None:
+                try:
+                    sensors[p] = sensors[p].value
+                except Exception as error:
+                    sensors[p] = None
+                    sensor_errors[p] = error
+        snapshot = Snapshot(timestamp, sensor_types, tuple(sensors), tuple(sensor_errors),
+                            tuple(status.value for status in motor_status), voltage_battery.value)
+        bp.snapshot = snapshot
+        if bp.snapshot_writer is not None:
+            bp.snapshot_writer.write(snapshot)
+        if bp.history is not None:
+            bp.history.record(snapshot)
+        snapshots.append(snapshot)
+    return snapshots
+
+
+class Poller(object):
+    """
+    Periodically reads the state of a BrickPi3 into BrickPi3.snapshot
+
+    Use BrickPi3.start_poller() and BrickPi3.stop_poller() (or the same methods of a BrickPi3Stack)
+    rather than creating a Poller directly.
+    """
+
+    def __init__(self, bp, hz = 100):
+        """
+        Keyword arguments:
+        bp -- the BrickPi3, or BrickPi3Stack, to poll
+        hz = 100 -- the number of times to poll per second
+        """
+        if hz <= 0:
+            raise ValueError("Poller error: hz must be greater than 0")
+        self.bp = bp
+        self.period = 1.0 / hz
+        self.cycles = 0       # the number of completed polls
+        self.overruns = 0     # the number of polls that started late because the previous one took too long
+        self.error = None     # the last exception that prevented a poll, if any
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        """
+        Poll once, and publish the result as the snapshot
+
+        Returns the new Snapshot, or the list of Snapshots for a BrickPi3Stack.
+        """
+        snapshot = self.bp.poll()
+        self.cycles += 1
+        return snapshot
+
+    def _run(self):
+        clock = self.bp.transport.clock
+        next_poll = clock.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as error: # keep polling through transient bus errors
+                self.error = error
+            next_poll += self.period
+            delay = next_poll - clock.monotonic()
+            if delay > 0:
+                clock.wait(self._stop, delay) # stop() ends the wait
+            else:
+                # Attempting to poll faster than possible. Don't get behind.
+                self.overruns += 1
+                next_poll = clock.monotonic()
+
+    def start(self):
+        """Start polling in a background thread"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target = self._run, name = "BrickPi3 poller", daemon = True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop polling, and wait for the background thread to finish"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
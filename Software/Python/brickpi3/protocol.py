@@ -0,0 +1,305 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# The BrickPi3 SPI protocol, as a table.
+#
+# Every message starts with the SPI address and the message type, followed by the request
+# fields. Messages that read a value are padded so that the BrickPi3 can clock out its
+# reply: byte 3 of the reply is 0xA5 if the BrickPi3 responded, and the reply fields start
+# at byte 4. All multi-byte fields are big endian.
+#
+# MESSAGES is compiled once, at import, into struct based encoders and decoders (see
+# MessageSpec). The driver, the firmware emulator and TracingTransport all use them, so the
+# layout of each message is written down in one place.
+
+import struct # for the compiled encoders and decoders
+
+REQUEST_OFFSET = 2 # the request fields follow the address and the message type
+REPLY_OFFSET = 4   # the reply fields follow three ignored bytes and the reply marker
+REPLY_MARKER = 0xA5
+
+
+class Field(object):
+    """
+    One field of a message
+
+    format is a struct format character, or "<n>s" for n bytes. A value read from the bus is
+    divided by divisor. "text" fields are NUL terminated strings, and "hex" fields are
+    converted to upper case hex strings.
+    """
+
+    def __init__(self, name, format, divisor = None, kind = None):
+        self.name = name
+        self.format = format
+        self.divisor = divisor
+        self.kind = kind
+        self.size = struct.calcsize(">" + format)
+
+
+def _port_messages(name, ports, request = (), reply = (), **options):
+    """Return the table rows for a message with one message type per port, such as GET_SENSOR_1 to GET_SENSOR_4"""
+    return [(name % port, request, reply, options) for port in ports]
+
+
+# name, request fields, reply fields, options. Messages with variable_request or variable_reply
+# have more bytes after the fields, laid out according to the sensor type or I2C transaction.
+MESSAGES = [
+    ("GET_MANUFACTURER", (), (Field("manufacturer", "20s", kind = "text"),), {}),
+    ("GET_NAME", (), (Field("name", "20s", kind = "text"),), {}),
+    ("GET_HARDWARE_VERSION", (), (Field("version", "I"),), {}),
+    ("GET_FIRMWARE_VERSION", (), (Field("version", "I"),), {}),
+    ("GET_ID", (), (Field("id", "16s", kind = "hex"),), {}),
+    ("SET_LED", (Field("value", "b"),), (), {}),
+    ("GET_VOLTAGE_3V3", (), (Field("voltage", "H", divisor = 1000.0),), {}),
+    ("GET_VOLTAGE_5V", (), (Field("voltage", "H", divisor = 1000.0),), {}),
+    ("GET_VOLTAGE_9V", (), (Field("voltage", "H", divisor = 1000.0),), {}),
+    ("GET_VOLTAGE_VCC", (), (Field("voltage", "H", divisor = 1000.0),), {}),
+    ("SET_ADDRESS", (Field("address", "B"), Field("id", "16s", kind = "hex")), (), {}),
+    ("SET_SENSOR_TYPE", (Field("port", "B"), Field("type", "B")), (), {"variable_request": True}),
+] + _port_messages("GET_SENSOR_%s", "1234", (), (Field("type", "B"), Field("state", "B")), variable_reply = True) \
+  + _port_messages("I2C_TRANSACT_%s", "1234", (Field("address", "B"), Field("in_bytes", "B"), Field("out_bytes", "B")), (), variable_request = True) + [
+    ("SET_MOTOR_POWER", (Field("port", "B"), Field("power", "b")), (), {}),
+    ("SET_MOTOR_POSITION", (Field("port", "B"), Field("position", "i")), (), {}),
+    ("SET_MOTOR_POSITION_KP", (Field("port", "B"), Field("kp", "B")), (), {}),
+    ("SET_MOTOR_POSITION_KD", (Field("port", "B"), Field("kd", "B")), (), {}),
+    ("SET_MOTOR_DPS", (Field("port", "B"), Field("dps", "h")), (), {}),
+    ("SET_MOTOR_DPS_KP", (Field("port", "B"), Field("kp", "B")), (), {}),
+    ("SET_MOTOR_DPS_KD", (Field("port", "B"), Field("kd", "B")), (), {}),
+    ("SET_MOTOR_LIMITS", (Field("port", "B"), Field("power", "B"), Field("dps", "H")), (), {}),
+    ("OFFSET_MOTOR_ENCODER", (Field("port", "B"), Field("offset", "i")), (), {}),
+] + _port_messages("GET_MOTOR_%s_ENCODER", "ABCD", (), (Field("encoder", "i"),)) \
+  + _port_messages("GET_MOTOR_%s_STATUS", "ABCD", (), (Field("flags", "B"), Field("power", "b"), Field("encoder", "i"), Field("dps", "h")))
+
+
+def _unsigned(format):
+    """Return the unsigned struct format with the same size"""
+    return format.upper() if format in ("b", "h", "i", "q") else format
+
+
+def _from_bus(field):
+    """Return a function converting a raw field value into the value the driver returns, or None if it is used as is"""
+    if field.kind == "text":
+        return lambda raw: raw.split(b"\0", 1)[0].decode("latin-1")
+    if field.kind == "hex":
+        return lambda raw: "".join("%02X" % b for b in bytearray(raw))
+    if field.divisor is not None:
+        divisor = field.divisor
+        return lambda raw: raw / divisor
+    return None
+
+
+def _to_bus(field, value):
+    """Convert a value, in the form the driver returns it, into the raw field value"""
+    if field.kind == "text":
+        return value.encode("latin-1")
+    if field.kind == "hex":
+        if isinstance(value, str):
+            return bytes(bytearray.fromhex(value))
+        return bytes(bytearray(value))
+    if field.divisor is not None:
+        return int(round(value * field.divisor))
+    return value
+
+
+class Layout(object):
+    """
+    A sequence of fields, compiled into a struct.Struct
+
+    Values that don't fit their field (or aren't ints) are converted with int() and masked to
+    the size of the field, as the driver has always done.
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.struct = struct.Struct(">" + "".join(f.format for f in self.fields))
+        self.size = self.struct.size
+        self._wrapped = struct.Struct(">" + "".join(_unsigned(f.format) for f in self.fields))
+        self._masks = tuple((None if f.format.endswith("s") else ((1 << (8 * f.size)) - 1)) for f in self.fields)
+        self._converters = tuple(_from_bus(f) for f in self.fields)
+
+    def _wrap(self, values):
+        return [(value if mask is None else (int(value) & mask)) for value, mask in zip(values, self._masks)]
+
+    def pack_into(self, buffer, offset, *values):
+        """Write raw field values into buffer at offset"""
+        try:
+            self.struct.pack_into(buffer, offset, *values)
+        except struct.error: # out of range, or not an int
+            self._wrapped.pack_into(buffer, offset, *self._wrap(values))
+
+    def pack(self, *values):
+        """
+        Encode values, in the form the driver returns them
+
+        Returns a list of bytes.
+        """
+        raw = [_to_bus(f, v) for f, v in zip(self.fields, values)]
+        return list(self._wrapped.pack(*self._wrap(raw)))
+
+    def unpack_from(self, buffer, offset = 0):
+        """Return a list of the raw field values in buffer at offset"""
+        return list(self.struct.unpack_from(bytearray(buffer[offset:(offset + self.size)])))
+
+    def describe(self, buffer, offset = 0):
+        """Return "name=value" strings for the fields in buffer at offset"""
+        return ["%s=%s" % (f.name, (convert(value) if convert else value))
+                for f, value, convert in zip(self.fields, self.unpack_from(buffer, offset), self._converters)]
+
+
+# The parameters that follow the port and type in SET_SENSOR_TYPE
+CUSTOM_PARAMETERS = Layout((Field("config", "H"),))
+I2C_PARAMETERS = Layout((Field("settings", "B"), Field("speed", "B")))
+I2C_SAME_PARAMETERS = Layout((Field("delay", "I"), Field("address", "B"), Field("in_bytes", "B"), Field("out_bytes", "B"))) # then the bytes to write
+
+
+class MessageSpec(object):
+    """
+    The compiled layout of one message type
+
+    length -- the length of the message in bytes, not counting any variable part
+    request -- the Layout of the request fields, at REQUEST_OFFSET
+    reply -- the Layout of the reply fields, at REPLY_OFFSET
+    pack_into(buffer, *values) -- write the request fields into a preallocated message
+    decode(reply) -- check the reply marker, and return the reply field, or a list of the reply fields
+    """
+
+    def __init__(self, name, message_type, request_fields, reply_fields, variable_request = False, variable_reply = False):
+        self.name = name
+        self.message_type = message_type
+        self.request = Layout(request_fields)
+        self.reply = Layout(reply_fields)
+        self.variable_request = variable_request
+        self.variable_reply = variable_reply
+        self.length = REQUEST_OFFSET + self.request.size
+        if reply_fields:
+            self.length = max(self.length, REPLY_OFFSET + self.reply.size)
+        self.pack_into = self._compile_encoder()
+        self.decode = self._compile_decoder()
+
+    def _compile_encoder(self):
+        # generated with the fields as named arguments, so that a call doesn't pack and unpack an argument tuple
+        names = ", ".join(f.name for f in self.request.fields)
+        source = ("def pack_into(buffer, %s):\n"
+                  "    try:\n"
+                  "        struct_pack_into(buffer, %d, %s)\n"
+                  "    except struct_error:\n"
+                  "        layout_pack_into(buffer, %d, %s)\n") % (names, REQUEST_OFFSET, names, REQUEST_OFFSET, names)
+        namespace = {"struct_pack_into": self.request.struct.pack_into, "layout_pack_into": self.request.pack_into, "struct_error": struct.error}
+        exec(source, namespace)
+        return namespace["pack_into"]
+
+    def _compile_decoder(self):
+        unpack_from = self.reply.struct.unpack_from
+        converters = self.reply._converters
+        if len(converters) == 0:
+            return None
+
+        if len(converters) == 1 and converters[0] is None:
+            def decode(reply):
+                if reply[3] != REPLY_MARKER:
+                    raise IOError("No SPI response")
+                return unpack_from(reply, REPLY_OFFSET)[0]
+        elif len(converters) == 1:
+            convert = converters[0]
+            def decode(reply):
+                if reply[3] != REPLY_MARKER:
+                    raise IOError("No SPI response")
+                return convert(unpack_from(reply, REPLY_OFFSET)[0])
+        elif any(converters):
+            def decode(reply):
+                if reply[3] != REPLY_MARKER:
+                    raise IOError("No SPI response")
+                return [(value if convert is None else convert(value)) for value, convert in zip(unpack_from(reply, REPLY_OFFSET), converters)]
+        else:
+            def decode(reply):
+                if reply[3] != REPLY_MARKER:
+                    raise IOError("No SPI response")
+                return list(unpack_from(reply, REPLY_OFFSET))
+        return decode
+
+    def encode(self, address, *values):
+        """
+        Build a message
+
+        Keyword arguments:
+        address -- the SPI address
+        values -- the request fields, in the form the driver uses them
+
+        Returns a list of bytes, padded for the reply.
+        """
+        return [address, self.message_type] + self.request.pack(*values) + [0] * (self.length - REQUEST_OFFSET - self.request.size)
+
+    def unpack_request(self, data_out):
+        """Return a list of the raw request fields of a message. Any variable part follows at REQUEST_OFFSET + request.size."""
+        return self.request.unpack_from(data_out, REQUEST_OFFSET)
+
+    def reply_data(self, *values):
+        """
+        Encode a reply, as the BrickPi3 does
+
+        Keyword arguments:
+        values -- the reply fields, in the form the driver returns them
+
+        Returns a list of the bytes that follow the reply marker.
+        """
+        return self.reply.pack(*values)
+
+    def describe(self, data_out, data_in = None):
+        """
+        Describe a message, and optionally the reply
+
+        Returns a string such as "SET_MOTOR_POWER(port=1, power=50)" or "GET_MOTOR_A_ENCODER() -> encoder=90".
+        """
+        arguments = []
+        end = REQUEST_OFFSET + self.request.size
+        if len(data_out) >= end:
+            arguments = self.request.describe(data_out, REQUEST_OFFSET)
+            if self.variable_request and len(data_out) > end:
+                arguments.append("data=%s" % list(data_out[end:]))
+        text = "%s(%s)" % (self.name, ", ".join(arguments))
+        if data_in is not None and self.reply.size > 0:
+            end = REPLY_OFFSET + self.reply.size
+            if len(data_in) < end or data_in[3] != REPLY_MARKER:
+                return text + " -> no response"
+            values = self.reply.describe(data_in, REPLY_OFFSET)
+            if self.variable_reply:
+                values.append("data=%s" % list(data_in[end:]))
+            text += " -> " + ", ".join(values)
+        return text
+
+
+class Protocol(object):
+    """
+    The compiled message table
+
+    Each MessageSpec is available by name (protocol.GET_MOTOR_A_STATUS), or by message type
+    with spec().
+    """
+
+    def __init__(self, message_types):
+        """
+        Keyword arguments:
+        message_types -- the message type numbers by name (BrickPi3.BPSPI_MESSAGE_TYPE)
+        """
+        self._specs = {}
+        for name, request, reply, options in MESSAGES:
+            spec = MessageSpec(name, getattr(message_types, name), request, reply, **options)
+            setattr(self, name, spec)
+            self._specs[spec.message_type] = spec
+
+    def spec(self, message_type):
+        """Return the MessageSpec for a message type, or None if it is unknown"""
+        return self._specs.get(message_type)
+
+    def describe(self, data_out, data_in = None):
+        """Describe a message, and optionally the reply, including the SPI address. See MessageSpec.describe."""
+        if len(data_out) < REQUEST_OFFSET:
+            return "%s (too short)" % list(data_out)
+        spec = self.spec(data_out[1])
+        if spec is None:
+            return "%d: unknown message %s" % (data_out[0], list(data_out))
+        return "%d: %s" % (data_out[0], spec.describe(data_out, data_in))
@@ -0,0 +1,237 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Shared memory snapshots of a BrickPi3.
+#
+# The process that owns the BrickPi3 publishes each Snapshot read by its poller into a
+# fixed layout memory mapped file. Any local process can then read the latest values
+# without a system call or a message to the owner:
+#
+#     owner:   BP.publish_snapshots()
+#              BP.start_poller(hz = 100)
+#     reader:  snapshot = brickpi3.SnapshotReader().read()
+#
+# The region is protected by a sequence lock. The writer makes the sequence number odd
+# while it is updating the values, and even again when it is done. A reader copies the
+# values, and retries if the sequence number was odd or changed. A CRC of the values is
+# also checked, because Python can't order the memory accesses on weakly ordered CPUs
+# such as the ARM in a Raspberry Pi.
+#
+# Layout (little endian):
+#     0   magic "BP3S", layout version (2 bytes), reserved (2 bytes)
+#     8   sequence number (8 bytes)
+#     16  CRC-32 of the values (4 bytes), reserved (4 bytes)
+#     24  the values (see _VALUES)
+
+import mmap    # for the shared memory
+import numbers # for checking the sensor values
+import os      # for creating the file
+import struct  # for the layout
+import zlib    # for the CRC
+
+from .poller import Snapshot
+from .core import SensorError
+
+_MAGIC = b"BP3S"
+_LAYOUT_VERSION = 2
+_VALUE_SLOTS = 32 # the most numbers a sensor value can hold
+
+# Per port: kind, rows, columns, count, the numbers, and the error description. The numbers are
+# doubles, which hold every sensor value exactly, including the floats of EV3_ULTRASONIC_CM and filters.
+_PORT = "4B%dd64s" % _VALUE_SLOTS
+_HEADER = struct.Struct("<4sHH")
+_SEQUENCE = struct.Struct("<Q")
+_CRC = struct.Struct("<I")
+_VALUES = struct.Struct("<dd4B" + ("Bbih" * 4) + (_PORT * 4)) # timestamp, battery voltage, sensor types, motor status, sensors
+_SEQUENCE_OFFSET = 8
+_CRC_OFFSET = 16
+_VALUES_OFFSET = 24
+SIZE = _VALUES_OFFSET + _VALUES.size
+
+# The kinds of sensor value
+_NOT_READ = 0
+_NUMBER = 1
+_LIST = 2
+_TABLE = 3 # a list of lists, such as EV3_INFRARED_SEEK
+_SENSOR_ERROR = 4
+_IO_ERROR = 5
+_FLOATS = 0x80 # added to the kind if any of the numbers is a float, otherwise they are read back as ints
+
+
+def default_path(address = 1):
+    """Return the default shared memory file for the BrickPi3 at an SPI address"""
+    return "/dev/shm/brickpi3-%d" % address
+
+
+def _encode_sensor(value, error):
+    """
+    Return the kind, rows, columns, count, numbers and error description of a sensor value
+
+    A value that can't be shared, such as one returned by a sensor filter that isn't a number, a list of
+    numbers or a list of equal length lists of numbers, is shared as an IOError that describes it.
+    Tuples are shared as lists.
+    """
+    slots = [0] * _VALUE_SLOTS
+    if error is not None:
+        kind = _SENSOR_ERROR if isinstance(error, SensorError) else _IO_ERROR
+        return [kind, 0, 0, 0] + slots + [str(error).encode("utf-8")[:64]]
+    if value is None:
+        return [_NOT_READ, 0, 0, 0] + slots + [b""]
+    if isinstance(value, (list, tuple)):
+        if len(value) > 0 and isinstance(value[0], (list, tuple)):
+            kind, rows, columns = _TABLE, len(value), len(value[0])
+            flat = []
+            for row in value:
+                if not isinstance(row, (list, tuple)) or len(row) != columns:
+                    return [_IO_ERROR, 0, 0, 0] + slots + [b"can't share a table with rows of different lengths"]
+                flat.extend(row)
+        else:
+            kind, rows, columns = _LIST, 0, len(value)
+            flat = value
+    else:
+        kind, rows, columns, flat = _NUMBER, 0, 0, [value]
+    if len(flat) > _VALUE_SLOTS:
+        return [_IO_ERROR, 0, 0, 0] + slots + [b"value too large to share"]
+    for n in flat:
+        if not isinstance(n, numbers.Real):
+            return [_IO_ERROR, 0, 0, 0] + slots + [("can't share a value of type %s" % type(n).__name__).encode("utf-8")[:64]]
+        if not isinstance(n, numbers.Integral):
+            kind |= _FLOATS
+    slots[:len(flat)] = flat
+    return [kind, rows, columns, len(flat)] + slots + [b""]
+
+
+def _decode_sensor(fields):
+    """Convert the fields of one port back into (value, error)"""
+    kind, rows, columns, count = fields[0:4]
+    numbers = fields[4:(4 + count)]
+    if kind & _FLOATS:
+        kind &= ~_FLOATS
+    else:
+        numbers = [int(n) for n in numbers]
+    if kind == _NUMBER:
+        return numbers[0], None
+    if kind == _LIST:
+        return list(numbers), None
+    if kind == _TABLE:
+        return [list(numbers[(r * columns):((r + 1) * columns)]) for r in range(rows)], None
+    if kind == _SENSOR_ERROR:
+        return None, SensorError(fields[4 + _VALUE_SLOTS].rstrip(b"\0").decode("utf-8"))
+    if kind == _IO_ERROR:
+        return None, IOError(fields[4 + _VALUE_SLOTS].rstrip(b"\0").decode("utf-8"))
+    return None, None
+
+
+class SnapshotWriter(object):
+    """Publishes Snapshots to a shared memory file. Use BrickPi3.publish_snapshots() to create one."""
+
+    def __init__(self, path):
+        """
+        Create the shared memory file
+
+        Keyword arguments:
+        path -- the path of the file, normally in /dev/shm
+        """
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, SIZE)
+            self._map = mmap.mmap(fd, SIZE)
+        finally:
+            os.close(fd)
+        _HEADER.pack_into(self._map, 0, _MAGIC, _LAYOUT_VERSION, 0)
+        self._sequence = _SEQUENCE.unpack_from(self._map, _SEQUENCE_OFFSET)[0] & ~1
+
+    def write(self, snapshot):
+        """
+        Publish a snapshot
+
+        Keyword arguments:
+        snapshot -- the Snapshot to publish
+        """
+        fields = [snapshot.timestamp, snapshot.voltage_battery]
+        fields.extend(snapshot.sensor_types)
+        for status in snapshot.motor_status:
+            fields.extend(status)
+        for p in range(4):
+            fields.extend(_encode_sensor(snapshot.sensors[p], snapshot.sensor_errors[p]))
+        values = _VALUES.pack(*fields)
+
+        self._sequence += 1 # odd: being written
+        _SEQUENCE.pack_into(self._map, _SEQUENCE_OFFSET, self._sequence)
+        self._map[_VALUES_OFFSET:SIZE] = values
+        _CRC.pack_into(self._map, _CRC_OFFSET, zlib.crc32(values) & 0xFFFFFFFF)
+        self._sequence += 1 # even: complete
+        _SEQUENCE.pack_into(self._map, _SEQUENCE_OFFSET, self._sequence)
+
+    def close(self):
+        """Stop publishing. The file is left in place for readers."""
+        self._map.close()
+
+
+class SnapshotReader(object):
+    """Reads the Snapshots published by a SnapshotWriter in another process"""
+
+    def __init__(self, path = None, retries = 1000):
+        """
+        Open the shared memory file
+
+        Keyword arguments:
+        path = None -- the path of the file. Defaults to default_path() for SPI address 1.
+        retries = 1000 -- the number of times to retry a read that overlapped a write, before giving up
+        """
+        if path is None:
+            path = default_path()
+        self.path = path
+        self.retries = retries
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self._map = mmap.mmap(fd, SIZE, prot = mmap.PROT_READ)
+        finally:
+            os.close(fd)
+        magic, version, reserved = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _LAYOUT_VERSION:
+            self._map.close()
+            raise IOError("SnapshotReader error: %s is not a BrickPi3 snapshot" % path)
+
+    def read(self):
+        """
+        Read the latest snapshot
+
+        The timestamp is from the writer's clock. With the default transport that is
+        time.monotonic(), which is the same for every process on the Raspberry Pi.
+
+        Returns a Snapshot, or None if nothing has been published yet.
+        """
+        for attempt in range(self.retries):
+            before = _SEQUENCE.unpack_from(self._map, _SEQUENCE_OFFSET)[0]
+            if before == 0:
+                return None
+            if before & 1:
+                continue
+            crc = _CRC.unpack_from(self._map, _CRC_OFFSET)[0]
+            values = self._map[_VALUES_OFFSET:SIZE]
+            if _SEQUENCE.unpack_from(self._map, _SEQUENCE_OFFSET)[0] == before and (zlib.crc32(values) & 0xFFFFFFFF) == crc:
+                return self._decode(_VALUES.unpack(values))
+        raise IOError("SnapshotReader error: could not read a consistent snapshot")
+
+    def _decode(self, fields):
+        timestamp, voltage_battery = fields[0:2]
+        sensor_types = tuple(fields[2:6])
+        motor_status = tuple(list(fields[(6 + 4 * m):(10 + 4 * m)]) for m in range(4))
+        sensors = []
+        sensor_errors = []
+        port_size = 5 + _VALUE_SLOTS
+        for p in range(4):
+            start = 22 + p * port_size
+            value, error = _decode_sensor(fields[start:(start + port_size)])
+            sensors.append(value)
+            sensor_errors.append(error)
+        return Snapshot(timestamp, sensor_types, tuple(sensors), tuple(sensor_errors), motor_status, voltage_battery)
+
+    def close(self):
+        self._map.close()
@@ -0,0 +1,138 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Several BrickPi3s stacked on one Raspberry Pi.
+#
+# The boards share the SPI bus, and are told apart by their SPI addresses. BrickPi3Stack
+# assigns the addresses from the boards' serial numbers, and sends the messages for all of
+# the boards together, so reading the whole stack costs one bus transfer:
+#
+#     stack = brickpi3.BrickPi3Stack(["3B21D237504D5741372E3120FF0E2910", "192A0F96514D4D5438202020FF080C23"])
+#     stack[1].set_sensor_type(stack[1].PORT_1, stack[1].SENSOR_TYPE.TOUCH)
+#     snapshots = stack.poll()
+
+from .core import BrickPi3, BrickPi3Batch, set_address, _init_spi, _WRITE_MOTOR_CONTROL
+from .poller import Poller, _read_snapshots
+
+
+class BrickPi3Stack(object):
+    """
+    A stack of BrickPi3s sharing one SPI bus
+
+    The boards are available by index (stack[0] is the board at SPI address 1) and each is a
+    BrickPi3 object with its own sensor configuration.
+    """
+
+    def __init__(self, ids = None, transport = None, max_boards = 8):
+        """
+        Find the BrickPi3s, and assign their SPI addresses
+
+        Keyword arguments:
+        ids = None -- the serial numbers (see get_id) of the boards, in the order to address them. The board
+                      with ids[0] is given address 1, ids[1] address 2 and so on. If None, the boards are found
+                      by scanning addresses 1 to max_boards, which requires that they already have different addresses.
+        transport = None -- the SPI transport. Defaults to the SPI bus of the Raspberry Pi.
+        max_boards = 8 -- the number of addresses to scan when ids is None
+        """
+        if transport is None:
+            transport = _init_spi()
+        self.transport = transport
+
+        if ids is None:
+            ids = []
+            scan = [BrickPi3(address, detect = False, transport = transport) for address in range(1, max_boards + 1)]
+            with BrickPi3Batch(scan[0], scan):
+                results = [bp.get_id() for bp in scan]
+            for result in results:
+                try:
+                    ids.append(result.value)
+                except IOError: # no board at this address
+                    break
+            if len(ids) == 0:
+                raise IOError("BrickPi3Stack error: no BrickPi3 found")
+        else:
+            for address, id in enumerate(ids, 1):
+                set_address(address, id, transport)
+
+        self.ids = list(ids)
+        self.boards = [BrickPi3(address, transport = transport) for address in range(1, len(self.ids) + 1)]
+        with self.batch():
+            found = [bp.get_id() for bp in self.boards]
+        for bp, id, result in zip(self.boards, self.ids, found):
+            if result.value != id.upper():
+                raise IOError("BrickPi3Stack error: BrickPi3 %s did not take SPI address %d" % (id, bp.SPI_Address))
+        self.poller = None
+
+    def __len__(self):
+        return len(self.boards)
+
+    def __getitem__(self, index):
+        return self.boards[index]
+
+    def __iter__(self):
+        return iter(self.boards)
+
+    def batch(self):
+        """
+        Start a batch of messages for every board in the stack
+
+        The messages of all of the boards are sent together in one bus transfer. See BrickPi3Batch.
+        """
+        return BrickPi3Batch(self.boards[0], self.boards)
+
+    def poll(self):
+        """
+        Read every configured sensor, the motor statuses and the battery voltage of every board in one bus transfer
+
+        The result for each board is also stored in its snapshot, for reads that use max_age.
+
+        Returns a list with the Snapshot of each board.
+        """
+        return _read_snapshots(self.boards, self.batch())
+
+    def start_poller(self, hz = 100):
+        """
+        Poll every board in a background thread. See BrickPi3.start_poller.
+
+        Keyword arguments:
+        hz = 100 -- the number of times to poll per second
+
+        Returns the Poller.
+        """
+        if self.poller is None:
+            self.poller = Poller(self, hz)
+            self.poller.start()
+        return self.poller
+
+    def stop_poller(self):
+        """Stop the background poller started with start_poller"""
+        if self.poller is not None:
+            self.poller.stop()
+            self.poller = None
+
+    def emergency_float(self):
+        """
+        Float the motors of every board immediately
+
+        One message is sent to SPI address 0, which every board obeys, even if a batch is active.
+        """
+        bp = self.boards[0]
+        try:
+            bp.spi_transfer_array([0, bp.BPSPI_MESSAGE_TYPE.SET_MOTOR_POWER,
+                                   bp.PORT_A + bp.PORT_B + bp.PORT_C + bp.PORT_D, bp.MOTOR_FLOAT & 0xFF])
+        finally:
+            # The broadcast bypasses the write caches, so the next motor writes to each board must be sent
+            for board in self.boards:
+                with board._board.lock:
+                    board._board.forget_writes(_WRITE_MOTOR_CONTROL)
+                    board._board.motor_control[:] = [None, None, None, None] # no position targets to wait for
+
+    def reset_all(self):
+        """Reset every board in one bus transfer. See BrickPi3.reset_all."""
+        with self.batch():
+            for bp in self.boards:
+                bp.reset_all()
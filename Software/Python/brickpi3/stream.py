@@ -0,0 +1,102 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# Timestamped, fixed rate streams of sensor and encoder values.
+#
+# Rather than looping on get_ calls with time.sleep (which drifts, and doesn't record when
+# each value was read), iterate over a stream:
+#
+#     for timestamp_ns, (gyro, encoder) in BP.stream(sensors = BP.PORT_1, encoders = BP.PORT_A, hz = 100):
+#         ...
+#
+# or with asyncio: async for sample in BP.stream(...), on an AsyncBrickPi3.
+
+import collections # for namedtuple
+
+from .core import BrickPi3, PROTOCOL, SpiMessage, _decode_motor_encoder
+
+Sample = collections.namedtuple("Sample", [
+    "timestamp_ns", # the transport clock time (in nanoseconds) when the values were read
+    "values",       # the value of each sensor port, then of each motor encoder, in port order
+])
+
+
+class Stream(object):
+    """
+    An iterator of Samples taken at a fixed rate. Use BrickPi3.stream() to create one.
+
+    samples -- the number of samples taken
+    missed -- the number of deadlines skipped because the consumer was too slow
+    """
+
+    def __init__(self, bp, sensors = 0, encoders = 0, hz = 100, count = None):
+        if hz <= 0:
+            raise ValueError("Stream error: hz must be greater than 0")
+        if not (sensors or encoders):
+            raise ValueError("Stream error: no sensor or motor ports selected")
+        self.bp = bp
+        self.sensors = sensors
+        self.period_ns = int(1000000000 / hz)
+        self.count = count
+        self.samples = 0
+        self.missed = 0
+        self.closed = False
+        self._encoders = []
+        for p in range(4):
+            if encoders & (1 << p):
+                spec = PROTOCOL.spec(BrickPi3.BPSPI_MESSAGE_TYPE.GET_MOTOR_A_ENCODER + p)
+                self._encoders.append(SpiMessage(spec.encode(bp.SPI_Address)))
+        self._sensor_ports = [p for p in range(4) if sensors & (1 << p)]
+        self._next_ns = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished():
+            raise StopIteration
+        self.bp.transport.clock.sleep(self._delay() / 1000000000.0)
+        return self._read()
+
+    def close(self):
+        """Stop the stream"""
+        self.closed = True
+
+    def _finished(self):
+        return self.closed or (self.count is not None and self.samples >= self.count)
+
+    def _delay(self):
+        """Schedule the next sample, and return the time to wait for it in nanoseconds"""
+        now = self.bp.transport.clock.monotonic_ns()
+        if self._next_ns is None:
+            self._next_ns = now
+        delay = self._next_ns - now
+        if delay <= -self.period_ns: # skip the deadlines that have already passed
+            skipped = -delay // self.period_ns
+            self.missed += skipped
+            self._next_ns += skipped * self.period_ns
+        self._next_ns += self.period_ns
+        return max(delay, 0)
+
+    def _read(self):
+        """Read every port in one bus transfer, and return the Sample"""
+        bp = self.bp
+        values = [None, None, None, None]
+        errors = [None, None, None, None]
+        reads = bp._sensor_messages(self.sensors, errors)
+        timestamp_ns = bp.transport.clock.monotonic_ns()
+        bp._transact_messages(reads + self._encoders)
+        bp._decode_sensor_messages(reads, values, errors)
+        sample = [values[p] for p in self._sensor_ports]
+        try:
+            for message in self._encoders:
+                sample.append(_decode_motor_encoder(message.rx))
+        except IOError:
+            bp._bus.spi_error(bp.transport)
+            raise
+        self.samples += 1
+        return Sample(timestamp_ns, tuple(sample))
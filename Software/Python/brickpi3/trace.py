@@ -0,0 +1,61 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# A protocol tracer for the BrickPi3.
+#
+# TracingTransport wraps another transport and describes every message and reply, decoded
+# with the same protocol table the driver uses:
+#
+#     BP = brickpi3.BrickPi3(transport = brickpi3.TracingTransport(brickpi3.SpidevTransport()))
+#     BP.get_motor_encoder(BP.PORT_A)
+#     # 1: GET_MOTOR_A_ENCODER() -> encoder=90
+
+from .core import PROTOCOL
+from .transport import Transport
+
+
+class TracingTransport(Transport):
+    """Transport that describes each message sent through another transport"""
+
+    def __init__(self, transport, log = print):
+        """
+        Keyword arguments:
+        transport -- the transport to send the messages with
+        log = print -- a function called with the description of each message and its reply
+        """
+        self.transport = transport
+        self.log = log
+
+    @property
+    def clock(self):
+        return self.transport.clock
+
+    @property
+    def speed_hz(self):
+        return self.transport.speed_hz
+
+    @speed_hz.setter
+    def speed_hz(self, speed_hz):
+        self.transport.speed_hz = speed_hz
+
+    def transfer(self, data_out):
+        data_in = self.transport.transfer(data_out)
+        self.log(PROTOCOL.describe(data_out, data_in))
+        return data_in
+
+    def transfer_message(self, message):
+        self.transport.transfer_message(message)
+        self.log(PROTOCOL.describe(message.tx, message.rx))
+
+    def transfer_many(self, messages):
+        replies = self.transport.transfer_many(messages)
+        for data_out, data_in in zip(messages, replies):
+            self.log(PROTOCOL.describe(data_out, data_in))
+        return replies
+
+    def close(self):
+        self.transport.close()
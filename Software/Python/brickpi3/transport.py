@@ -0,0 +1,351 @@
+# https://www.dexterindustries.com/BrickPi/
+# https://github.com/DexterInd/BrickPi3
+#
+# Copyright (c) 2026 Modular Robotics Inc
+# Released under the MIT license (http://choosealicense.com/licenses/mit/).
+# For more information see https://github.com/DexterInd/BrickPi3/blob/master/LICENSE.md
+#
+# SPI transports used by the BrickPi3 drivers.
+#
+# A transport moves raw BrickPi3 SPI messages (lists of bytes) to a board and
+# returns the bytes clocked back. SpidevTransport talks to the real hardware
+# through /dev/spidevX.Y. brickpi3.emulator provides a transport backed by an
+# in-process firmware emulator for testing and benchmarking off the robot.
+
+import ctypes     # for building spi_ioc_transfer structures
+import threading  # for the VirtualClock lock
+import time       # for the system clock
+
+
+class Clock(object):
+    """
+    The time source used by a transport
+
+    The drivers never call the time module directly for protocol timing, so that a
+    transport can substitute a VirtualClock and run faster than real time.
+    """
+
+    def monotonic(self):
+        """Return the current monotonic time in seconds"""
+        return time.monotonic()
+
+    def monotonic_ns(self):
+        """Return the current monotonic time in nanoseconds"""
+        return time.monotonic_ns()
+
+    def sleep(self, seconds):
+        """
+        Wait for a period of time
+
+        Keyword arguments:
+        seconds -- the time to wait in seconds
+        """
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def wait(self, event, seconds):
+        """
+        Wait for a period of time, or until a threading.Event is set
+
+        Keyword arguments:
+        event -- the event
+        seconds -- the longest time to wait in seconds
+
+        Returns True if the event is set.
+        """
+        if seconds > 0:
+            return event.wait(seconds)
+        return event.is_set()
+
+
+class VirtualClock(Clock):
+    """
+    A simulated clock that only advances when slept on
+
+    sleep() returns immediately after moving the clock forward, so code that waits for
+    sensors or motors completes as fast as the CPU allows.
+    """
+
+    def __init__(self, start = 0.0):
+        """
+        Keyword arguments:
+        start = 0.0 -- the initial clock value in seconds
+        """
+        self._now_ns = int(start * 1000000000)
+        self._lock = threading.Lock()
+
+    def monotonic(self):
+        return self._now_ns / 1000000000.0
+
+    def monotonic_ns(self):
+        return self._now_ns
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.advance(seconds)
+
+    def wait(self, event, seconds):
+        self.sleep(seconds)
+        return event.is_set()
+
+    def advance(self, seconds):
+        """
+        Move the clock forward
+
+        Keyword arguments:
+        seconds -- the time to advance in seconds
+        """
+        with self._lock:
+            self._now_ns += int(seconds * 1000000000)
+
+
+SYSTEM_CLOCK = Clock()
+
+
+class SpiMessage(object):
+    """
+    A preallocated SPI message
+
+    tx holds the bytes to send and rx receives the bytes read. Both are bytearrays of the same
+    fixed length, so the drivers can reuse a message for every call without allocating.
+    handle is reserved for the transport, for example to cache a prepared kernel transfer.
+    """
+    __slots__ = ("tx", "rx", "handle")
+
+    def __init__(self, data_out):
+        """
+        Keyword arguments:
+        data_out -- the initial bytes to send, which also sets the message length
+        """
+        self.tx = bytearray(data_out)
+        self.rx = bytearray(len(self.tx))
+        self.handle = None
+
+
+class Transport(object):
+    """
+    Base class for BrickPi3 SPI transports
+
+    Subclasses must implement transfer(). transfer_many() may be overridden when the
+    underlying bus can send several messages more efficiently than one at a time.
+    Transports whose clock speed can be changed make speed_hz a settable attribute.
+    """
+
+    clock = SYSTEM_CLOCK
+    speed_hz = None # the SPI clock speed in Hz, or None if it can't be changed
+
+    def transfer(self, data_out):
+        """
+        Conduct a single SPI transaction
+
+        Keyword arguments:
+        data_out -- a list of bytes to send. The length of the list will determine how many bytes are transferred.
+
+        Returns a list of the bytes read.
+        """
+        raise NotImplementedError("transfer must be implemented by the transport")
+
+    def transfer_message(self, message):
+        """
+        Conduct a single SPI transaction for a preallocated message
+
+        Keyword arguments:
+        message -- a SpiMessage. The bytes read are stored in message.rx.
+        """
+        message.rx[:] = bytearray(self.transfer(list(message.tx)))
+
+    def transfer_many(self, messages):
+        """
+        Conduct several SPI transactions, each framed by its own chip select cycle
+
+        Keyword arguments:
+        messages -- a list of messages, each a list of bytes to send
+
+        Returns a list with the bytes read for each message.
+        """
+        return [self.transfer(data_out) for data_out in messages]
+
+    def transfer_messages(self, messages):
+        """
+        Conduct several SPI transactions for preallocated messages, as transfer_many does
+
+        Keyword arguments:
+        messages -- a list of SpiMessages. The bytes read are stored in each message's rx.
+        """
+        replies = self.transfer_many([list(message.tx) for message in messages])
+        for message, reply in zip(messages, replies):
+            message.rx[:] = bytearray(reply)
+
+    def close(self):
+        """Release the resources held by the transport"""
+        pass
+
+
+class _spi_ioc_transfer(ctypes.Structure):
+    """struct spi_ioc_transfer from linux/spi/spidev.h"""
+    _fields_ = [
+        ("tx_buf", ctypes.c_uint64),
+        ("rx_buf", ctypes.c_uint64),
+        ("len", ctypes.c_uint32),
+        ("speed_hz", ctypes.c_uint32),
+        ("delay_usecs", ctypes.c_uint16),
+        ("bits_per_word", ctypes.c_uint8),
+        ("cs_change", ctypes.c_uint8),
+        ("tx_nbits", ctypes.c_uint8),
+        ("rx_nbits", ctypes.c_uint8),
+        ("word_delay_usecs", ctypes.c_uint8),
+        ("pad", ctypes.c_uint8),
+    ]
+
+
+# The ioctl size field is 14 bits wide, which limits the transfers per SPI_IOC_MESSAGE
+SPI_IOC_MESSAGE_MAX = ((1 << 14) - 1) // ctypes.sizeof(_spi_ioc_transfer)
+
+
+def _SPI_IOC_MESSAGE(n):
+    """Return the SPI_IOC_MESSAGE(n) ioctl request number (_IOW('k', 0, struct spi_ioc_transfer[n]))"""
+    return (1 << 30) | ((n * ctypes.sizeof(_spi_ioc_transfer)) << 16) | (ord('k') << 8)
+
+
+_SPI_IOC_MESSAGE_1 = _SPI_IOC_MESSAGE(1)
+
+
+class SpiDeviceError(IOError):
+    """Exception raised if the SPI device can't be opened"""
+
+
+class SpidevTransport(Transport):
+    """
+    Transport for a BrickPi3 connected to a Linux spidev device
+
+    The device is opened on the first transfer (or by open()), so creating the transport is cheap.
+    transfer_many() submits all of the messages with a single SPI_IOC_MESSAGE ioctl,
+    toggling chip select between them, instead of one xfer2 call per message.
+    transfer_message() reuses a kernel transfer structure prepared for each SpiMessage,
+    so that repeated reads do not allocate.
+    """
+
+    def __init__(self, bus = 0, device = 1, speed_hz = 500000):
+        """
+        Set up the SPI device. It is opened on the first transfer.
+
+        Keyword arguments:
+        bus = 0 -- the SPI bus number
+        device = 1 -- the chip select (the BrickPi3 uses CE1)
+        speed_hz = 500000 -- the SPI clock speed in Hz
+        """
+        self.bus = bus
+        self.device = device
+        self._speed_hz = int(speed_hz)
+        self.spi = None
+        self._fd = None
+
+    def open(self):
+        """
+        Open the SPI device, if it isn't already open
+
+        Raises ImportError if the spidev module isn't installed, and SpiDeviceError if the device can't be opened.
+        """
+        if self.spi is not None:
+            return
+        try:
+            import spidev
+        except ImportError:
+            raise ImportError("spidev module not found. This is required for SPI communication with BrickPi3. "
+                              "Install it with: pip install spidev, or on Raspberry Pi OS: sudo apt-get install python3-spidev")
+        import fcntl
+        self._ioctl = fcntl.ioctl
+
+        try:
+            spi = spidev.SpiDev()
+        except Exception as e:
+            raise SpiDeviceError("Failed to create SPI device: %s. Make sure spidev is properly installed and SPI hardware is available." % e)
+        try:
+            spi.open(self.bus, self.device)
+        except FileNotFoundError:
+            raise SpiDeviceError("SPI device not found. Make sure SPI is enabled on your Raspberry Pi. "
+                                 "Run 'sudo raspi-config', go to 'Interface Options' -> 'SPI' -> 'Enable', then try again.")
+        except PermissionError:
+            raise SpiDeviceError("SPI device permission denied. Add your user to the 'spi' group: "
+                                 "run 'sudo usermod -a -G spi $USER' then log out and back in.")
+        spi.max_speed_hz = self._speed_hz
+        spi.mode = 0b00
+        spi.bits_per_word = 8
+        self._fd = spi.fileno()
+        self.spi = spi
+
+    @property
+    def speed_hz(self):
+        return self._speed_hz
+
+    @speed_hz.setter
+    def speed_hz(self, speed_hz):
+        # the prepared transfers leave speed_hz at 0, so they follow the new speed too
+        self._speed_hz = int(speed_hz)
+        if self.spi is not None:
+            self.spi.max_speed_hz = self._speed_hz
+
+    def transfer(self, data_out):
+        if self.spi is None:
+            self.open()
+        return self.spi.xfer2(data_out)
+
+    def _prepare(self, message):
+        """Return the kernel transfer structure for a SpiMessage, preparing it on first use"""
+        if message.handle is None:
+            # keep the ctypes views so that the buffers can't be resized while the kernel points at them
+            tx = (ctypes.c_char * len(message.tx)).from_buffer(message.tx)
+            rx = (ctypes.c_char * len(message.rx)).from_buffer(message.rx)
+            transfer = _spi_ioc_transfer()
+            transfer.tx_buf = ctypes.addressof(tx)
+            transfer.rx_buf = ctypes.addressof(rx)
+            transfer.len = len(message.tx)
+            transfer.bits_per_word = 8 # speed_hz is left at 0, so the kernel uses spi.max_speed_hz
+            message.handle = (transfer, tx, rx)
+        return message.handle[0]
+
+    def transfer_message(self, message):
+        if self._fd is None:
+            self.open()
+        self._ioctl(self._fd, _SPI_IOC_MESSAGE_1, self._prepare(message))
+
+    def transfer_messages(self, messages):
+        if self._fd is None:
+            self.open()
+        for start in range(0, len(messages), SPI_IOC_MESSAGE_MAX):
+            chunk = messages[start:(start + SPI_IOC_MESSAGE_MAX)]
+            count = len(chunk)
+            transfers = (_spi_ioc_transfer * count)()
+            for i in range(count):
+                transfers[i] = self._prepare(chunk[i]) # copies the prepared transfer
+                transfers[i].cs_change = 1 if i < (count - 1) else 0 # release chip select between messages
+            self._ioctl(self._fd, _SPI_IOC_MESSAGE(count), transfers)
+
+    def transfer_many(self, messages):
+        if self._fd is None:
+            self.open()
+        replies = []
+        for start in range(0, len(messages), SPI_IOC_MESSAGE_MAX):
+            chunk = messages[start:(start + SPI_IOC_MESSAGE_MAX)]
+            count = len(chunk)
+            transfers = (_spi_ioc_transfer * count)()
+            buffers = []
+            for i in range(count):
+                # transmit and receive in place, the kernel allows tx_buf == rx_buf
+                buffer = bytearray(chunk[i])
+                address = ctypes.addressof((ctypes.c_char * len(buffer)).from_buffer(buffer))
+                buffers.append(buffer)
+                transfers[i].tx_buf = address
+                transfers[i].rx_buf = address
+                transfers[i].len = len(buffer)
+                transfers[i].bits_per_word = 8
+                transfers[i].cs_change = 1 if i < (count - 1) else 0 # release chip select between messages
+            self._ioctl(self._fd, _SPI_IOC_MESSAGE(count), transfers)
+            replies.extend(list(buffer) for buffer in buffers)
+        return replies
+
+    def close(self):
+        if self.spi is not None:
+            self.spi.close()
+            self.spi = None
+            self._fd = None
@@ -0,0 +1,974 @@
+# Tests for the BrickPi3 drivers, run against the firmware emulator.
+#
+# Run with: python -m pytest -q test_brickpi3.py
+
+import array
+import asyncio
+import itertools
+import os
+import sys
+import threading
+import tracemalloc
+
+import pytest
+
+import brickpi3
+from brickpi3.emulator import EmulatorTransport
+
+
+def make_bp(**kwargs):
+    clock = brickpi3.VirtualClock()
+    transport = EmulatorTransport(clock = clock, **kwargs)
+    return brickpi3.BrickPi3(transport = transport), transport.emulator, clock
+
+
+def test_detect_and_info():
+    BP, emulator, clock = make_bp()
+    assert BP.get_manufacturer() == "Dexter Industries"
+    assert BP.get_board() == "BrickPi3"
+    assert BP.get_version_firmware() == "1.4.0"
+    assert BP.get_id() == "0000D1B3000000000000000000000001"
+    assert BP.get_voltage_battery() == 9.6
+
+
+def test_sensor_configuring_then_valid():
+    BP, emulator, clock = make_bp()
+    BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.EV3_GYRO_ABS_DPS)
+    emulator.set_sensor_value(BP.PORT_1, [-45, 12])
+    try:
+        BP.get_sensor(BP.PORT_1)
+        assert False, "sensor should still be configuring"
+    except brickpi3.SensorError:
+        pass
+    clock.sleep(emulator.ev3_connect_time)
+    assert BP.get_sensor(BP.PORT_1) == [-45, 12]
+
+
+def test_sensor_read_plans():
+    BP, emulator, clock = make_bp()
+    ST = BP.SENSOR_TYPE
+    BP.set_sensor_type(BP.PORT_1 + BP.PORT_2, ST.NXT_LIGHT_ON)
+    assert BP._board.read_plans[0] is BP._board.read_plans[1] # compiled once for the type
+    emulator.set_sensor_value(BP.PORT_1, 300)
+    assert BP.get_sensor(BP.PORT_1) == 300
+
+    # setting another type replaces the plan, and the next read uses the new reply length and decoder
+    BP.set_sensor_type(BP.PORT_1, ST.NXT_COLOR_FULL)
+    emulator.set_sensor_value(BP.PORT_1, [2, 100, 200, 300, 50])
+    clock.sleep(1)
+    assert BP.get_sensor(BP.PORT_1) == [2, 100, 200, 300, 50]
+    assert BP._board.read_plans[0] is not BP._board.read_plans[1]
+
+    # a reply for another sensor type isn't decoded with the port's plan
+    emulator.board().sensors[0].type = ST.NXT_LIGHT_ON
+    emulator.set_sensor_value(BP.PORT_1, 300)
+    with pytest.raises(brickpi3.SensorError):
+        BP.get_sensor(BP.PORT_1)
+
+    # I2C replies are as long as the bytes the last transaction read
+    emulator.attach_i2c_device(BP.PORT_3, 0x02, lambda out, in_bytes: list(range(10, 10 + in_bytes)))
+    BP.set_sensor_type(BP.PORT_3, ST.I2C, [0, 0])
+    clock.sleep(1)
+    BP.transact_i2c(BP.PORT_3, 0x02, [0x42], 3)
+    assert BP.get_sensor(BP.PORT_3) == [10, 11, 12]
+    BP.transact_i2c(BP.PORT_3, 0x02, [0x42], 5)
+    assert BP.get_sensor(BP.PORT_3) == [10, 11, 12, 13, 14]
+
+    BP.set_sensor_type(BP.PORT_4, ST.EV3_INFRARED_REMOTE + 1) # not a type get_sensor can read
+    with pytest.raises(IOError):
+        BP.get_sensor(BP.PORT_4)
+
+
+def test_motor_position_and_encoder():
+    BP, emulator, clock = make_bp()
+    BP.set_motor_position(BP.PORT_B, 720)
+    clock.sleep(5)
+    assert BP.get_motor_status(BP.PORT_B) == [0, 0, 720, 0]
+    BP.reset_motor_encoder(BP.PORT_B)
+    assert BP.get_motor_encoder(BP.PORT_B) == 0
+
+
+def test_virtual_clock_latency():
+    BP, emulator, clock = make_bp(latency = 0.001)
+    start = clock.monotonic()
+    for i in range(100):
+        BP.get_motor_encoder(BP.PORT_A)
+    assert abs(clock.monotonic() - start - 0.1) < 1e-6
+
+
+def test_batch_single_transfer():
+    BP, emulator, clock = make_bp()
+    transport = BP.transport
+    BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.TOUCH)
+    emulator.set_sensor_value(BP.PORT_1, 1)
+    transfers = transport.transfers
+    with BP.batch() as b:
+        b.set_motor_dps(BP.PORT_A, 100)
+        encoder = b.get_motor_encoder(BP.PORT_B)
+        touch = b.get_sensor(BP.PORT_1)
+        battery = b.get_voltage_battery()
+        assert not encoder.done
+    assert transport.transfers == transfers + 1
+    assert (encoder.value, touch.value, battery.value) == (0, 1, 9.6)
+
+
+class ReplayTransport(brickpi3.Transport):
+    """Transport that answers each message type with fixed bytes, without allocating"""
+
+    def __init__(self, replies):
+        # bytearrays, because assigning any other type to a bytearray slice makes a temporary copy
+        self.replies = {message_type: bytearray(reply) for message_type, reply in replies.items()}
+
+    def transfer(self, data_out):
+        return list(self.replies[data_out[1]])
+
+    def transfer_message(self, message):
+        message.rx[WHOLE] = self.replies[message.tx[1]]
+
+
+WHOLE = slice(None) # prebuilt, because rx[:] would allocate a slice object
+
+
+def peak_allocated(function, calls = 1000):
+    """Return the peak memory allocated (in bytes) while calling function repeatedly"""
+    function() # warm up caches
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for _ in itertools.repeat(None, calls):
+            function()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert current <= start
+    return peak - start
+
+
+def allocated_during(function, calls = 1000):
+    """Return the memory allocated (in bytes) by calling function repeatedly, beyond the cost of the loop itself"""
+    return peak_allocated(function, calls) - peak_allocated(lambda: None, calls)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 9), reason = "tracemalloc.reset_peak requires Python 3.9")
+def test_reads_do_not_allocate():
+    MT = brickpi3.BrickPi3.BPSPI_MESSAGE_TYPE
+    ST = brickpi3.BrickPi3.SENSOR_TYPE
+    transport = ReplayTransport({
+        MT.SET_SENSOR_TYPE: bytes(4),
+        MT.GET_MOTOR_A_ENCODER: bytes([0, 0, 0, 0xA5, 0xFF, 0xFF, 0xFF, 0x9C]), # -100
+        MT.GET_SENSOR_1: bytes([0, 0, 0, 0xA5, ST.EV3_TOUCH, 0, 1]),
+        MT.GET_SENSOR_2: bytes([0, 0, 0, 0xA5, ST.EV3_GYRO_DPS, 0, 0x00, 0x2D]), # 45
+    })
+    BP = brickpi3.BrickPi3(detect = False, transport = transport)
+    BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.EV3_TOUCH)
+    BP.set_sensor_type(BP.PORT_2, BP.SENSOR_TYPE.EV3_GYRO_DPS)
+    assert BP.get_motor_encoder(BP.PORT_A) == -100
+    assert BP.get_sensor(BP.PORT_1) == 1
+    assert BP.get_sensor(BP.PORT_2) == 45
+
+    # nothing is allocated per call, apart from at most the returned int
+    assert allocated_during(lambda: BP.get_motor_encoder(BP.PORT_A)) <= 32
+    assert allocated_during(lambda: BP.get_sensor(BP.PORT_1)) == 0
+    assert allocated_during(lambda: BP.get_sensor(BP.PORT_2)) == 0
+
+
+def test_poller_snapshot_cache():
+    BP, emulator, clock = make_bp()
+    transport = BP.transport
+    BP.set_sensor_type(BP.PORT_2, BP.SENSOR_TYPE.NXT_LIGHT_ON)
+    emulator.set_sensor_value(BP.PORT_2, 512)
+    BP.set_motor_dps(BP.PORT_A, 100)
+    clock.sleep(1)
+
+    poller = brickpi3.Poller(BP)
+    transfers = transport.transfers
+    snapshot = poller.poll()
+    assert transport.transfers == transfers + 1
+    assert snapshot.sensors == (None, 512, None, None)
+    assert snapshot.motor_status[0] == [0, 10, 100, 100]
+
+    emulator.set_sensor_value(BP.PORT_2, 100)
+    assert BP.get_sensor(BP.PORT_2, max_age = 0.1) == 512
+    assert BP.get_motor_encoder(BP.PORT_A, max_age = 0.1) == 100
+    assert BP.get_voltage_battery(max_age = 0.1) == 9.6
+    assert transport.transfers == transfers + 1
+
+    clock.sleep(0.2) # the snapshot is now too old
+    assert BP.get_sensor(BP.PORT_2, max_age = 0.1) == 100
+    assert BP.get_motor_encoder(BP.PORT_A, max_age = 0.1) == 120
+
+    # stopping the poller doesn't wait for the rest of its period
+    import time
+    poller = brickpi3.Poller(brickpi3.BrickPi3(transport = EmulatorTransport()), hz = 0.2) # the real clock
+    poller.start()
+    while poller.cycles == 0:
+        time.sleep(0.001)
+    start = time.monotonic()
+    poller.stop()
+    assert time.monotonic() - start < 1
+
+
+def test_async_reads_coalesce():
+    clock = brickpi3.VirtualClock()
+    transport = EmulatorTransport(clock = clock)
+    BP = brickpi3.AsyncBrickPi3(transport = transport)
+
+    async def main():
+        await BP.set_motor_position(BP.PORT_C, 90)
+        clock.sleep(5)
+        transfers = transport.transfers
+        encoders = await asyncio.gather(*[BP.get_motor_encoder(BP.PORT_C) for i in range(10)])
+        assert encoders == [90] * 10
+        assert transport.transfers == transfers + 1
+
+        # a read made after a write is not coalesced with one made before it
+        before = BP.get_motor_encoder(BP.PORT_C)
+        reset = BP.reset_motor_encoder(BP.PORT_C)
+        after = BP.get_motor_encoder(BP.PORT_C)
+        assert await asyncio.gather(before, reset, after) == [90, None, 0]
+
+    asyncio.run(main())
+    BP.close()
+
+
+def test_async_waits_leave_the_hardware_thread_free():
+    transport = EmulatorTransport() # the real clock, which asyncio.sleep follows
+    BP = brickpi3.AsyncBrickPi3(transport = transport)
+
+    async def main():
+        await BP.set_motor_limits(BP.PORT_A, dps = 720)
+        await BP.set_motor_position(BP.PORT_A, 180) # 0.25 s
+        waiting = asyncio.ensure_future(BP.wait_for_position(BP.PORT_A, timeout = 5))
+        reads = 0
+        while not waiting.done():
+            assert await BP.get_voltage_battery() == 9.6
+            reads += 1
+        assert abs(waiting.result()[0].encoder - 180) <= 2
+        assert reads > 20 # other calls ran while waiting
+        await BP.set_motor_dps(BP.PORT_B, -400)
+        assert (await BP.wait_until_encoder(BP.PORT_B, -100, timeout = 5))[1].encoder <= -100
+
+        transport.emulator.set_sensor_value(BP.PORT_1, 300)
+        futures = await BP.configure_sensors({BP.PORT_1: BP.SENSOR_TYPE.NXT_LIGHT_ON})
+        assert await futures[BP.PORT_1] == 300
+
+    asyncio.run(main())
+    BP.close()
+
+    # leaving async with waits for the calls in progress without blocking the event loop
+    release = threading.Event()
+
+    async def release_soon():
+        await asyncio.sleep(0.05)
+        release.set()
+
+    async def exit_while_busy():
+        async with brickpi3.AsyncBrickPi3(transport = EmulatorTransport()) as abp:
+            busy = asyncio.ensure_future(abp.call(release.wait, 5))
+            await asyncio.sleep(0) # the call starts on the hardware thread
+            releaser = asyncio.ensure_future(release_soon())
+        assert release.is_set() # set by the event loop while the exit waited
+        assert await busy is True
+        await releaser
+
+    asyncio.run(exit_while_busy())
+
+
+def test_threads_and_shared_board_state():
+    BP, emulator, clock = make_bp()
+    other = brickpi3.BrickPi3(transport = BP.transport) # the same board
+    other.set_sensor_type(BP.PORT_3, BP.SENSOR_TYPE.NXT_TOUCH)
+    assert BP.SensorType[2] == BP.SENSOR_TYPE.NXT_TOUCH
+    assert brickpi3.BrickPi3.__dict__.get("SensorType") is None
+
+    errors = []
+    def worker(index):
+        port = 1 << index
+        BP.set_sensor_type(port, BP.SENSOR_TYPE.TOUCH)
+        emulator.set_sensor_value(port, index % 2)
+        for i in range(300):
+            BP.set_motor_position(port, index * 1000 + i)
+            if BP.get_sensor(port) != index % 2:
+                errors.append(index)
+    threads = [threading.Thread(target = worker, args = (index,)) for index in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert [motor.target_position for motor in emulator.board().motors] == [299, 1299, 2299, 3299]
+
+
+def test_stack_addresses_and_batched_reads():
+    clock = brickpi3.VirtualClock()
+    emulator = brickpi3.emulator.BrickPi3Emulator(addresses = (1, 2, 3), clock = clock)
+    transport = EmulatorTransport(emulator)
+    ids = [board.id for board in emulator.boards]
+    ids = ["".join("%02X" % b for b in id) for id in reversed(ids)]
+
+    stack = brickpi3.BrickPi3Stack(ids, transport = transport)
+    assert [board.address for board in emulator.boards] == [3, 2, 1]
+    assert [bp.get_id() for bp in stack] == ids
+    assert len(brickpi3.BrickPi3Stack(transport = transport)) == 3 # found by scanning
+
+    stack[0].set_sensor_type(stack[0].PORT_1, stack[0].SENSOR_TYPE.TOUCH)
+    emulator.set_sensor_value(stack[0].PORT_1, 1, address = 1)
+    stack[2].set_motor_dps(stack[2].PORT_D, 200)
+    clock.sleep(1)
+    transfers = transport.transfers
+    snapshots = stack.poll()
+    assert transport.transfers == transfers + 1
+    assert [s.sensors[0] for s in snapshots] == [1, None, None]
+    assert snapshots[2].motor_status[3][3] == 200
+    assert stack[2].get_motor_status(stack[2].PORT_D, max_age = 1)[3] == 200
+
+    stack[0].set_motor_power(stack[0].PORT_A, 50)
+    stack[1].set_motor_power(stack[1].PORT_A, 50)
+    transfers = transport.transfers
+    stack.emergency_float()
+    assert transport.transfers == transfers + 1
+    assert all(motor.mode == "float" for board in emulator.boards for motor in board.motors)
+
+    # the boards' write caches don't hide the float, so the motors can be driven again
+    stack[0].set_motor_power(stack[0].PORT_A, 50)
+    stack[1].set_motor_power(stack[1].PORT_A, 50)
+    assert transport.transfers == transfers + 3
+    assert emulator.board(1).motors[0].power == emulator.board(2).motors[0].power == 50
+
+
+def test_daemon_clients(tmp_path):
+    from brickpi3.daemon import BrickPi3Daemon, _encode_messages
+    transport = EmulatorTransport()
+    daemon = BrickPi3Daemon(transport, str(tmp_path / "brickpi3d.sock"))
+    server = threading.Thread(target = daemon.serve_forever)
+    server.start()
+    try:
+        clients = [brickpi3.BrickPi3Client(path = daemon.path) for i in range(2)]
+        clients[0].set_motor_position(clients[0].PORT_A, 123)
+        clients[1].offset_motor_encoder(clients[1].PORT_B, -10)
+        assert clients[1].get_motor_encoder(clients[1].PORT_B) == 10
+        with clients[1].batch() as b:
+            id = b.get_id()
+            battery = b.get_voltage_battery()
+        assert (id.value, battery.value) == (clients[0].get_id(), 9.6)
+        assert transport.emulator.board().motors[0].target_position == 123
+
+        # a second client reads a sensor that the first configured, without configuring it again
+        emulator = transport.emulator
+        emulator.set_sensor_value(clients[0].PORT_1, 42)
+        clients[0].set_sensor_type(clients[0].PORT_1, clients[0].SENSOR_TYPE.NXT_ULTRASONIC)
+        ready_at = emulator.board().sensors[0].ready_at
+        transport.clock.sleep(max(0, ready_at - transport.clock.monotonic()))
+        assert clients[0].get_sensor(clients[0].PORT_1) == 42
+        with pytest.raises(IOError):
+            clients[1].get_sensor(clients[1].PORT_1) # it doesn't know how to decode the port
+        clients[1].use_sensor_type(clients[1].PORT_1, clients[1].SENSOR_TYPE.NXT_ULTRASONIC)
+        assert clients[1].get_sensor(clients[1].PORT_1) == 42
+        assert emulator.board().sensors[0].ready_at == ready_at
+
+        # a client that doesn't read its replies doesn't hold up the others
+        import socket
+        stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stalled.connect(daemon.path)
+        read = list(clients[0]._local.messages[clients[0].BPSPI_MESSAGE_TYPE.GET_VOLTAGE_VCC].tx)
+        stalled.sendall(bytes(_encode_messages([read] * 255) * 300)) # about 500 KB of replies
+        clients[0].transport.sock.settimeout(5)
+        for i in range(10):
+            assert clients[0].get_voltage_battery() == 9.6
+        stalled.close()
+        for client in clients:
+            client.transport.close()
+    finally:
+        daemon.shutdown()
+        server.join()
+    assert not os.path.exists(daemon.path)
+
+    # only a stale socket is replaced
+    path = str(tmp_path / "file")
+    open(path, "w").close()
+    with pytest.raises(IOError):
+        BrickPi3Daemon(transport, path)
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(daemon.path)
+    stale.close()
+    daemon = BrickPi3Daemon(transport, daemon.path)
+    server = threading.Thread(target = daemon.serve_forever)
+    server.start()
+    try:
+        with pytest.raises(IOError): # a daemon is serving it
+            BrickPi3Daemon(transport, daemon.path)
+    finally:
+        daemon.shutdown()
+        server.join()
+
+
+def test_shared_memory_snapshot(tmp_path):
+    BP, emulator, clock = make_bp()
+    BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.EV3_INFRARED_SEEK)
+    BP.set_sensor_type(BP.PORT_2, BP.SENSOR_TYPE.NXT_COLOR_FULL)
+    BP.set_sensor_type(BP.PORT_3, BP.SENSOR_TYPE.TOUCH)
+    emulator.set_sensor_value(BP.PORT_2, [2, 100, 200, 300, 50])
+    emulator.set_sensor_value(BP.PORT_3, 1)
+    BP.set_sensor_type(BP.PORT_4, BP.SENSOR_TYPE.EV3_ULTRASONIC_CM)
+    emulator.set_sensor_value(BP.PORT_4, 12.3)
+    BP.set_motor_power(BP.PORT_C, -40)
+    path = BP.publish_snapshots(str(tmp_path / "snapshot"))
+    reader = brickpi3.SnapshotReader(path)
+    assert reader.read() is None
+
+    snapshot = BP.poll()
+    shared = reader.read()
+    assert shared.sensors == snapshot.sensors # port 1 is still configuring, so is an error
+    assert shared.motor_status == snapshot.motor_status
+    assert (shared.timestamp, shared.sensor_types, shared.voltage_battery) == (snapshot.timestamp, snapshot.sensor_types, 9.6)
+    assert isinstance(shared.sensor_errors[0], brickpi3.SensorError)
+
+    clock.sleep(emulator.ev3_connect_time)
+    emulator.set_sensor_value(BP.PORT_1, [[1, 2], [3, 4], [5, 6], [-7, -8]])
+    snapshot = BP.poll()
+    assert reader.read().sensors == snapshot.sensors
+    assert snapshot.sensors[0] == [[1, 2], [3, 4], [5, 6], [-7, -8]]
+    assert snapshot.sensors[3] == 12.3 # a float
+    assert isinstance(reader.read().sensors[2], int)
+
+    # a value that can't be shared is published as an error of its port, rather than stopping the poll
+    BP.set_sensor_filter(BP.PORT_3, lambda value: "pressed")
+    BP.set_sensor_filter(BP.PORT_4, lambda value: (value, 2 * value))
+    snapshot = BP.poll()
+    shared = reader.read()
+    assert snapshot.sensors[2] == "pressed" and shared.sensors[2] is None
+    assert isinstance(shared.sensor_errors[2], IOError) and "str" in str(shared.sensor_errors[2])
+    assert shared.sensors[3] == [12.3, 24.6]
+    assert shared.sensors[1] == snapshot.sensors[1]
+    reader.close()
+
+
+def test_spi_speed_calibration_and_fallback():
+    BP, emulator, clock = make_bp(speed_hz = 500000, max_speed_hz = 1500000)
+    assert BP.calibrate_spi_speed() == 1500000
+    assert BP.get_spi_speed() == 1500000
+
+    BP.set_spi_speed(3000000)
+    with pytest.warns(RuntimeWarning, match = "Reduced the SPI speed"):
+        for i in range(2 * brickpi3.SPI_ERROR_BURST):
+            with pytest.raises(IOError):
+                BP.get_voltage_battery()
+    assert BP.get_spi_speed() == 1500000 # stepped down twice
+    assert BP.get_voltage_battery() == 9.6
+
+    # a burst of errors from several threads at once reduces the speed by one step
+    BP.set_spi_speed(3000000)
+    barrier = threading.Barrier(brickpi3.SPI_ERROR_BURST)
+
+    def fail():
+        barrier.wait()
+        try:
+            BP.get_voltage_battery()
+        except IOError:
+            pass
+    with pytest.warns(RuntimeWarning):
+        threads = [threading.Thread(target = fail) for i in range(brickpi3.SPI_ERROR_BURST)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert BP.get_spi_speed() == 2000000
+
+
+def test_protocol_table_and_tracer():
+    spec = brickpi3.PROTOCOL.GET_MOTOR_B_STATUS
+    assert spec.length == 12
+    reply = bytearray([0, 0, 0, 0xA5] + spec.reply_data(1, -40, -123456, -300))
+    assert spec.decode(reply) == [1, -40, -123456, -300]
+    assert brickpi3.PROTOCOL.GET_VOLTAGE_VCC.decode(bytearray([0, 0, 0, 0xA5] + brickpi3.PROTOCOL.GET_VOLTAGE_VCC.reply_data(7.4))) == 7.4
+
+    lines = []
+    clock = brickpi3.VirtualClock()
+    BP = brickpi3.BrickPi3(transport = brickpi3.TracingTransport(EmulatorTransport(clock = clock), lines.append))
+    del lines[:]
+    BP.set_motor_power(BP.PORT_A, 50.7) # floats and out of range values are truncated and wrapped, as before
+    BP.set_motor_dps(BP.PORT_B, 0x18000)
+    BP.get_motor_encoder(BP.PORT_A)
+    BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.CUSTOM, [BP.SENSOR_CUSTOM.PIN1_ADC])
+    assert lines == ["1: SET_MOTOR_POWER(port=1, power=50)",
+                     "1: SET_MOTOR_DPS(port=2, dps=-32768)",
+                     "1: GET_MOTOR_A_ENCODER() -> encoder=0",
+                     "1: SET_SENSOR_TYPE(port=1, type=%d, data=[%d, 0])" % (BP.SENSOR_TYPE.CUSTOM, BP.SENSOR_CUSTOM.PIN1_ADC >> 8)]
+
+
+def test_bulk_reads():
+    BP, emulator, clock = make_bp()
+    BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.TOUCH)
+    BP.set_sensor_type(BP.PORT_2, BP.SENSOR_TYPE.EV3_GYRO_ABS_DPS)
+    BP.set_sensor_type(BP.PORT_3, BP.SENSOR_TYPE.NXT_LIGHT_ON)
+    emulator.set_sensor_value(BP.PORT_1, 1)
+    emulator.set_sensor_value(BP.PORT_3, 1500)
+    BP.set_motor_dps(BP.PORT_B, -250)
+    clock.sleep(0.5)
+
+    transfers = BP.transport.transfers
+    readings = BP.get_sensors()
+    statuses = BP.get_motor_statuses(BP.PORT_A + BP.PORT_B)
+    assert BP.transport.transfers == transfers + 2
+    assert readings.values == (1, None, 1500, None)
+    assert isinstance(readings.errors[1], brickpi3.SensorError) # still configuring
+    assert readings.errors[3] is not None and readings.errors[0] is None
+    assert statuses[1] == brickpi3.MotorStatus(0, BP.get_motor_status(BP.PORT_B)[1], -125, -250)
+    assert statuses[1].dps == -250 and statuses[2:] == (None, None)
+
+
+def test_numpy_capture():
+    numpy = pytest.importorskip("numpy")
+    from brickpi3.capture import Capture
+    BP, emulator, clock = make_bp()
+    BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.EV3_GYRO_ABS_DPS)
+    BP.set_sensor_type(BP.PORT_2, BP.SENSOR_TYPE.EV3_ULTRASONIC_CM)
+    emulator.set_sensor_value(BP.PORT_1, [-45, 12])
+    emulator.set_sensor_value(BP.PORT_2, 12.3)
+    BP.set_motor_dps(BP.PORT_A, -200)
+
+    capture = Capture(BP, motors = BP.PORT_A, sensors = BP.PORT_1 + BP.PORT_2, length = 2000)
+    capture.run(hz = 1000)
+    data = capture.decode()
+    assert len(data) == 2000 and data["timestamp"][-1] == pytest.approx(1.999)
+    assert not data["sensor_1"]["valid"][0] # configuring
+    assert list(data["sensor_1"]["value"][-1]) == BP.get_sensor(BP.PORT_1) == [-45, 12]
+    assert data["sensor_2"]["value"][-1] == BP.get_sensor(BP.PORT_2)
+    assert numpy.all(data["motor_a"]["valid"])
+    assert list(data["motor_a"][-1])[:4] == BP.get_motor_status(BP.PORT_A)
+    assert numpy.all(numpy.diff(data["motor_a"]["encoder"]) <= 0)
+
+
+def test_stream():
+    BP, emulator, clock = make_bp()
+    BP.set_sensor_type(BP.PORT_2, BP.SENSOR_TYPE.NXT_LIGHT_ON)
+    emulator.set_sensor_value(BP.PORT_2, 700)
+    BP.set_motor_dps(BP.PORT_A, 100)
+    transfers = BP.transport.transfers
+    stream = BP.stream(sensors = BP.PORT_1 + BP.PORT_2, encoders = BP.PORT_A, hz = 50, count = 10)
+    samples = []
+    for sample in stream:
+        samples.append(sample)
+        if len(samples) == 5:
+            clock.sleep(0.07) # a slow consumer misses the deadlines at 100 and 120 ms
+    assert BP.transport.transfers == transfers + 10
+    assert [s.timestamp_ns for s in samples][:6] == [0, 20000000, 40000000, 60000000, 80000000, 150000000]
+    assert samples[6].timestamp_ns == 160000000 and stream.missed == 2
+    assert samples[-1].timestamp_ns == 220000000 and samples[-1].values == (None, 700, 22)
+
+    async def read_async():
+        ABP = brickpi3.AsyncBrickPi3(transport = EmulatorTransport())
+        try:
+            stream = ABP.stream(encoders = BP.PORT_A + BP.PORT_B, hz = 1000, count = 5)
+            return [sample async for sample in stream]
+        finally:
+            ABP.close()
+    samples = asyncio.run(read_async())
+    assert len(samples) == 5 and samples[0].values == (0, 0)
+    assert all(b.timestamp_ns > a.timestamp_ns for a, b in zip(samples, samples[1:]))
+
+
+def test_history():
+    BP, emulator, clock = make_bp()
+    BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.NXT_LIGHT_ON)
+    history = BP.record_history(capacity = 50)
+    BP.set_motor_dps(BP.PORT_A, 100)
+    for i in range(80):
+        emulator.set_sensor_value(BP.PORT_1, i)
+        BP.poll()
+        clock.sleep(0.01)
+    sensor = history["sensor_1"]
+    assert len(sensor) == 50 and sensor.appended == 80 and "sensor_2" not in history
+    timestamps, values = sensor.window()
+    assert list(values) == list(range(30, 80)) and sensor.latest()[1] == 79
+    timestamps, values = sensor.window(seconds = 0.105)
+    assert list(values) == list(range(69, 80))
+    assert (sensor.min(0.105), sensor.max(0.105), sensor.mean(0.105)) == (69, 79, 74)
+    assert history["motor_a_encoder"].max() == 79 and history["motor_a_dps"].mean() == 100
+
+    points = sensor.downsample(10)
+    assert len(points) == 10 and points[0][1] == 30 and points[-1][1] == 79
+    assert [t for t, v in points] == sorted(t for t, v in points)
+    channel = brickpi3.history.Channel(100)
+    for i in range(100):
+        channel.append(i, 100 if i == 42 else 0)
+    assert (42, 100) in channel.downsample(5) # the peak is kept
+    channel.clear()
+    assert channel.window() == (array.array("d"), array.array("d")) and channel.mean() is None
+
+
+def test_sensor_filters():
+    from brickpi3.filters import Median, EMA, Kalman, OutlierReject
+
+    median = Median(3)
+    assert [median(v) for v in [5, 1, 9, 2, 2, 7, 7]] == [5, 5, 5, 2, 2, 2, 7]
+    ema = EMA(0.5)
+    assert [ema(v) for v in [10, 20, 20]] == [10, 15, 17.5]
+    reject = OutlierReject(10, max_rejects = 2)
+    assert [reject(v) for v in [50, 255, 52, 90, 91, 92]] == [50, 50, 52, 52, 52, 92]
+    kalman = Kalman(process_noise = 0.01, measurement_noise = 4)
+    values = [kalman(100 + (3 if i % 2 else -3)) for i in range(50)]
+    assert abs(values[-1] - 100) < 1
+
+    BP, emulator, clock = make_bp()
+    BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.NXT_LIGHT_ON)
+    BP.set_sensor_filter(BP.PORT_1, OutlierReject(20, max_rejects = 1), Median(3))
+    readings = []
+    for value in [40, 41, 255, 42, 43, 80, 80, 80]:
+        emulator.set_sensor_value(BP.PORT_1, value)
+        readings.append(BP.get_sensor(BP.PORT_1))
+    assert readings == [40, 41, 41, 41, 42, 43, 43, 80]
+    emulator.set_sensor_value(BP.PORT_1, 80)
+    assert BP.get_sensors(BP.PORT_1).values[0] == 80
+    with BP.batch():
+        batched = BP.get_sensor(BP.PORT_1)
+    assert batched.value == 80
+
+    BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.NXT_LIGHT_ON) # resets the filters
+    emulator.set_sensor_value(BP.PORT_1, 10)
+    assert BP.get_sensor(BP.PORT_1) == 10
+    BP.set_sensor_filter(BP.PORT_1)
+    emulator.set_sensor_value(BP.PORT_1, 255)
+    assert BP.get_sensor(BP.PORT_1) == 255
+
+    # the values read by several threads at once are filtered one at a time, and each once
+    calls = []
+    active = []
+
+    def slow_filter(value):
+        active.append(value)
+        overlapped = len(active) > 1
+        threading.Event().wait(0.001)
+        active.pop()
+        calls.append(overlapped)
+        return value
+    BP.set_sensor_filter(BP.PORT_1, slow_filter)
+    readers = [threading.Thread(target = lambda: [BP.get_sensor(BP.PORT_1) for i in range(20)]) for t in range(4)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    assert len(calls) == 80 and not any(calls)
+
+
+def test_mode_scheduler():
+    BP, emulator, clock = make_bp()
+    emulator.ev3_connect_time = 0.1
+    emulator.ev3_mode_switch_time = 0.01
+    ST = BP.SENSOR_TYPE
+    emulator.set_sensor_value(BP.PORT_1, 40)
+    emulator.set_sensor_value(BP.PORT_3, 5)
+    scheduler = brickpi3.ModeScheduler(BP, {
+        BP.PORT_1: [ST.EV3_COLOR_REFLECTED, ST.EV3_COLOR_AMBIENT, ST.EV3_COLOR_COLOR],
+        BP.PORT_3: [ST.EV3_GYRO_ABS, ST.EV3_GYRO_DPS],
+    })
+    readings = scheduler.read() # includes the time to connect the sensors
+    assert readings == {BP.PORT_1: {ST.EV3_COLOR_REFLECTED: 40, ST.EV3_COLOR_AMBIENT: 40, ST.EV3_COLOR_COLOR: 40},
+                        BP.PORT_3: {ST.EV3_GYRO_ABS: 5, ST.EV3_GYRO_DPS: 5}}
+    start = clock.monotonic()
+    transfers = BP.transport.transfers
+    readings = scheduler.read()
+    # three mode switches on PORT_1, each settling while PORT_3 switches too, rather than 5 fixed waits
+    assert clock.monotonic() - start < 0.035
+    assert len(readings[BP.PORT_1]) == 3 and len(readings[BP.PORT_3]) == 2
+    assert BP.transport.transfers - transfers < 50
+    assert scheduler.cycles == 2
+
+    emulator.ev3_mode_switch_time = 5
+    with pytest.raises(brickpi3.SensorError):
+        scheduler.read()
+
+    # connecting a sensor may take longer than the timeout of a mode switch
+    emulator.ev3_connect_time = 1.5
+    emulator.set_sensor_value(BP.PORT_2, 7)
+    single = brickpi3.ModeScheduler(BP, {BP.PORT_2: [ST.EV3_ULTRASONIC_CM]})
+    assert single.read() == {BP.PORT_2: {ST.EV3_ULTRASONIC_CM: 7}}
+    # a port with one mode has its timeout from the first error, rather than from the only switch long ago
+    clock.sleep(2)
+    emulator.board().sensors[1].ready_at = clock.monotonic() + 0.05 # a brief error
+    assert single.read() == {BP.PORT_2: {ST.EV3_ULTRASONIC_CM: 7}}
+
+    # after a reset of the board, the sensor type is set again, and the sensor has time to be detected again
+    emulator.reset_board()
+    start = clock.monotonic()
+    assert single.read() == {BP.PORT_2: {ST.EV3_ULTRASONIC_CM: 7}}
+    assert clock.monotonic() - start >= 1.5
+    assert single.read() == {BP.PORT_2: {ST.EV3_ULTRASONIC_CM: 7}}
+
+
+def test_configure_sensors():
+    BP, emulator, clock = make_bp()
+    emulator.ev3_connect_time = 1.5
+    emulator.set_sensor_value(BP.PORT_1 + BP.PORT_2, 7)
+    ST = BP.SENSOR_TYPE
+    futures = BP.configure_sensors({BP.PORT_1: ST.EV3_GYRO_ABS, BP.PORT_2: ST.NXT_LIGHT_ON,
+                                    BP.PORT_3: (ST.CUSTOM, [BP.SENSOR_CUSTOM.PIN1_ADC])})
+    assert futures[BP.PORT_2].result(timeout = 10) == 7
+    assert futures[BP.PORT_1].result(timeout = 10) == 7
+    assert futures[BP.PORT_3].result(timeout = 10) is not None
+    assert 1.5 <= clock.monotonic() < 1.7 # the slowest sensor, plus at most one poll interval
+
+    futures = BP.configure_sensors({BP.PORT_4: ST.EV3_ULTRASONIC_CM}, timeout = 0.5)
+    with pytest.raises(brickpi3.SensorError):
+        futures[BP.PORT_4].result(timeout = 10)
+    with pytest.raises(IOError):
+        BP.configure_sensors({BP.PORT_1 + BP.PORT_2: ST.TOUCH})
+
+
+def test_lazy_spi_device():
+    transport = brickpi3.SpidevTransport(0, 1, 1000000)
+    assert transport.spi is None and transport.speed_hz == 1000000
+    transport.speed_hz = 500000
+    with pytest.raises((ImportError, brickpi3.SpiDeviceError)): # no spidev module or no SPI device here
+        brickpi3.BrickPi3(transport = transport)
+    transport.close()
+
+    names = brickpi3.Enumeration("""
+        FIRST = 3,
+        SECOND,
+        THIRD = 16,
+    """)
+    assert (names.FIRST, names.SECOND, names.THIRD) == (3, 4, 16)
+    assert brickpi3.Enumeration({"FIRST": 3, "SECOND": 4}).SECOND == 4
+    assert brickpi3.BrickPi3.SENSOR_TYPE.EV3_INFRARED_REMOTE == 28
+
+
+def test_write_cache():
+    BP, emulator, clock = make_bp()
+    transport = BP.transport
+    motor = emulator.board().motors[0]
+
+    def sent(function, *args, **kwargs):
+        transfers = transport.transfers
+        function(*args, **kwargs)
+        return transport.transfers - transfers
+
+    assert sent(BP.set_motor_power, BP.PORT_A, 50) == 1
+    assert sent(BP.set_motor_power, BP.PORT_A, 50) == 0
+    assert sent(BP.set_motor_power, BP.PORT_A + BP.PORT_B, 50) == 1 # PORT_B is new
+    assert sent(BP.set_motor_power, BP.PORT_B, 50) == 0
+    assert sent(BP.set_motor_dps, BP.PORT_A, 50) == 1
+    assert sent(BP.set_motor_power, BP.PORT_A, 50) == 1 # power replaces the dps target
+    assert sent(BP.set_motor_power, BP.PORT_A, 50, force = True) == 1
+    assert sent(BP.set_led, 30) == 1 and sent(BP.set_led, 30) == 0
+    assert sent(BP.reset_all) == 1 and sent(BP.reset_all) == 0
+    assert motor.power == BP.MOTOR_FLOAT
+
+    BP.set_sensor_type(BP.PORT_1, BP.SENSOR_TYPE.NXT_LIGHT_ON)
+    assert sent(BP.set_sensor_type, BP.PORT_1, BP.SENSOR_TYPE.NXT_LIGHT_ON) == 0
+    assert sent(BP.set_sensor_type, BP.PORT_2, BP.SENSOR_TYPE.CUSTOM, [BP.SENSOR_CUSTOM.PIN1_ADC]) == 1
+    assert sent(BP.set_sensor_type, BP.PORT_2, BP.SENSOR_TYPE.CUSTOM, [BP.SENSOR_CUSTOM.PIN6_ADC]) == 1
+    BP.set_motor_position(BP.PORT_C, 90)
+    BP.offset_motor_encoder(BP.PORT_C, 10)
+    assert sent(BP.set_motor_position, BP.PORT_C, 90) == 1
+
+    # a reset of the board is detected from the sensor replies, and everything is sent again
+    BP.set_motor_dps(BP.PORT_A, 100)
+    emulator.reset_board()
+    with pytest.raises(brickpi3.SensorNotConfiguredError):
+        BP.get_sensor(BP.PORT_1)
+    assert sent(BP.set_motor_dps, BP.PORT_A, 100) == 1 and motor.target_dps == 100
+    assert sent(BP.set_sensor_type, BP.PORT_1, BP.SENSOR_TYPE.NXT_LIGHT_ON) == 1
+    emulator.set_sensor_value(BP.PORT_1, 500)
+    assert BP.get_sensor(BP.PORT_1) == 500
+
+    # a batch that raises sends nothing, so the writes queued in it aren't cached
+    BP.set_motor_power(BP.PORT_B, BP.MOTOR_FLOAT)
+    with pytest.raises(ZeroDivisionError):
+        with BP.batch():
+            BP.set_motor_power(BP.PORT_B, 40)
+            1 / 0
+    assert sent(BP.set_motor_power, BP.PORT_B, 40) == 1 and emulator.board().motors[1].power == 40
+
+    # the board may or may not have received a failed transfer, so the next write is sent
+    def fail(outArray):
+        raise IOError("No SPI response")
+    transport.transfer = fail
+    with pytest.raises(IOError):
+        BP.set_sensor_type(BP.PORT_3, BP.SENSOR_TYPE.TOUCH)
+    del transport.transfer
+    assert sent(BP.set_sensor_type, BP.PORT_3, BP.SENSOR_TYPE.TOUCH) == 1
+
+    # the cache agrees with the board when several threads write to the same port
+    def drive(power):
+        for i in range(200):
+            BP.set_motor_power(BP.PORT_D, power + i % 3)
+    threads = [threading.Thread(target = drive, args = (power,)) for power in (10, 20, 30)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sent(BP.set_motor_power, BP.PORT_D, emulator.board().motors[3].power) == 0
+
+    uncached = brickpi3.BrickPi3(transport = transport, cache_writes = False)
+    assert sent(uncached.set_motor_dps, BP.PORT_A, 100) == 1
+
+
+def test_set_motors():
+    BP, emulator, clock = make_bp()
+    transport = BP.transport
+    motors = emulator.board().motors
+    batches = []
+    transfer_many = transport.transfer_many
+    transport.transfer_many = lambda messages: batches.append(len(messages)) or transfer_many(messages)
+
+    transfers = transport.transfers
+    BP.set_motors_dps({BP.PORT_B: 200, BP.PORT_C: 200})
+    assert transport.transfers == transfers + 1 and batches == [] # one masked message
+    BP.set_motors_dps({BP.PORT_B: 150, BP.PORT_C: -150, BP.PORT_D: 150})
+    assert batches == [2] # one message for B and D, one for C, in one transfer
+    assert [m.target_dps for m in motors[1:]] == [150, -150, 150]
+    BP.set_motors_power({BP.PORT_A: 30, BP.PORT_B: -30})
+    assert (motors[0].power, motors[1].power) == (30, -30)
+    BP.set_motors_position({BP.PORT_A + BP.PORT_D: 90})
+    assert (motors[0].target_position, motors[3].target_position) == (90, 90)
+    transfers = transport.transfers
+    BP.set_motors_power({BP.PORT_A: 0, BP.PORT_B: -30})
+    BP.set_motors_power({BP.PORT_A: 0, BP.PORT_B: -30}) # unchanged
+    assert transport.transfers == transfers + 1
+
+
+def test_motor_group():
+    BP, emulator, clock = make_bp()
+    transport = BP.transport
+    motors = emulator.board().motors
+    drive = brickpi3.MotorGroup(BP, {"left": BP.PORT_C, "right": BP.PORT_B}, inverted = ["left"])
+    assert drive.ports == BP.PORT_B + BP.PORT_C
+
+    transfers = transport.transfers
+    drive.set_dps(100)
+    assert transport.transfers == transfers + 1
+    assert (motors[1].target_dps, motors[2].target_dps) == (100, -100)
+    drive.set_dps({"left": 100, "right": 100}) # the same values
+    assert transport.transfers == transfers + 1
+    drive.set_power(0)
+    drive.set_limits(50, 300)
+    drive.set_position_kp(30)
+    assert transport.transfers == transfers + 4 # one masked message each
+    assert motors[1].limit_power == motors[2].limit_power == 50
+
+    drive.set_dps({"left": 90, "right": 180})
+    clock.sleep(1)
+    transfers = transport.transfers
+    status = drive.get_status()
+    assert transport.transfers == transfers + 1
+    assert (status["left"].encoder, status["right"].encoder, status["left"].dps) == (90, 180, 90)
+    assert drive.get_encoders() == {"left": 90, "right": 180}
+    drive.float()
+    assert motors[2].power == BP.MOTOR_FLOAT
+    drive.set_power(BP.MOTOR_FLOAT) # float, for the inverted member too
+    assert motors[1].power == motors[2].power == BP.MOTOR_FLOAT
+    status = drive.get_status()
+    assert status["left"].power == status["right"].power == BP.MOTOR_FLOAT
+    drive.set_dps(-128) # only a power of -128 means float
+    assert (motors[1].target_dps, motors[2].target_dps) == (-128, 128)
+    transfers = transport.transfers
+    drive.set_limits(50, 300, force = True)
+    drive.set_position_kp(30, force = True)
+    drive.set_position_kd(70, force = True)
+    assert transport.transfers == transfers + 3
+
+    with pytest.raises(IOError):
+        brickpi3.MotorGroup(BP, {"a": BP.PORT_A, "b": BP.PORT_A})
+    with pytest.raises(IOError):
+        drive.set_dps({"middle": 10})
+
+
+def test_motion_engine():
+    BP, emulator, clock = make_bp()
+    transport = BP.transport
+    motors = emulator.board().motors
+    engine = brickpi3.MotionEngine(BP, {"X": BP.PORT_A, "Y": BP.PORT_B}, max_dps = 400, acceleration = 800, hz = 50)
+
+    # X moves twice as far as Y, and both take as long as X does at its limits
+    engine.move_to({"X": 400, "Y": -200})
+    transfers = transport.transfers
+    start = clock.monotonic()
+    engine.run()
+    assert abs(clock.monotonic() - start - 1.5) < 0.01 # 0.5 s ramps and 0.5 s at 400 dps
+    assert engine.ticks == 75 # one every 20 ms, after the start
+    assert transport.transfers - transfers == 1 + engine.ticks # the start position, then one transfer per tick
+    assert engine.missed == 0
+    assert (motors[0].target_position, motors[1].target_position) == (400, -200)
+    assert engine.setpoints == {"X": 400, "Y": -200}
+    assert 0 < abs(engine.max_tracking_error["X"]) < 40
+    assert abs(engine.max_tracking_error["Y"]) < abs(engine.max_tracking_error["X"])
+
+    # halfway through an S-curve move, each axis is halfway
+    halfway = []
+    tick = engine._tick
+    engine._tick = lambda setpoints: (halfway.append(setpoints), tick(setpoints))
+    engine.move_by({"X": -400}, profile = "s-curve")
+    engine.run()
+    middle = halfway[len(halfway) // 2]
+    assert abs(middle["X"] - 200) < 20 and middle["Y"] == -200
+    assert halfway[-1]["X"] == 0
+
+    # consecutive moves don't send the end of one again as the start of the next
+    del halfway[:]
+    engine.move_by({"X": 100})
+    engine.move_by({"X": 100})
+    engine.run()
+    assert all(a["X"] < b["X"] for a, b in zip(halfway, halfway[1:]))
+    assert halfway[-1]["X"] == 200
+    del engine._tick
+    engine.move_to({"X": 0})
+
+    engine.gcode("""
+        G91 (relative)
+        G1 X10 Y10 F600 ; 10 units per second along the path
+        G4 P100
+        G90 G0 X0 Y0
+    """, degrees_per_unit = {"X": 36, "Y": 18})
+    start = clock.monotonic()
+    engine.run()
+    assert engine.setpoints == {"X": 0, "Y": 0}
+    assert clock.monotonic() - start > 1.4 # the feed rate, not the axis limits, sets the first move
+
+    with pytest.raises(ValueError):
+        engine.gcode("G2 X1 Y1")
+    for line in ("G1 X1 Y1 I1", "M3 S1000", "N10 G1 X1"):
+        with pytest.raises(ValueError):
+            engine.gcode(line)
+    with pytest.raises(IOError):
+        engine.move_to({"Z": 10})
+
+
+def test_wait_for_position():
+    BP, emulator, clock = make_bp()
+    transport = BP.transport
+    motors = emulator.board().motors
+    BP.set_motor_limits(BP.PORT_A + BP.PORT_B, dps = 360)
+    BP.set_motors_position({BP.PORT_A: 720, BP.PORT_B: -180})
+    BP._bus.spi_error(transport) # a bus glitch clears the write cache, but not the targets to wait for
+
+    transfers = transport.transfers
+    start = clock.monotonic()
+    statuses = BP.wait_for_position(BP.PORT_A + BP.PORT_B)
+    assert 2.0 < clock.monotonic() - start < 2.3 # 720 degrees at 360 dps, and settling
+    assert abs(statuses[0].encoder - 720) <= 2 and abs(statuses[1].encoder + 180) <= 2
+    assert statuses[2] is None
+    assert transport.transfers - transfers < 30 # a 1 ms polling loop would take about 2000
+
+    BP.set_motor_dps(BP.PORT_C, -100)
+    statuses = BP.wait_until_encoder(BP.PORT_C, -50)
+    assert -51 <= statuses[2].encoder <= -50
+    assert BP.wait_until_encoder(BP.PORT_C, {BP.PORT_C: -60})[2].encoder <= -60
+
+    BP.set_motor_power(BP.PORT_D, 0)
+    with pytest.raises(IOError):
+        BP.wait_for_position(BP.PORT_D) # not a position target
+    with pytest.raises(IOError):
+        BP.wait_for_position(BP.PORT_D, position = 90, timeout = 0.5)
+    assert motors[3].position == 0
+    statuses = BP.wait_for_position(BP.PORT_A + BP.PORT_D, position = {BP.PORT_A: 720, BP.PORT_D: 0})
+    assert abs(statuses[0].encoder - 720) <= 2
+    BP.reset_motor_encoder(BP.PORT_A)
+    with pytest.raises(IOError):
+        BP.wait_for_position(BP.PORT_A) # the target moved with the encoder
+
+    drive = brickpi3.MotorGroup(BP, {"left": BP.PORT_A, "right": BP.PORT_B}, inverted = ["left"])
+    drive.set_position(90)
+    statuses = drive.wait_for_position()
+    assert abs(statuses["left"].encoder - 90) <= 2 and abs(statuses["right"].encoder - 90) <= 2
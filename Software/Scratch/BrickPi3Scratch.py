@@ -199,14 +199,20 @@ def is_BrickPi_msg(msg):
         return True
 
 
-def read_sensor(port_index):
+def read_sensor(port_index, readings=None):
+    # readings: the result of BP3.get_sensors(), when updating all of the ports at once
 
     return_dict = {}
     bp3_port = bp3ports[port_index]
 
     type = SensorType[port_index]
     try:
-        value = BP3.get_sensor(bp3_port)
+        if readings is None:
+            value = BP3.get_sensor(bp3_port)
+        elif readings.errors[port_index] is not None:
+            raise readings.errors[port_index]
+        else:
+            value = readings.values[port_index]
         valid_reading = True
     except Exception as e:
         print ("failing to read_sensor: {}".format(e))
@@ -270,12 +276,16 @@ def read_sensor(port_index):
 
     return return_dict
 
-def read_encoder_values(port_index, name):
+def read_encoder_values(port_index, name, statuses=None):
     # unpack the tuple here as Scratch can't do it
+    # statuses: the result of BP3.get_motor_statuses(), when updating all of the ports at once
     return_encoder = {}
 
     try:
-        value = BP3.get_motor_encoder(bp3motors[port_index])
+        if statuses is None:
+            value = BP3.get_motor_encoder(bp3motors[port_index])
+        else:
+            value = statuses[port_index].encoder
         return_encoder["Encoder {}".format(name)] = value
         return_encoder["Encoder {} Status".format(name)] = success_code
     except Exception as e:
@@ -428,9 +438,17 @@ def handle_BrickPi_msg(msg):
     # UPDATE ALL SENSOR VALUES
     elif incoming_update_all is not None:
 
+        # read every sensor and motor in two bus transfers, rather than one per port
+        try:
+            readings = BP3.get_sensors()
+            statuses = BP3.get_motor_statuses()
+        except Exception as e:
+            print ("failing to update: {}".format(e))
+            readings = None
+            statuses = None
         for port in range(0, 4):
-            return_dict.update(read_sensor(port))
-            return_dict.update(read_encoder_values(port,motor_number_to_name[port]))
+            return_dict.update(read_sensor(port, readings))
+            return_dict.update(read_encoder_values(port,motor_number_to_name[port], statuses))
 
         if en_debug:
             print("Update all sensor values")